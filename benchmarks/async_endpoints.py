@@ -0,0 +1,63 @@
+"""
+Compare sync and async endpoints under uvicorn.
+
+Usage:
+    python -m benchmarks.async_endpoints [--requests N] [--concurrency N]
+
+The same database is served twice, with ASYNC_ENDPOINTS disabled and enabled, and
+check endpoints are driven with concurrent keep-alive connections. Principal cache is
+disabled, so every request resolves its principal from database.
+"""
+
+from argparse import ArgumentParser
+from json import dumps
+from tempfile import TemporaryDirectory
+
+from benchmarks.common import load, raw_request, request, seed, server, setup_django
+
+PATHS = ("/login-check", "/role-check", "/permission-check")
+
+
+def main() -> None:
+
+    """
+    Run benchmark and print results as JSON.
+    """
+
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
+    results = {}
+
+    with TemporaryDirectory() as directory:
+        setup_django(f"{directory}/db.sqlite3")
+        credentials = seed()[0]
+
+        for mode, overrides in (
+            ("sync", {"ASYNC_ENDPOINTS": False, "PRINCIPAL_CACHE_SIZE": 0}),
+            ("async", {"ASYNC_ENDPOINTS": True, "PRINCIPAL_CACHE_SIZE": 0}),
+        ):
+            with server(args.port, overrides):
+                token = request("127.0.0.1", args.port, "POST", "/login", credentials)[
+                    "token"
+                ]
+
+                results[mode] = {
+                    path: load(
+                        "127.0.0.1",
+                        args.port,
+                        [raw_request("127.0.0.1", "GET", path, token=token)],
+                        args.requests,
+                        args.concurrency,
+                    )
+                    for path in PATHS
+                }
+
+    print(dumps(results, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,353 @@
+"""
+Shared helpers for benchmarks.
+
+This module sets up a disposable database, seeds it with users, roles and
+permissions, starts local servers and drives HTTP load against them.
+"""
+
+from asyncio import gather, open_connection, run
+from contextlib import contextmanager
+from http.client import HTTPConnection
+from itertools import cycle
+from json import dumps, loads
+from os import environ
+from random import Random
+from statistics import quantiles
+from subprocess import DEVNULL, Popen
+from time import perf_counter, sleep
+from typing import Iterator, List
+import sys
+
+# Password of seeded users.
+PASSWORD = "benchmark"
+
+# Role and permission required by check endpoints.
+CHECK_ROLE = "role_check"
+CHECK_PERMISSION = "permission_check"
+
+
+def setup_django(database: str) -> None:
+
+    """
+    Configure Django with benchmark settings and create tables.
+
+    Args:
+        database (str): Path of SQLite database file, or name of MySQL database.
+
+    Returns:
+        None
+    """
+
+    environ["DJANGO_SETTINGS_MODULE"] = "benchmarks.settings"
+    environ["RALPH_BENCHMARK_DB"] = database
+
+    # pylint: disable = import-outside-toplevel
+    import django
+    from django.core.management import call_command
+
+    django.setup()
+    call_command("migrate", run_syncdb=True, verbosity=0)
+
+
+def seed(
+    users: int = 1, roles: int = 1, permissions: int = 1, seed_value: int = 0
+) -> List[dict]:
+
+    """
+    Create users, roles and permissions, assigned at random.
+
+    Every role gets random permissions and every user gets random roles. Half of
+    users also get the role and permission required by check endpoints. All users
+    share the same password hash, so seeding doesn't pay bcrypt for each user.
+
+    Args:
+        users (int): Number of users. Defaults to 1.
+        roles (int): Number of roles, besides check role. Defaults to 1.
+        permissions (int): Number of permissions, besides check permission.
+            Defaults to 1.
+        seed_value (int): Seed of random generator. Defaults to 0.
+
+    Returns:
+        List[dict]: Credentials of users holding check role and permission.
+    """
+
+    # pylint: disable = import-outside-toplevel
+    from bcrypt import gensalt, hashpw
+
+    from ralph.clients.authorization.hierarchy import rebuild_closure
+    from ralph.clients.authorization.models import Permission, Role, User
+
+    generator = Random(seed_value)
+    password = hashpw(PASSWORD.encode(), gensalt()).decode()
+
+    permission_objects = Permission.objects.bulk_create(
+        [Permission(name=CHECK_PERMISSION)]
+        + [Permission(name=f"permission_{index}") for index in range(permissions)]
+    )
+    role_objects = Role.objects.bulk_create(
+        [Role(name=CHECK_ROLE)] + [Role(name=f"role_{index}") for index in range(roles)]
+    )
+    user_objects = User.objects.bulk_create(
+        [
+            User(
+                username=f"user_{index}",
+                password=password,
+                email=f"user_{index}@ralph",
+                first_name="Bench",
+                last_name="Mark",
+                is_active=True,
+            )
+            for index in range(users)
+        ],
+        batch_size=1000,
+    )
+
+    # Backends not returning keys of inserted rows leave compact keys unset.
+    permission_objects = with_keys(Permission, permission_objects, "name")
+    role_objects = with_keys(Role, role_objects, "name")
+    user_objects = with_keys(User, user_objects, "username")
+
+    # Link roles to permissions, check role to check permission.
+    Role.permissions.through.objects.bulk_create(
+        [
+            Role.permissions.through(
+                role=role_objects[0], permission=permission_objects[0]
+            )
+        ]
+        + [
+            Role.permissions.through(role=role, permission=permission)
+            for role in role_objects[1:]
+            for permission in generator.sample(
+                permission_objects[1:], min(3, permissions)
+            )
+        ],
+        batch_size=1000,
+    )
+
+    # Link users to roles, even users to check role.
+    User.roles.through.objects.bulk_create(
+        [
+            User.roles.through(user=user, role=role)
+            for index, user in enumerate(user_objects)
+            for role in generator.sample(role_objects[1:], min(3, roles))
+            + ([role_objects[0]] if index % 2 == 0 else [])
+        ],
+        batch_size=1000,
+    )
+
+    # Roles were created without model signals, so closure of hierarchy is built.
+    rebuild_closure()
+
+    return [
+        {"username": user.username, "password": PASSWORD} for user in user_objects[::2]
+    ]
+
+
+def with_keys(model: type, objects: list, field: str) -> list:
+
+    """
+    Get inserted objects with their primary keys.
+
+    Args:
+        model (type): Model of objects.
+        objects (list): Objects inserted in bulk.
+        field (str): Unique field used to find objects.
+
+    Returns:
+        list: Objects with primary keys, in the same order.
+    """
+
+    if objects[0].pk is not None:
+        return objects
+
+    saved = model.objects.in_bulk(
+        [getattr(item, field) for item in objects], field_name=field
+    )
+
+    return [saved[getattr(item, field)] for item in objects]
+
+
+@contextmanager
+def server(port: int, overrides: dict = None, interface: str = "asgi") -> Iterator:
+
+    """
+    Run ralph in a subprocess while in context.
+
+    Args:
+        port (int): Port to listen on.
+        overrides (dict): Project settings to override. Defaults to None.
+        interface (str): Either "asgi", served by uvicorn, or "wsgi", served by
+            gunicorn. Defaults to "asgi".
+
+    Returns:
+        Iterator: Context in which server is running.
+    """
+
+    process = Popen(
+        [sys.executable, "-m", "benchmarks.serve", str(port), interface],
+        env={**environ, "RALPH_BENCHMARK_OVERRIDES": dumps(overrides or {})},
+        stdout=DEVNULL,
+    )
+
+    try:
+        # Wait until server answers healthcheck.
+        for _ in range(100):
+            try:
+                request("127.0.0.1", port, "GET", "/healthcheck")
+                break
+            except OSError:
+                sleep(0.1)
+
+        yield
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def request(
+    host: str, port: int, method: str, path: str, body: dict = None, token: str = None
+) -> dict:
+
+    """
+    Make a single HTTP request.
+
+    Args:
+        host (str): Server host.
+        port (int): Server port.
+        method (str): HTTP method.
+        path (str): Request path.
+        body (dict): JSON body. Defaults to None.
+        token (str): Bearer token. Defaults to None.
+
+    Returns:
+        dict: Decoded JSON response.
+    """
+
+    headers = {"Content-Type": "application/json"}
+
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+
+    connection = HTTPConnection(host, port, timeout=10)
+
+    try:
+        connection.request(method, path, dumps(body) if body else None, headers)
+        return loads(connection.getresponse().read())
+    finally:
+        connection.close()
+
+
+def raw_request(
+    host: str, method: str, path: str, body: dict = None, token: str = None
+) -> bytes:
+
+    """
+    Build raw HTTP/1.1 request, to be replayed over keep-alive connections.
+
+    Args:
+        host (str): Server host.
+        method (str): HTTP method.
+        path (str): Request path.
+        body (dict): JSON body. Defaults to None.
+        token (str): Bearer token. Defaults to None.
+
+    Returns:
+        bytes: Raw request.
+    """
+
+    content = dumps(body).encode() if body else b""
+    headers = f"{method} {path} HTTP/1.1\r\nHost: {host}\r\n"
+
+    if token:
+        headers += f"Authorization: Bearer {token}\r\n"
+
+    if content:
+        headers += "Content-Type: application/json\r\n"
+
+    headers += f"Content-Length: {len(content)}\r\n\r\n"
+
+    return headers.encode() + content
+
+
+def load(
+    host: str, port: int, requests: List[bytes], total: int, concurrency: int
+) -> dict:
+
+    """
+    Replay raw requests over keep-alive connections and measure them.
+
+    Args:
+        host (str): Server host.
+        port (int): Server port.
+        requests (List[bytes]): Raw requests, cycled by each connection.
+        total (int): Number of requests.
+        concurrency (int): Number of concurrent connections.
+
+    Returns:
+        dict: Requests per second and latency percentiles, in milliseconds.
+    """
+
+    async def worker(count: int, offset: int) -> List[float]:
+        reader, writer = await open_connection(host, port)
+        raws = cycle(requests[offset:] + requests[:offset])
+        latencies = []
+
+        for _ in range(count):
+            start = perf_counter()
+            writer.write(next(raws))
+            await writer.drain()
+
+            # Read headers, then body by its length.
+            headers = await reader.readuntil(b"\r\n\r\n")
+            length = int(
+                next(
+                    line.split(b":")[1]
+                    for line in headers.lower().split(b"\r\n")
+                    if line.startswith(b"content-length")
+                )
+            )
+            await reader.readexactly(length)
+
+            latencies.append((perf_counter() - start) * 1000)
+
+        writer.close()
+
+        return latencies
+
+    async def main() -> List[List[float]]:
+        return await gather(
+            *(
+                worker(total // concurrency, index % len(requests))
+                for index in range(concurrency)
+            )
+        )
+
+    start = perf_counter()
+    latencies = [latency for result in run(main()) for latency in result]
+    elapsed = perf_counter() - start
+
+    return summarize(latencies, elapsed)
+
+
+def summarize(latencies: List[float], elapsed: float) -> dict:
+
+    """
+    Summarize request latencies.
+
+    Args:
+        latencies (List[float]): Latency of each request, in milliseconds.
+        elapsed (float): Total time spent, in seconds.
+
+    Returns:
+        dict: Requests per second and latency percentiles, in milliseconds.
+    """
+
+    percentiles = quantiles(latencies, n=100)
+
+    return {
+        "requests": len(latencies),
+        "requests_per_second": round(len(latencies) / elapsed, 1),
+        "p50_ms": round(percentiles[49], 3),
+        "p95_ms": round(percentiles[94], 3),
+        "p99_ms": round(percentiles[98], 3),
+    }
@@ -0,0 +1,195 @@
+"""
+Measure index size and join latency of legacy and compact key schemas.
+
+Usage:
+    python -m benchmarks.compact_keys [--users N] [--roles N] [--permissions N]
+        [--lookups N] [--database sqlite|mysql]
+
+For each schema, a disposable database is seeded in a subprocess, since models are
+defined by DB_COMPACT_KEYS at import. MySQL settings are read from the same
+environment variables as the benchmark suite. Size of each table and its indexes is
+read from SQLite dbstat table or MySQL information schema, and latency of the joined
+query resolving a principal is measured for random users.
+"""
+
+from argparse import ArgumentParser
+from json import dumps, loads
+from os import environ, path
+from random import Random
+from statistics import quantiles
+from subprocess import check_output
+from tempfile import TemporaryDirectory
+from time import perf_counter
+import sys
+
+from benchmarks.common import seed, setup_django
+import settings
+
+# Tables measured, as named in both schemas.
+TABLES = ("users", "roles", "permissions", "users_roles", "roles_permissions")
+
+
+def get_sizes() -> dict:
+
+    """
+    Get size of each table and of its indexes.
+
+    Returns:
+        dict: Data and index bytes of each table.
+    """
+
+    # pylint: disable = import-outside-toplevel
+    from django.db import connection
+
+    sizes = {table: {"data_bytes": 0, "index_bytes": 0} for table in TABLES}
+
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute("SELECT name, tbl_name, type FROM sqlite_master")
+            owners = {name: (table, kind) for name, table, kind in cursor.fetchall()}
+
+            cursor.execute("SELECT name, SUM(pgsize) FROM dbstat GROUP BY name")
+
+            for name, size in cursor.fetchall():
+                table, kind = owners.get(name, (None, None))
+
+                if table in sizes:
+                    key = "data_bytes" if kind == "table" else "index_bytes"
+                    sizes[table][key] += size
+        else:
+            cursor.execute("ANALYZE TABLE " + ", ".join(TABLES))
+            cursor.fetchall()
+            cursor.execute(
+                "SELECT table_name, data_length, index_length "
+                "FROM information_schema.tables WHERE table_schema = DATABASE()"
+            )
+
+            for table, data, index in cursor.fetchall():
+                if table in sizes:
+                    sizes[table] = {"data_bytes": data, "index_bytes": index}
+
+    return sizes
+
+
+def measure_joins(lookups: int) -> dict:
+
+    """
+    Measure latency of principal resolution for random users.
+
+    Args:
+        lookups (int): Number of principals resolved.
+
+    Returns:
+        dict: Latency percentiles, in microseconds.
+    """
+
+    # pylint: disable = import-outside-toplevel
+    from ralph.clients.authorization.auth import Authorization
+    from ralph.clients.authorization.models import User
+
+    uuids = list(User.objects.values_list("uuid", flat=True))
+    generator = Random(0)
+    latencies = []
+
+    for uuid in generator.choices(uuids, k=lookups):
+        start = perf_counter()
+        Authorization.get_user(uuid)
+        latencies.append((perf_counter() - start) * 1e6)
+
+    percentiles = quantiles(latencies, n=100)
+
+    return {
+        "p50_us": round(percentiles[49], 1),
+        "p95_us": round(percentiles[94], 1),
+        "p99_us": round(percentiles[98], 1),
+    }
+
+
+def run_schema(args: object) -> None:
+
+    """
+    Seed database with schema and print its measures as JSON.
+
+    Args:
+        args (object): Parsed arguments.
+
+    Returns:
+        None
+    """
+
+    settings.DB_COMPACT_KEYS = args.schema == "compact"
+
+    setup_django(args.db)
+
+    # pylint: disable = import-outside-toplevel
+    from django.apps import apps
+    from django.core.management import call_command
+    from django.db import connection
+
+    # MySQL database is shared by both schemas, so tables of previous one are
+    # replaced.
+    if connection.vendor != "sqlite":
+        tables = [
+            model._meta.db_table
+            for model in apps.get_app_config("authorization").get_models(
+                include_auto_created=True
+            )
+        ]
+
+        with connection.cursor() as cursor:
+            cursor.execute("SET FOREIGN_KEY_CHECKS = 0")
+            cursor.execute("DROP TABLE IF EXISTS " + ", ".join(tables))
+            cursor.execute("SET FOREIGN_KEY_CHECKS = 1")
+
+        call_command("migrate", run_syncdb=True, verbosity=0)
+
+    seed(args.users, args.roles, args.permissions)
+
+    print(dumps({"sizes": get_sizes(), "join": measure_joins(args.lookups)}))
+
+
+def main() -> None:
+
+    """
+    Run benchmark for both schemas and print results as JSON.
+    """
+
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--roles", type=int, default=50)
+    parser.add_argument("--permissions", type=int, default=200)
+    parser.add_argument("--lookups", type=int, default=5000)
+    parser.add_argument("--database", choices=["sqlite", "mysql"], default="sqlite")
+    parser.add_argument("--schema", choices=["legacy", "compact"])
+    parser.add_argument("--db")
+    args = parser.parse_args()
+
+    if args.schema:
+        run_schema(args)
+        return
+
+    environ["RALPH_BENCHMARK_DATABASE"] = args.database
+    results = {}
+
+    with TemporaryDirectory() as directory:
+        for schema in ["legacy", "compact"]:
+            database = (
+                path.join(directory, f"{schema}.sqlite3")
+                if args.database == "sqlite"
+                else environ.get("RALPH_BENCHMARK_DB", "ralph")
+            )
+
+            output = check_output(
+                [sys.executable, "-m", "benchmarks.compact_keys"]
+                + sys.argv[1:]
+                + ["--schema", schema, "--db", database],
+                env=environ,
+            )
+
+            results[schema] = loads(output.decode().splitlines()[-1])
+
+    print(dumps(results, indent=4))
+
+
+if __name__ == "__main__":
+    main()
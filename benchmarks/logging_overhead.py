@@ -0,0 +1,157 @@
+"""
+Measure per-request logging overhead.
+
+Usage:
+    python -m benchmarks.logging_overhead [--requests N] [--rate-limit N]
+
+Each request emits the five INFO lines written by Authorization.authenticate. The
+previous pipeline, with synchronous file and stdout handlers, is compared to the
+queue pipeline, with formatting and writes done by a listener thread. Stdout is
+replaced by the null device, so terminal speed doesn't affect results.
+"""
+
+from argparse import ArgumentParser
+from json import dumps
+from logging.handlers import QueueListener
+from os import devnull, path
+from queue import Queue
+from tempfile import TemporaryDirectory
+from time import perf_counter
+import logging
+
+from ralph.common.logger import (
+    TEXT_FORMAT,
+    DeferredQueueHandler,
+    JSONFormatter,
+    SamplingFilter,
+)
+
+
+def emit(logger: logging.Logger, requests: int) -> float:
+
+    """
+    Emit log lines of authenticated requests.
+
+    Args:
+        logger (logging.Logger): Logger to be used.
+        requests (int): Number of requests.
+
+    Returns:
+        float: Time spent by caller per request, in microseconds.
+    """
+
+    start = perf_counter()
+
+    for _ in range(requests):
+        logger.info("Protected endpoint: %s.", "/permission-check")
+        logger.info(
+            "Required roles: %s (Any) | Required permissions: %s (Any).",
+            [],
+            ["permission_check"],
+        )
+        logger.info("Token is valid.")
+        logger.info("User uuid: %s.", "00000000-0000-0000-0000-000000000000")
+        logger.info("Authorizations: %s.", {"roles": True, "permissions": True})
+
+    return (perf_counter() - start) / requests * 1e6
+
+
+def create_logger(name: str, handler: logging.Handler) -> logging.Logger:
+
+    """
+    Create an isolated logger using only passed handler.
+
+    Args:
+        name (str): Logger name.
+        handler (logging.Handler): Handler of logger.
+
+    Returns:
+        logging.Logger: Logger object.
+    """
+
+    logger = logging.getLogger(name)
+    logger.handlers = [handler]
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+
+    return logger
+
+
+def main() -> None:
+
+    """
+    Run benchmark and print results as JSON.
+    """
+
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=20000)
+    parser.add_argument("--rate-limit", type=float, default=0)
+    args = parser.parse_args()
+
+    results = {}
+
+    with TemporaryDirectory() as directory, open(
+        devnull, "w", encoding="utf-8"
+    ) as null:
+
+        # Previous pipeline: text written synchronously to file and stdout.
+        handlers = [
+            logging.FileHandler(path.join(directory, "sync.log")),
+            logging.StreamHandler(null),
+        ]
+
+        for handler in handlers:
+            handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+
+        class Both(logging.Handler):
+
+            """
+            Dispatch records to both synchronous handlers.
+            """
+
+            def emit(self, record: logging.LogRecord) -> None:
+                for handler in handlers:
+                    handler.handle(record)
+
+        start = perf_counter()
+        caller = emit(create_logger("benchmark.sync", Both()), args.requests)
+
+        results["sync"] = {
+            "caller_us_per_request": round(caller, 3),
+            "total_us_per_request": round(
+                (perf_counter() - start) / args.requests * 1e6, 3
+            ),
+        }
+
+        # Queue pipeline: JSON written by listener thread.
+        handlers = [
+            logging.FileHandler(path.join(directory, "queue.log")),
+            logging.StreamHandler(null),
+        ]
+
+        for handler in handlers:
+            handler.setFormatter(JSONFormatter())
+
+        queue_handler = DeferredQueueHandler(Queue(0))
+        sampling_filter = SamplingFilter(1.0, args.rate_limit)
+        queue_handler.addFilter(sampling_filter)
+        listener = QueueListener(queue_handler.queue, *handlers)
+        listener.start()
+
+        start = perf_counter()
+        caller = emit(create_logger("benchmark.queue", queue_handler), args.requests)
+        listener.stop()
+
+        results["queue"] = {
+            "caller_us_per_request": round(caller, 3),
+            "total_us_per_request": round(
+                (perf_counter() - start) / args.requests * 1e6, 3
+            ),
+            "dropped": sampling_filter.dropped,
+        }
+
+    print(dumps(results, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+"""
+Serve ralph for benchmarks.
+
+Usage:
+    python -m benchmarks.serve PORT [asgi|wsgi]
+
+ASGI application is served by uvicorn and WSGI application by gunicorn. Project
+settings, from root settings module, can be overridden by a JSON object in
+RALPH_BENCHMARK_OVERRIDES environment variable, so the same code can be measured
+with different configurations.
+"""
+
+from json import loads
+from os import environ
+import sys
+
+import settings
+
+
+def main() -> None:
+
+    """
+    Apply settings overrides and run server on port passed as argument.
+    """
+
+    for name, value in loads(environ.get("RALPH_BENCHMARK_OVERRIDES", "{}")).items():
+        setattr(settings, name, value)
+
+    port = sys.argv[1]
+    interface = sys.argv[2] if len(sys.argv) > 2 else "asgi"
+
+    # pylint: disable = import-outside-toplevel
+    if interface == "asgi":
+        import uvicorn
+
+        uvicorn.run("ralph.asgi:application", port=int(port), log_level="warning")
+    else:
+        from gunicorn.app.wsgiapp import run
+
+        # Workers are forked after overrides are applied, so they inherit them.
+        sys.argv = [
+            "gunicorn",
+            "--bind",
+            f"127.0.0.1:{port}",
+            "--threads",
+            "8",
+            "--log-level",
+            "warning",
+            "ralph.wsgi:application",
+        ]
+        run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+"""
+Django settings for benchmarks.
+
+Same settings as ralph project, with database pointed to a disposable SQLite file or
+to a MySQL compatible server, selected by RALPH_BENCHMARK_DATABASE environment
+variable.
+"""
+
+from os import environ
+
+# pylint: disable = wildcard-import, unused-wildcard-import
+from ralph.settings import *
+
+SECRET_KEY = "benchmark"
+
+ALLOWED_HOSTS = ["*"]
+
+DATABASES = {
+    "default": (
+        {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": environ.get("RALPH_BENCHMARK_DB", "benchmark.sqlite3"),
+        }
+        if environ.get("RALPH_BENCHMARK_DATABASE", "sqlite") == "sqlite"
+        else {
+            "ENGINE": "django.db.backends.mysql",
+            "NAME": environ.get("RALPH_BENCHMARK_DB", "ralph"),
+            "USER": environ.get("RALPH_BENCHMARK_MYSQL_USER", "root"),
+            "PASSWORD": environ.get("RALPH_BENCHMARK_MYSQL_PASSWORD", ""),
+            "HOST": environ.get("RALPH_BENCHMARK_MYSQL_HOST", "127.0.0.1"),
+            "PORT": environ.get("RALPH_BENCHMARK_MYSQL_PORT", "3306"),
+            "CONN_MAX_AGE": DB_CONN_MAX_AGE,
+            "CONN_HEALTH_CHECKS": DB_CONN_HEALTH_CHECKS,
+        }
+    )
+}
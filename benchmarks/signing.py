@@ -0,0 +1,126 @@
+"""
+Measure token sign and verify cost per algorithm.
+
+Usage:
+    python -m benchmarks.signing [--tokens N] [--rsa-bits N]
+
+Keys are generated in a temporary directory and loaded by KeyRing, the same way
+signing keys set in settings are, so results include everything done per token by
+login and by authorization on a token cache miss.
+"""
+
+from argparse import ArgumentParser
+from datetime import datetime, timedelta
+from json import dumps
+from os import path
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric import ec, rsa
+
+from ralph.clients.authorization.keys import KeyRing
+
+
+def write_key(directory: str, algorithm: str, rsa_bits: int) -> str:
+
+    """
+    Generate private key for algorithm and write it as PEM.
+
+    Args:
+        directory (str): Directory where key file is written.
+        algorithm (str): RS256 or ES256.
+        rsa_bits (int): Size of RSA keys.
+
+    Returns:
+        str: Path of key file.
+    """
+
+    if algorithm == "RS256":
+        key = rsa.generate_private_key(public_exponent=65537, key_size=rsa_bits)
+    else:
+        key = ec.generate_private_key(ec.SECP256R1())
+
+    filename = path.join(directory, f"{algorithm}.pem")
+
+    with open(filename, "wb") as file:
+        file.write(
+            key.private_bytes(
+                serialization.Encoding.PEM,
+                serialization.PrivateFormat.PKCS8,
+                serialization.NoEncryption(),
+            )
+        )
+
+    return filename
+
+
+def measure(key_ring: KeyRing, tokens: int) -> dict:
+
+    """
+    Measure sign and verify time of key ring.
+
+    Args:
+        key_ring (KeyRing): Key ring to be measured.
+        tokens (int): Number of tokens signed and verified.
+
+    Returns:
+        dict: Microseconds per sign and per verify, and token size in bytes.
+    """
+
+    payload = {
+        "iss": "00000000-0000-0000-0000-000000000000",
+        "iat": datetime.utcnow(),
+        "exp": datetime.utcnow() + timedelta(minutes=15),
+    }
+
+    start = perf_counter()
+    signed = [key_ring.encode(payload) for _ in range(tokens)]
+    sign = perf_counter() - start
+
+    start = perf_counter()
+    for token in signed:
+        key_ring.decode(token)
+    verify = perf_counter() - start
+
+    return {
+        "sign_us": round(sign / tokens * 1e6, 3),
+        "verify_us": round(verify / tokens * 1e6, 3),
+        "token_bytes": len(signed[0]),
+    }
+
+
+def main() -> None:
+
+    """
+    Run benchmark and print results as JSON.
+    """
+
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--tokens", type=int, default=2000)
+    parser.add_argument("--rsa-bits", type=int, default=2048)
+    args = parser.parse_args()
+
+    results = {"HS256": measure(KeyRing([]), args.tokens)}
+
+    with TemporaryDirectory() as directory:
+        for algorithm in ["RS256", "ES256"]:
+            key_ring = KeyRing(
+                [
+                    {
+                        "kid": algorithm,
+                        "algorithm": algorithm,
+                        "private_key_file": write_key(
+                            directory, algorithm, args.rsa_bits
+                        ),
+                    }
+                ]
+            )
+
+            results[algorithm] = measure(key_ring, args.tokens)
+
+    print(dumps(results, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+"""
+Measure principal resolution from shared snapshot against database.
+
+Usage:
+    python -m benchmarks.snapshot [--users N] [--roles N] [--permissions N]
+        [--lookups N]
+
+A disposable database is seeded, a snapshot is published from it, and random users
+are resolved with snapshot disabled and enabled, so results compare one database
+query with one snapshot lookup, change times check included. Publication time and
+snapshot size are reported too.
+"""
+
+from argparse import ArgumentParser
+from json import dumps
+from os import path
+from random import Random
+from statistics import quantiles
+from tempfile import TemporaryDirectory
+from time import perf_counter
+
+from benchmarks.common import seed, setup_django
+import settings
+
+
+def measure(uuids: list) -> dict:
+
+    """
+    Measure latency of users resolution.
+
+    Args:
+        uuids (list): User uuids resolved, one at a time.
+
+    Returns:
+        dict: Latency percentiles, in microseconds.
+    """
+
+    # pylint: disable = import-outside-toplevel
+    from ralph.clients.authorization.auth import Authorization
+
+    latencies = []
+
+    for uuid in uuids:
+        start = perf_counter()
+        Authorization.get_users([uuid])
+        latencies.append((perf_counter() - start) * 1e6)
+
+    percentiles = quantiles(latencies, n=100)
+
+    return {
+        "p50_us": round(percentiles[49], 1),
+        "p95_us": round(percentiles[94], 1),
+        "p99_us": round(percentiles[98], 1),
+    }
+
+
+def main() -> None:
+
+    """
+    Run benchmark and print results as JSON.
+    """
+
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=100000)
+    parser.add_argument("--roles", type=int, default=50)
+    parser.add_argument("--permissions", type=int, default=200)
+    parser.add_argument("--lookups", type=int, default=5000)
+    args = parser.parse_args()
+
+    with TemporaryDirectory() as directory:
+        snapshot_path = path.join(directory, "authorization.snapshot")
+        settings.SNAPSHOT_PATH = snapshot_path
+
+        setup_django(path.join(directory, "snapshot.sqlite3"))
+        seed(args.users, args.roles, args.permissions)
+
+        # pylint: disable = import-outside-toplevel
+        from django.core.management import call_command
+
+        from ralph.clients.authorization.models import User
+        from ralph.clients.authorization.snapshot import snapshot_reader
+
+        start = perf_counter()
+
+        with open(path.devnull, "w", encoding="utf-8") as output:
+            call_command("publish_snapshot", stdout=output)
+
+        publish = perf_counter() - start
+
+        uuids = Random(0).choices(
+            list(User.objects.values_list("uuid", flat=True)), k=args.lookups
+        )
+
+        # Compare with snapshot disabled first.
+        snapshot_reader.path = None
+        database = measure(uuids)
+        snapshot_reader.path = snapshot_path
+        snapshot = measure(uuids)
+
+        results = {
+            "publish_s": round(publish, 2),
+            "snapshot_bytes": path.getsize(snapshot_path),
+            "database": database,
+            "snapshot": snapshot,
+            "snapshot_stats": snapshot_reader.stats(),
+        }
+
+    print(dumps(results, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Measure startup time and per request overhead of deployment profiles.
+
+Usage:
+    python -m benchmarks.startup [--requests N] [--profiles default,stateless]
+
+Each profile runs in a fresh subprocess, which imports the WSGI application and
+reports time until it is ready, time of first request and of first login, and then
+mean time of healthcheck and check requests, calling the WSGI application directly,
+so no server or test client overhead is counted. Logging is limited to warnings,
+so profiles are compared on framework work only.
+"""
+
+from argparse import ArgumentParser
+from io import BytesIO
+from json import dumps, loads
+from os import environ, path
+from subprocess import check_output
+from tempfile import TemporaryDirectory
+from time import perf_counter, time
+import sys
+
+from benchmarks.common import seed, setup_django
+import settings
+
+
+def call(application: object, method: str, path_info: str, **kwargs) -> bytes:
+
+    """
+    Call WSGI application with a minimal request.
+
+    Args:
+        application (object): WSGI application.
+        method (str): HTTP method.
+        path_info (str): Request path.
+        kwargs: JSON body, as "body", and bearer token, as "token".
+
+    Returns:
+        bytes: Response body.
+    """
+
+    body = dumps(kwargs["body"]).encode() if "body" in kwargs else b""
+
+    request = {
+        "REQUEST_METHOD": method,
+        "PATH_INFO": path_info,
+        "SERVER_NAME": "localhost",
+        "SERVER_PORT": "80",
+        "CONTENT_TYPE": "application/json",
+        "CONTENT_LENGTH": str(len(body)),
+        "wsgi.input": BytesIO(body),
+        "wsgi.url_scheme": "http",
+    }
+
+    if "token" in kwargs:
+        request["HTTP_AUTHORIZATION"] = f"Bearer {kwargs['token']}"
+
+    return b"".join(application(request, lambda status, headers: None))
+
+
+def run_profile(args: object) -> None:
+
+    """
+    Boot application with profile and print its measures as JSON.
+
+    Args:
+        args (object): Parsed arguments.
+
+    Returns:
+        None
+    """
+
+    settings.PROFILE = args.profile
+    settings.LOG_LEVEL = "WARNING"
+    settings.LOG_DIRECTORY = path.dirname(args.db)
+
+    environ["DJANGO_SETTINGS_MODULE"] = "benchmarks.settings"
+    environ["RALPH_BENCHMARK_DB"] = args.db
+
+    start = perf_counter()
+
+    # pylint: disable = import-outside-toplevel
+    from ralph.wsgi import application
+
+    results = {
+        "ready_ms": round(
+            (time() - float(environ["RALPH_BENCHMARK_SPAWNED"])) * 1e3, 1
+        ),
+        "boot_ms": round((perf_counter() - start) * 1e3, 1),
+    }
+
+    start = perf_counter()
+    call(application, "GET", "/healthcheck")
+    results["first_request_ms"] = round((perf_counter() - start) * 1e3, 1)
+
+    start = perf_counter()
+    response = call(application, "POST", "/login", body=loads(args.credentials))
+    token = loads(response)["token"]
+    results["first_login_ms"] = round((perf_counter() - start) * 1e3, 1)
+
+    for path_info, kwargs in [
+        ("/healthcheck", {}),
+        ("/permission-check", {"token": token}),
+    ]:
+        start = perf_counter()
+
+        for _ in range(args.requests):
+            call(application, "GET", path_info, **kwargs)
+
+        results[f"{path_info[1:]}_us"] = round(
+            (perf_counter() - start) / args.requests * 1e6, 1
+        )
+
+    print(dumps(results))
+
+
+def main() -> None:
+
+    """
+    Run benchmark for each profile and print results as JSON.
+    """
+
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--profiles", default="default,stateless")
+    parser.add_argument("--profile")
+    parser.add_argument("--db")
+    parser.add_argument("--credentials")
+    args = parser.parse_args()
+
+    if args.profile:
+        run_profile(args)
+        return
+
+    results = {}
+
+    with TemporaryDirectory() as directory:
+        database = path.join(directory, "startup.sqlite3")
+
+        # Seed with default profile, which creates every table.
+        setup_django(database)
+        credentials = dumps(seed()[0])
+
+        for profile in args.profiles.split(","):
+            output = check_output(
+                [sys.executable, "-m", "benchmarks.startup"]
+                + sys.argv[1:]
+                + ["--profile", profile, "--db", database]
+                + ["--credentials", credentials],
+                env={**environ, "RALPH_BENCHMARK_SPAWNED": str(time())},
+            )
+
+            results[profile] = loads(output.decode().splitlines()[-1])
+
+    print(dumps(results, indent=4))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,369 @@
+"""
+Load and latency benchmark suite for login and check endpoints.
+
+Usage:
+    python -m benchmarks.suite [--users N] [--roles N] [--permissions N]
+        [--requests N] [--login-requests N] [--concurrency N]
+        [--servers in-process,asgi,wsgi] [--database sqlite|mysql] [--start-mysql]
+        [--override NAME=JSON ...] [--output FILE] [--budget FILE]
+
+A disposable database is seeded with users, roles and permissions, then /login and
+check endpoints are driven in-process, with Django test client, and through local
+servers, uvicorn for ASGI and gunicorn for WSGI. Latency percentiles and requests per
+second are reported for each server and endpoint. Database queries per request are
+counted in-process only, since servers run in other processes.
+
+Results are written as JSON. If a budget file is passed, with the same layout as
+results, the run fails when any latency or queries per request is above its budget,
+or when requests per second is below its budget.
+"""
+
+from argparse import ArgumentParser
+from contextlib import contextmanager, nullcontext
+from datetime import datetime, timezone
+from itertools import cycle
+from json import dumps, load as load_json, loads
+from os import environ
+from subprocess import DEVNULL, Popen
+from tempfile import TemporaryDirectory
+from time import perf_counter, sleep
+from typing import Iterator
+import sys
+
+from benchmarks.common import (
+    load,
+    raw_request,
+    request,
+    seed,
+    server,
+    setup_django,
+    summarize,
+)
+import settings
+
+CHECK_PATHS = ("/login-check", "/role-check", "/permission-check")
+
+# Number of tokens cycled by check requests.
+TOKENS = 50
+
+
+def run_in_process(credentials: list, requests: int, login_requests: int) -> dict:
+
+    """
+    Drive endpoints with Django test client, counting database queries.
+
+    Args:
+        credentials (list): Credentials of users holding check role and permission.
+        requests (int): Number of requests to each check endpoint.
+        login_requests (int): Number of requests to login endpoint.
+
+    Returns:
+        dict: Metrics of each endpoint.
+    """
+
+    # pylint: disable = import-outside-toplevel
+    from django.db import connection
+    from django.test import Client
+
+    client = Client()
+    queries = []
+
+    def count(execute, sql, params, many, context):  # pylint: disable = R0913
+        queries.append(sql)
+        return execute(sql, params, many, context)
+
+    def measure(calls: int, call) -> dict:
+        latencies = []
+        queries.clear()
+
+        with connection.execute_wrapper(count):
+            start = perf_counter()
+
+            for index in range(calls):
+                before = perf_counter()
+                call(index)
+                latencies.append((perf_counter() - before) * 1000)
+
+            elapsed = perf_counter() - start
+
+        return {
+            **summarize(latencies, elapsed),
+            "queries_per_request": round(len(queries) / calls, 3),
+        }
+
+    credentials_cycle = cycle(credentials)
+    results = {
+        "/login": measure(
+            login_requests,
+            lambda _: client.post(
+                "/login", next(credentials_cycle), content_type="application/json"
+            ),
+        )
+    }
+
+    tokens = [
+        client.post("/login", item, content_type="application/json").json()["token"]
+        for item in credentials[:TOKENS]
+    ]
+
+    for path in CHECK_PATHS:
+        results[path] = measure(
+            requests,
+            lambda index, path=path: client.get(
+                path, HTTP_AUTHORIZATION=f"Bearer {tokens[index % len(tokens)]}"
+            ),
+        )
+
+    return results
+
+
+def run_server(  # pylint: disable = too-many-arguments
+    interface: str,
+    port: int,
+    overrides: dict,
+    credentials: list,
+    requests: int,
+    login_requests: int,
+    concurrency: int,
+) -> dict:
+
+    """
+    Drive endpoints through a local server.
+
+    Args:
+        interface (str): Either "asgi" or "wsgi".
+        port (int): Port to listen on.
+        overrides (dict): Project settings to override.
+        credentials (list): Credentials of users holding check role and permission.
+        requests (int): Number of requests to each check endpoint.
+        login_requests (int): Number of requests to login endpoint.
+        concurrency (int): Number of concurrent connections.
+
+    Returns:
+        dict: Metrics of each endpoint.
+    """
+
+    host = "127.0.0.1"
+
+    with server(port, overrides, interface):
+        results = {
+            "/login": load(
+                host,
+                port,
+                [
+                    raw_request(host, "POST", "/login", body=item)
+                    for item in credentials
+                ],
+                login_requests,
+                min(concurrency, login_requests),
+            )
+        }
+
+        tokens = [
+            request(host, port, "POST", "/login", item)["token"]
+            for item in credentials[:TOKENS]
+        ]
+
+        for path in CHECK_PATHS:
+            results[path] = load(
+                host,
+                port,
+                [raw_request(host, "GET", path, token=token) for token in tokens],
+                requests,
+                concurrency,
+            )
+
+    return results
+
+
+def check_budget(results: dict, budget: dict, prefix: str = "") -> list:
+
+    """
+    Compare results against budget.
+
+    Args:
+        results (dict): Benchmark results.
+        budget (dict): Budget, with the same layout as results.
+        prefix (str): Path of current level, used in messages. Defaults to "".
+
+    Returns:
+        list: Messages describing exceeded budgets.
+    """
+
+    violations = []
+
+    for key, limit in budget.items():
+        name = f"{prefix}{key}"
+        value = results.get(key)
+
+        if value is None:
+            continue
+
+        if isinstance(limit, dict):
+            violations += check_budget(value, limit, f"{name}.")
+        elif key == "requests_per_second" and value < limit:
+            violations.append(f"{name}: {value} < {limit}")
+        elif key != "requests_per_second" and value > limit:
+            violations.append(f"{name}: {value} > {limit}")
+
+    return violations
+
+
+@contextmanager
+def mysql_server(port: int) -> Iterator:
+
+    """
+    Run a disposable MariaDB server with docker, as MySQL stand-in, while in context.
+
+    Args:
+        port (int): Port to expose server on.
+
+    Returns:
+        Iterator: Context in which server is running.
+
+    Raises:
+        RuntimeError: If MySQL client is not installed or server didn't start.
+    """
+
+    # pylint: disable = import-outside-toplevel
+    try:
+        import MySQLdb
+    except ImportError as error:
+        raise RuntimeError(
+            "MySQL benchmarks need mysqlclient, install it with pip."
+        ) from error
+
+    environ.update(
+        {
+            "RALPH_BENCHMARK_MYSQL_HOST": "127.0.0.1",
+            "RALPH_BENCHMARK_MYSQL_PORT": str(port),
+            "RALPH_BENCHMARK_MYSQL_USER": "root",
+            "RALPH_BENCHMARK_MYSQL_PASSWORD": "",
+        }
+    )
+
+    with Popen(
+        [
+            "docker",
+            "run",
+            "--rm",
+            "-p",
+            f"127.0.0.1:{port}:3306",
+            "-e",
+            "MARIADB_ALLOW_EMPTY_ROOT_PASSWORD=1",
+            "-e",
+            "MARIADB_DATABASE=ralph_benchmark",
+            "mariadb:10.6",
+        ],
+        stdout=DEVNULL,
+        stderr=DEVNULL,
+    ) as process:
+        try:
+            # Wait until server accepts connections.
+            for _ in range(120):
+                try:
+                    MySQLdb.connect(host="127.0.0.1", port=port, user="root").close()
+                    break
+                except MySQLdb.OperationalError:
+                    sleep(1)
+            else:
+                raise RuntimeError("MySQL stand-in didn't start.")
+
+            yield
+        finally:
+            # Docker removes container when terminated.
+            process.terminate()
+
+
+def main() -> None:  # pylint: disable = too-many-locals
+
+    """
+    Run benchmark suite, save results and check budget.
+    """
+
+    parser = ArgumentParser(description=__doc__)
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--roles", type=int, default=20)
+    parser.add_argument("--permissions", type=int, default=100)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--login-requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--servers", default="in-process,asgi,wsgi")
+    parser.add_argument("--database", choices=("sqlite", "mysql"), default="sqlite")
+    parser.add_argument("--start-mysql", action="store_true")
+    parser.add_argument("--mysql-port", type=int, default=33066)
+    parser.add_argument("--override", action="append", default=[])
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--output", default="benchmark.json")
+    parser.add_argument("--budget")
+    args = parser.parse_args()
+
+    # Apply settings overrides, in this process and in servers.
+    overrides = {
+        name: loads(value)
+        for name, value in (item.split("=", 1) for item in args.override)
+    }
+
+    for name, value in overrides.items():
+        setattr(settings, name, value)
+
+    environ["RALPH_BENCHMARK_DATABASE"] = args.database
+
+    with mysql_server(args.mysql_port) if args.start_mysql else nullcontext():
+        with TemporaryDirectory() as directory:
+            setup_django(
+                f"{directory}/db.sqlite3"
+                if args.database == "sqlite"
+                else "ralph_benchmark"
+            )
+
+            # pylint: disable = import-outside-toplevel
+            from django.core.management import call_command
+
+            call_command("flush", interactive=False, verbosity=0)
+
+            credentials = seed(args.users, args.roles, args.permissions)
+            results = {}
+
+            for name in args.servers.split(","):
+                if name == "in-process":
+                    results[name] = run_in_process(
+                        credentials, args.requests, args.login_requests
+                    )
+                else:
+                    results[name] = run_server(
+                        name,
+                        args.port,
+                        overrides,
+                        credentials,
+                        args.requests,
+                        args.login_requests,
+                        args.concurrency,
+                    )
+
+    output = {
+        "meta": {
+            **vars(args),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+        },
+        "results": results,
+    }
+
+    with open(args.output, "w", encoding="utf-8") as file:
+        file.write(dumps(output, indent=4))
+
+    print(dumps(results, indent=4))
+
+    if args.budget:
+        with open(args.budget, encoding="utf-8") as file:
+            violations = check_budget(results, load_json(file))
+
+        for violation in violations:
+            print(f"Budget exceeded: {violation}", file=sys.stderr)
+
+        if violations:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
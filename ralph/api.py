@@ -5,10 +5,23 @@ from ralph.clients.check.router import router as check_router
 from ralph.common.exceptions import (
     InvalidCredentialException,
     InvalidTokenException,
+    ServiceUnavailableException,
+    TooManyRequestsException,
     UnauthorizedException,
 )
+from ralph.common.renderers import FastJSONRenderer
+from settings import (
+    LOGIN_THROTTLE_WINDOW_IN_SECONDS,
+    PASSWORD_RETRY_AFTER_IN_SECONDS,
+    PROFILE,
+)
 
-api = NinjaAPI()
+# Stateless profile serves no interactive documentation.
+api = (
+    NinjaAPI(docs_url=None, openapi_url=None, renderer=FastJSONRenderer())
+    if PROFILE == "stateless"
+    else NinjaAPI(renderer=FastJSONRenderer())
+)
 
 # Add routes.
 api.add_router("", authentication_router)
@@ -56,3 +69,40 @@ def on_invalid_credential(
     return api.create_response(
         request, {"message": "Username and/or password are incorrect."}, status=400
     )
+
+
+# Add handler for ServiceUnavailableException.
+@api.exception_handler(ServiceUnavailableException)
+def on_service_unavailable(
+    request: object,
+    exc: ServiceUnavailableException,  # pylint: disable = unused-argument
+) -> object:
+
+    """
+    Handler when server is overloaded.
+    """
+
+    response = api.create_response(
+        request, {"message": "Service unavailable. Try again later."}, status=503
+    )
+    response["Retry-After"] = str(PASSWORD_RETRY_AFTER_IN_SECONDS)
+
+    return response
+
+
+# Add handler for TooManyRequestsException.
+@api.exception_handler(TooManyRequestsException)
+def on_too_many_requests(request: object, exc: TooManyRequestsException) -> object:
+
+    """
+    Handler when client is throttled.
+    """
+
+    response = api.create_response(
+        request, {"message": "Too many attempts. Try again later."}, status=429
+    )
+    response["Retry-After"] = str(
+        exc.args[0] if exc.args else LOGIN_THROTTLE_WINDOW_IN_SECONDS
+    )
+
+    return response
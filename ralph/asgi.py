@@ -14,3 +14,8 @@ from django.core.asgi import get_asgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ralph.settings")
 
 application = get_asgi_application()
+
+# pylint: disable = wrong-import-position
+from ralph.common.startup import warmup
+
+warmup()
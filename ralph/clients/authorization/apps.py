@@ -11,3 +11,12 @@ class AuthorizationConfig(AppConfig):
     """
 
     name = "ralph.clients.authorization"
+
+    def ready(self) -> None:
+
+        """
+        Connect signal receivers when application is ready.
+        """
+
+        # pylint: disable = import-outside-toplevel, unused-import
+        import ralph.clients.authorization.signals
@@ -1,15 +1,96 @@
-from typing import List
+from hashlib import sha256
+from time import time
+from typing import Dict, Iterable, List, Optional
+
+from asgiref.sync import sync_to_async
 
-from jose import JWTError, jwt
 from ninja.security import HttpBearer
 
 from ralph.common.exceptions import InvalidTokenException, UnauthorizedException
-from ralph.clients.authorization.models import User, Role
+from ralph.clients.authorization.cache import (
+    principal_cache,
+    rejected_token_cache,
+    token_cache,
+)
+from ralph.clients.authorization.keys import key_ring
+from ralph.clients.authorization.models import User
+from ralph.clients.authorization.permissions import get_grants, get_trie
+from ralph.clients.authorization.registry import permission_registry, role_registry
+from ralph.clients.authorization.revocation import revocation_list
+from ralph.clients.authorization.snapshot import snapshot_reader
+from ralph.clients.authorization.versions import authorization_versions
 from ralph.common.logger import get_logger
-from settings import JWT_ALGORITHM, JWT_SECRET
+from ralph.common.metrics import timed
+from ralph.common.renderers import dumps
+from settings import ASYNC_ENDPOINTS, JWT_STATELESS, ROLE_HIERARCHY
 
 logger = get_logger(__name__)
 
+# User fields returned in principal information.
+USER_FIELDS = ("uuid", "username", "first_name", "last_name", "email", "is_active")
+
+# Lookup of roles granted to users, through closure of role hierarchy if enabled.
+ROLES_LOOKUP = "roles__closure__implied" if ROLE_HIERARCHY else "roles"
+
+
+class Principal:
+
+    """
+    Resolved information on a user, compiled for authorization checks.
+
+    Attributes:
+        payload (dict): Information on the user, such as username, roles and
+            permissions, returned to endpoints.
+        roles_mask (int): Mask of user roles.
+        permissions_mask (int): Mask of user permissions.
+        permissions_trie (PermissionTrie): Trie of user permissions, only if any of
+            them is a wildcard grant.
+    """
+
+    __slots__ = (
+        "payload",
+        "roles_mask",
+        "permissions_mask",
+        "permissions_trie",
+        "_encoded_payload",
+    )
+
+    def __init__(self, payload: dict) -> None:
+
+        """
+        Constructor to principal class.
+
+        Args:
+            payload (dict): Information on the user, with roles and permissions.
+
+        Returns:
+            None
+        """
+
+        self.payload = payload
+        self.roles_mask = role_registry.mask(payload["roles"])
+        self.permissions_mask = permission_registry.mask(payload["permissions"])
+        self.permissions_trie = get_trie(payload["permissions"])
+        self._encoded_payload = None
+
+    @property
+    def encoded_payload(self) -> bytes:
+
+        """
+        Get payload encoded as JSON.
+
+        Payload is encoded once and kept along with principal, so cached principals
+        are returned by endpoints without encoding them again.
+
+        Returns:
+            bytes: Encoded payload.
+        """
+
+        if self._encoded_payload is None:
+            self._encoded_payload = dumps(self.payload)
+
+        return self._encoded_payload
+
 
 class Authorization(HttpBearer):
 
@@ -25,7 +106,12 @@ class Authorization(HttpBearer):
     Most of the configurations are inherited from HttpBearer class, from Django Ninja.
     """
 
-    def __init__(self, roles: List[str] = None, permissions: List[str] = None) -> None:
+    def __init__(
+        self,
+        roles: List[str] = None,
+        permissions: List[str] = None,
+        register: bool = True,
+    ) -> None:
 
         """
         Constructor to authorization class.
@@ -39,6 +125,9 @@ class Authorization(HttpBearer):
             permissions (List[str]): List of permissions that is necessary to access
                 endpoint. User must have at least one of those permissions. Defaults to
                 None.
+            register (bool): If required names get a bit when they have none yet.
+                Requirements sent by clients must not register names, so they can't
+                grow registries. Defaults to True.
 
         Returns:
             None
@@ -52,6 +141,10 @@ class Authorization(HttpBearer):
         # Set passed permissions as instance parameter.
         self.permissions = permissions if permissions else []
 
+        # Compile requirements into masks, once for endpoint.
+        self.roles_mask = role_registry.mask(self.roles, register)
+        self.permissions_mask = permission_registry.mask(self.permissions, register)
+
     def authenticate(self, request: object, token: str) -> dict:
 
         """
@@ -69,6 +162,35 @@ class Authorization(HttpBearer):
                 permissions.
         """
 
+        decoded_token = self.read_token(request, token)
+
+        # Get principal from token claims or cache, resolving it from database if
+        # missing.
+        principal = self.get_known_principal(decoded_token)
+
+        if principal is None:
+            principal = self.get_principal(decoded_token.get("iss"))
+
+        self.check_authorizations(principal)
+
+        # Keep principal in request, so endpoints can use its encoded payload.
+        request.principal = principal
+
+        return principal.payload
+
+    def read_token(self, request: object, token: str) -> dict:
+
+        """
+        Log requested access and decode token.
+
+        Args:
+            request (object): Object containing request information.
+            token (str): Bearer token passed via header.
+
+        Returns:
+            dict: Payload information stored in token.
+        """
+
         logger.info("Protected endpoint: %s.", request.path)
 
         logger.info(
@@ -80,31 +202,55 @@ class Authorization(HttpBearer):
         # Try to decode passed token.
         decoded_token = self.decode_token(token)
 
-        # Retrieve UUID from payload.
-        uuid = decoded_token.get("iss")
+        logger.info("User uuid: %s.", decoded_token.get("iss"))
 
-        logger.info("User uuid: %s.", uuid)
+        return decoded_token
 
-        # Try to get user object from UUID.
-        user = self.get_user(uuid)
+    @timed("resolve_known")
+    def get_known_principal(
+        self, decoded_token: dict, checked: bool = False
+    ) -> Optional[Principal]:
 
-        # Get roles from user.
-        user_roles = self.get_user_roles(user)
+        """
+        Get principal without resolving it from database.
 
-        # Get permission from user.
-        user_permissions = self.get_user_permissions(user_roles)
+        Principal is built from token claims, if they were embedded at login and
+        their authorization version is current, or retrieved from principal cache.
 
-        # Creates an object with authorization checking.
-        authorizations = {
-            "roles": any(role in self.roles for role in user_roles)
-            if self.roles
-            else True,
-            "permissions": any(
-                permission in self.permissions for permission in user_permissions
-            )
-            if self.permissions
-            else True,
-        }
+        Args:
+            decoded_token (dict): Payload information stored in token.
+            checked (bool): If authorization version of claims was already checked.
+                Defaults to False.
+
+        Returns:
+            Optional[Principal]: Information on the user, or None if it must be
+                resolved from database.
+        """
+
+        if JWT_STATELESS and "ver" in decoded_token:
+            return self.get_token_principal(decoded_token, checked)
+
+        principal = principal_cache.get(decoded_token.get("iss"))
+
+        if principal is not None:
+            logger.info("Principal found in cache.")
+
+        return principal
+
+    @timed("check")
+    def check_authorizations(self, principal: Principal) -> None:
+
+        """
+        Check if principal meets roles and permissions required by instance.
+
+        Args:
+            principal (Principal): Information on the user requesting access.
+
+        Returns:
+            None
+        """
+
+        authorizations = self.get_authorizations(principal)
 
         logger.info("Authorizations: %s.", authorizations)
 
@@ -113,25 +259,163 @@ class Authorization(HttpBearer):
             logger.warning("User doesn't have necessary authorization.")
             raise UnauthorizedException
 
+    def get_authorizations(self, principal: Principal) -> dict:
+
+        """
+        Evaluate roles and permissions required by instance against principal.
+
+        Args:
+            principal (Principal): Information on the user requesting access.
+
+        Returns:
+            dict: If roles and if permissions requirements are met.
+        """
+
+        # Creates an object with authorization checking.
         return {
-            "uuid": decoded_token.get("iss"),
-            "username": user.username,
-            "first_name": user.first_name,
-            "last_name": user.last_name,
-            "email": user.email,
-            "is_active": user.is_active,
-            "roles": user_roles,
-            "permissions": user_permissions,
+            "roles": bool(principal.roles_mask & self.roles_mask)
+            if self.roles
+            else True,
+            "permissions": self.has_permissions(principal)
+            if self.permissions
+            else True,
         }
 
+    def has_permissions(self, principal: Principal) -> bool:
+
+        """
+        Check if principal has any permission required by instance.
+
+        Exact grants are matched by masks first. Only principals with wildcard grants
+        are matched against their trie.
+
+        Args:
+            principal (Principal): Information on the user requesting access.
+
+        Returns:
+            bool: True if any required permission is granted.
+        """
+
+        if principal.permissions_mask & self.permissions_mask:
+            return True
+
+        trie = principal.permissions_trie
+
+        return trie is not None and trie.match_any(self.permissions)
+
+    def get_principal(self, uuid: str) -> Principal:
+
+        """
+        Resolve principal from database and store it in cache.
+
+        Args:
+            uuid (str): User uuid.
+
+        Returns:
+            Principal: Information on the user, such as username, roles and
+                permissions.
+        """
+
+        principal = self.get_principals([uuid]).get(uuid)
+
+        if principal is None:
+            logger.warning("User doesn't exist.")
+            raise InvalidTokenException
+
+        return principal
+
+    @staticmethod
+    @timed("resolve_database", queries=True)
+    def get_principals(uuids: Iterable[str]) -> Dict[str, Principal]:
+
+        """
+        Resolve principals of several users from database and store them in cache.
+
+        Args:
+            uuids (Iterable[str]): User uuids.
+
+        Returns:
+            Dict[str, Principal]: Principals by user uuid. Users that don't exist are
+                missing.
+        """
+
+        # Read invalidation counter before loading, so stale loads are not cached.
+        epoch = principal_cache.epoch
+
+        # Get users, with their roles and permissions, from UUIDs.
+        users = Authorization.get_users(uuids)
+
+        principals = {}
+
+        for uuid, user in users.items():
+            principals[uuid] = Principal(
+                {
+                    **{field: user[field] for field in USER_FIELDS},
+                    "roles": Authorization.get_user_roles(user),
+                    "permissions": Authorization.get_user_permissions(user),
+                }
+            )
+
+            principal_cache.set(uuid, principals[uuid], epoch=epoch)
+
+        return principals
+
     @staticmethod
+    def get_token_principal(decoded_token: dict, checked: bool = False) -> Principal:
+
+        """
+        Build principal from authorization claims of token.
+
+        Claims are trusted only if they were issued with the current authorization
+        version of user, that is, if no role or permission changed since login.
+
+        Args:
+            decoded_token (dict): Payload information stored in token.
+            checked (bool): If authorization version of claims was already checked.
+                Defaults to False.
+
+        Returns:
+            Principal: Information on the user, such as username, roles and
+                permissions.
+        """
+
+        uuid = decoded_token.get("iss")
+
+        if (
+            not checked
+            and not authorization_versions.are_current([(uuid, decoded_token["ver"])])[
+                0
+            ]
+        ):
+            logger.warning("Token authorization version is outdated.")
+            raise InvalidTokenException
+
+        logger.info("Principal found in token claims.")
+
+        return Principal(
+            {
+                "uuid": uuid,
+                **{
+                    field: decoded_token.get(field)
+                    for field in USER_FIELDS
+                    if field != "uuid"
+                },
+                "roles": decoded_token.get("roles", []),
+                "permissions": decoded_token.get("permissions", []),
+            }
+        )
+
+    @staticmethod
+    @timed("decode")
     def decode_token(token: str) -> dict:
 
         """
         Checks if token is valid and decodes it.
 
         This function tries to decode the passed token and also validates its
-        authenticity.
+        authenticity. Decoded payloads are cached until token expiration and rejected
+        tokens are cached for a short time, both keyed by token digest, so replayed
+        tokens skip signature verification. Revocation is checked on every call.
 
         Args:
             token (str): Bearer token.
@@ -140,82 +424,291 @@ class Authorization(HttpBearer):
             dict: Payload information stored in token.
         """
 
-        # Try to decode token.
-        try:
-            logger.info("Token is valid.")
-            decoded_token = jwt.decode(token, JWT_SECRET, JWT_ALGORITHM)
-        except JWTError as exc:
-            logger.warning("Token is not valid.")
-            raise InvalidTokenException from exc
+        digest = sha256(token.encode()).digest()
+
+        # Reject token if it was rejected recently.
+        if rejected_token_cache.get(digest):
+            logger.warning("Token is not valid (Cached).")
+            raise InvalidTokenException
+
+        # Use cached payload, making sure token is not expired.
+        decoded_token = token_cache.get(digest)
+
+        if decoded_token is not None and decoded_token["exp"] > time():
+            logger.info("Token is valid (Cached).")
+        else:
+            # Try to decode token.
+            try:
+                logger.info("Token is valid.")
+                decoded_token = key_ring.decode(token)
+            except InvalidTokenException:
+                logger.warning("Token is not valid.")
+                rejected_token_cache.set(digest, True)
+                raise
+
+            # Cache payload until token expiration.
+            if "exp" in decoded_token:
+                token_cache.set(
+                    digest, decoded_token, ttl=decoded_token["exp"] - time()
+                )
+
+        # Reject token if it was revoked, even if its payload was cached.
+        if revocation_list.is_revoked(
+            decoded_token.get("jti"), decoded_token.get("iss"), decoded_token.get("iat")
+        ):
+            logger.warning("Token was revoked.")
+            raise InvalidTokenException
 
         return decoded_token
 
     @staticmethod
-    def get_user(uuid: str) -> object:
+    def get_user(uuid: str) -> dict:
 
         """
-        Get user object from database.
-
-        This function gets user entry in the database.
+        Get user information, roles and permissions from database.
 
         Args:
             uuid (str): User uuid to filter entries.
 
         Returns:
-            object: Object with user information.
+            dict: User fields, plus role names and permission names of user.
         """
 
-        # Try to get user object.
-        try:
-            return User.objects.prefetch_related("roles").filter(uuid=uuid).get()
-        except User.DoesNotExist as exc:
+        user = Authorization.get_users([uuid]).get(uuid)
+
+        if user is None:
             logger.warning("User doesn't exist.")
-            raise InvalidTokenException from exc
+            raise InvalidTokenException
+
+        return user
 
     @staticmethod
-    def get_user_roles(user: object) -> List[str]:
+    def get_users(uuids: Iterable[str]) -> Dict[str, dict]:
 
         """
-        Get user roles names.
+        Get information, roles and permissions of several users from database.
 
-        This function gets roles of user in the database and return a list of the
-        name of all roles.
+        This function gets user entries in the database joined with their roles and
+        the roles permissions, so everything is retrieved with a single query. The
+        query returns one row for each distinct user, role and permission. With role
+        hierarchy, roles are joined through the closure table, so inherited roles and
+        their permissions are included by the same query. Users found in the shared
+        snapshot, and not changed since it was published, are not queried.
 
         Args:
-            user (object):
+            uuids (Iterable[str]): User uuids to filter entries.
 
         Returns:
-            List[str]: List of role names.
+            Dict[str, dict]: User fields, plus role names and permission names, by
+                user uuid. Users that don't exist are missing.
         """
 
-        # Retrieve user roles.
-        user_roles = [role.name for role in user.roles.all()]
+        uuids = list(uuids)
+
+        # Read users from shared snapshot first, and the rest from database.
+        users = snapshot_reader.get_users(uuids)
+        missing = [uuid for uuid in uuids if uuid not in users]
+
+        if not missing:
+            return users
+
+        rows = (
+            User.objects.filter(uuid__in=missing)
+            .values_list(
+                *USER_FIELDS,
+                f"{ROLES_LOOKUP}__name",
+                f"{ROLES_LOOKUP}__permissions__name",
+            )
+            .distinct()
+        )
+
+        # Use dicts as ordered sets to remove duplicates.
+        for *fields, role, permission in rows:
+            user = users.get(fields[0])
 
-        return user_roles
+            if user is None:
+                user = users[fields[0]] = {
+                    **dict(zip(USER_FIELDS, fields)),
+                    "roles": {},
+                    "permissions": {},
+                }
+
+            if role is not None:
+                user["roles"][role] = None
+
+            if permission is not None:
+                user["permissions"][permission] = None
+
+        return users
 
     @staticmethod
-    def get_user_permissions(roles: List[str]) -> bool:
+    def get_user_roles(user: dict) -> List[str]:
 
         """
-        Get roles permission names.
+        Get user roles names.
+
+        Args:
+            user (dict): User information returned by get_user method.
+
+        Returns:
+            List[str]: List of role names.
+        """
+
+        return list(user["roles"])
+
+    @staticmethod
+    def get_user_permissions(user: dict) -> List[str]:
 
-        This function gets roles permissions in the database and return a list of the
-        name of all permissions.
+        """
+        Get user permission names, granted by any of their roles.
 
         Args:
-            roles (List[str]): List of user roles names.
+            user (dict): User information returned by get_user method.
 
         Returns:
             List[str]: List of permissions names.
         """
 
-        # Get role objects of user roles.
-        roles = Role.objects.prefetch_related("permissions").filter(name__in=roles)
+        return list(user["permissions"])
+
+
+@timed("authorize_many", queries=True)
+def authorize_many(uuids: List[str], requirements: List[dict]) -> List[List[bool]]:
+
+    """
+    Evaluate requirements for many users at once.
+
+    Each requirement has optional lists of roles and permissions and is evaluated as
+    an Authorization instance with them would do: user must have any of the roles and
+    any of the permissions. Only the roles and permissions named by requirements are
+    queried, with set based queries over join tables, so the whole matrix costs three
+    queries regardless of its size. Requirements are compiled once granted names are
+    registered, and names granted to none of the users are not registered, as they
+    are met by none of them.
+
+    Args:
+        uuids (List[str]): User uuids.
+        requirements (List[dict]): Requirements, with "roles" and "permissions" keys.
+
+    Returns:
+        List[List[bool]]: For each user, if each requirement is met. Users that don't
+            exist meet no requirement.
+    """
+
+    roles = {role for item in requirements for role in item.get("roles") or []}
 
-        # Get user permission based on permissions of their roles.
-        user_permissions = [
-            permission.name for role in roles for permission in role.permissions.all()
+    # Wildcard grants of required permissions are queried along with them.
+    permissions = {
+        grant
+        for item in requirements
+        for permission in item.get("permissions") or []
+        for grant in get_grants(permission)
+    }
+
+    existing = set(User.objects.filter(uuid__in=uuids).values_list("uuid", flat=True))
+    granted = {uuid: {"roles": [], "permissions": []} for uuid in existing}
+
+    if roles:
+        for uuid, role in (
+            User.objects.filter(
+                uuid__in=existing, **{f"{ROLES_LOOKUP}__name__in": roles}
+            )
+            .values_list("uuid", f"{ROLES_LOOKUP}__name")
+            .distinct()
+        ):
+            granted[uuid]["roles"].append(role)
+
+    if permissions:
+        for uuid, permission in (
+            User.objects.filter(
+                uuid__in=existing,
+                **{f"{ROLES_LOOKUP}__permissions__name__in": permissions},
+            )
+            .values_list("uuid", f"{ROLES_LOOKUP}__permissions__name")
+            .distinct()
+        ):
+            granted[uuid]["permissions"].append(permission)
+
+    principals = {uuid: Principal(item) for uuid, item in granted.items()}
+
+    # Compile requirements once names granted to users are registered.
+    authorizations = [
+        Authorization(
+            roles=requirement.get("roles"),
+            permissions=requirement.get("permissions"),
+            register=False,
+        )
+        for requirement in requirements
+    ]
+
+    return [
+        [
+            uuid in principals
+            and all(item.get_authorizations(principals[uuid]).values())
+            for item in authorizations
         ]
+        for uuid in uuids
+    ]
+
+
+class AsyncAuthorization(Authorization):
+
+    """
+    Handles authorization, as Authorization class, for async endpoints.
+
+    Token decoding, principal cache and token claims, checked against authorization
+    versions kept in memory, are handled inline in the event loop. Principals missing
+    from cache are resolved from database, in a thread managed by Django, so the
+    event loop is never blocked by the database.
+    """
+
+    # Make Django Ninja await authentication.
+    is_async = True
+
+    # Django Ninja awaits authenticate when is_async is set, as this version has no
+    # async bearer class to derive from.
+    async def authenticate(  # pylint: disable = invalid-overridden-method
+        self, request: object, token: str
+    ) -> dict:
+
+        """
+        Authenticate access based on configuration passed to constructor.
+
+        Args:
+            request (object): Object containing request information.
+            token (str): Bearer token passed via header.
+
+        Returns:
+            dict: Information on the user requesting access, such as username, roles and
+                permissions.
+        """
+
+        decoded_token = self.read_token(request, token)
+
+        # Get principal from token claims or cache, resolving it from database if
+        # missing. Token claims are checked against versions read from database until
+        # they are loaded in memory.
+        if (
+            JWT_STATELESS
+            and "ver" in decoded_token
+            and not authorization_versions.loaded
+        ):
+            principal = await sync_to_async(self.get_known_principal)(decoded_token)
+        else:
+            principal = self.get_known_principal(decoded_token)
+
+        if principal is None:
+            principal = await sync_to_async(self.get_principal)(
+                decoded_token.get("iss")
+            )
+
+        self.check_authorizations(principal)
+
+        # Keep principal in request, so endpoints can use its encoded payload.
+        request.principal = principal
+
+        return principal.payload
+
 
-        # Use set to remove duplicates.
-        return list(set(user_permissions))
+# Authorization class matching serving mode of endpoints.
+EndpointAuthorization = AsyncAuthorization if ASYNC_ENDPOINTS else Authorization
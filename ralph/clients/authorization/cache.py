@@ -0,0 +1,222 @@
+"""
+In-process caches used by authorization.
+
+This module implements a bounded least recently used cache with time to live for
+its entries, and creates the instances shared by the authorization flow. Caches are
+local to each worker process and are kept consistent by the model signals declared
+in the signals module.
+"""
+
+from collections import OrderedDict
+from threading import Lock
+from time import monotonic
+from typing import Any, Hashable
+
+from ralph.common.metrics import metrics
+from settings import (
+    PERMISSION_TRIE_CACHE_SIZE,
+    PRINCIPAL_CACHE_SIZE,
+    PRINCIPAL_CACHE_TTL_IN_SECONDS,
+    REJECTED_TOKEN_CACHE_SIZE,
+    REJECTED_TOKEN_CACHE_TTL_IN_SECONDS,
+    TOKEN_CACHE_SIZE,
+)
+
+
+class LRUCache:
+
+    """
+    Thread safe least recently used cache with expiration of entries.
+
+    When the cache is full, the least recently used entry is evicted to give room to
+    the new one. Entries older than their time to live are dropped when accessed.
+
+    Attributes:
+        max_size (int): Maximum number of entries kept. Zero disables the cache.
+        ttl (float): Default time to live of entries, in seconds.
+        hits (int): Number of lookups that found a valid entry.
+        misses (int): Number of lookups that found no valid entry.
+        evictions (int): Number of entries removed to respect max size.
+        expirations (int): Number of entries removed due to time to live.
+    """
+
+    def __init__(self, max_size: int, ttl: float) -> None:
+
+        """
+        Constructor to cache class.
+
+        Args:
+            max_size (int): Maximum number of entries kept.
+            ttl (float): Default time to live of entries, in seconds.
+
+        Returns:
+            None
+        """
+
+        self.max_size = max_size
+        self.ttl = ttl
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+        # Entries are stored as key -> (expiration, value), ordered by last use.
+        self._entries = OrderedDict()
+        self._lock = Lock()
+
+        # Incremented on every invalidation, so loads started before it are dropped.
+        self._epoch = 0
+
+    @property
+    def epoch(self) -> int:
+
+        """
+        Invalidation counter of the cache.
+
+        Read it before loading a value from the database and pass it to set method,
+        so a value loaded while an invalidation happened is not stored.
+
+        Returns:
+            int: Current invalidation counter.
+        """
+
+        return self._epoch
+
+    def get(self, key: Hashable) -> Any:
+
+        """
+        Get value from cache.
+
+        Args:
+            key (Hashable): Key of entry.
+
+        Returns:
+            Any: Stored value or None if there is no valid entry.
+        """
+
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is None:
+                self.misses += 1
+                return None
+
+            # Drop entry if its time to live is over.
+            if entry[0] <= monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+
+            return entry[1]
+
+    def set(
+        self, key: Hashable, value: Any, ttl: float = None, epoch: int = None
+    ) -> None:
+
+        """
+        Store value in cache.
+
+        Args:
+            key (Hashable): Key of entry.
+            value (Any): Value to be stored.
+            ttl (float): Time to live of entry, in seconds. Defaults to cache ttl.
+            epoch (int): Invalidation counter read before value was loaded. If any
+                invalidation happened since then, value is not stored. Defaults to
+                None.
+
+        Returns:
+            None
+        """
+
+        if self.max_size <= 0:
+            return
+
+        expiration = monotonic() + (self.ttl if ttl is None else ttl)
+
+        with self._lock:
+            if epoch is not None and epoch != self._epoch:
+                return
+
+            self._entries[key] = (expiration, value)
+            self._entries.move_to_end(key)
+
+            # Evict least recently used entries while cache is over its size.
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def delete(self, key: Hashable) -> None:
+
+        """
+        Remove entry from cache.
+
+        Args:
+            key (Hashable): Key of entry.
+
+        Returns:
+            None
+        """
+
+        with self._lock:
+            self._epoch += 1
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+
+        """
+        Remove all entries from cache.
+
+        Returns:
+            None
+        """
+
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+
+    def stats(self) -> dict:
+
+        """
+        Get cache counters, useful to size the cache.
+
+        Returns:
+            dict: Size, maximum size and hit, miss, eviction and expiration counters.
+        """
+
+        with self._lock:
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+# Cache of resolved principals, keyed by user uuid.
+principal_cache = LRUCache(PRINCIPAL_CACHE_SIZE, PRINCIPAL_CACHE_TTL_IN_SECONDS)
+
+# Cache of decoded token payloads, keyed by token digest. Entries live until token
+# expiration, so no default time to live is needed.
+token_cache = LRUCache(TOKEN_CACHE_SIZE, 0)
+
+# Cache of recently rejected tokens, keyed by token digest.
+rejected_token_cache = LRUCache(
+    REJECTED_TOKEN_CACHE_SIZE, REJECTED_TOKEN_CACHE_TTL_IN_SECONDS
+)
+
+# Cache of compiled permission tries, keyed by set of granted permissions. Tries
+# only depend on their key, so entries never expire.
+trie_cache = LRUCache(PERMISSION_TRIE_CACHE_SIZE, float("inf"))
+
+# Expose cache statistics as metrics.
+metrics.register_collector("ralph_principal_cache", principal_cache.stats)
+metrics.register_collector("ralph_token_cache", token_cache.stats)
+metrics.register_collector("ralph_rejected_token_cache", rejected_token_cache.stats)
+metrics.register_collector("ralph_trie_cache", trie_cache.stats)
@@ -0,0 +1,293 @@
+"""
+Verify passwords in a bounded worker pool.
+
+Password verification with bcrypt is CPU bound and slow by design. This module runs
+it in a dedicated pool of threads (bcrypt releases the GIL while hashing), with a
+bounded number of pending verifications. When the pool is saturated, verification
+fails fast, so login storms can't starve the workers serving other requests. bcrypt
+is only imported on first verification.
+
+Passwords whose hash has another cost factor than the one set are rehashed in the
+same pool after a successful login, so costs converge to the calibrated one without
+slowing logins down. Verification latency is recorded by cost factor.
+"""
+
+from asyncio import wrap_future
+from concurrent.futures import Future, ThreadPoolExecutor
+from threading import BoundedSemaphore, Lock
+from time import perf_counter
+from typing import Callable, Optional
+
+from ralph.common.exceptions import ServiceUnavailableException
+from ralph.common.logger import get_logger
+from ralph.common.metrics import metrics
+from settings import BCRYPT_ROUNDS, PASSWORD_QUEUE_SIZE, PASSWORD_WORKERS
+
+logger = get_logger(__name__)
+
+
+def get_cost(hashed: str) -> Optional[int]:
+
+    """
+    Get cost factor of bcrypt hash.
+
+    Args:
+        hashed (str): bcrypt hash, such as "$2b$12$...".
+
+    Returns:
+        Optional[int]: Cost factor, or None if hash is malformed.
+    """
+
+    try:
+        return int(hashed.split("$")[2])
+    except (IndexError, ValueError):
+        return None
+
+
+class PasswordVerifier:
+
+    """
+    Bounded pool of password verification workers.
+
+    Attributes:
+        workers (int): Number of verifications running in parallel.
+        queue_size (int): Number of verifications allowed to wait for a worker.
+        pending (int): Number of verifications running or waiting.
+        verified (int): Number of finished verifications.
+        rejected (int): Number of verifications refused because pool was full.
+        wait_time (float): Total time verifications waited for a worker, in seconds.
+        verify_time (float): Total time spent verifying, in seconds.
+        max_verify_time (float): Longest verification, in seconds.
+        rounds (int): Cost factor of new hashes. None disables rehash.
+        rehashed (int): Number of passwords rehashed.
+        rehash_skipped (int): Number of rehashes skipped because pool was full.
+    """
+
+    def __init__(self, workers: int, queue_size: int, rounds: int = None) -> None:
+
+        """
+        Constructor to password verifier class.
+
+        Args:
+            workers (int): Number of verifications running in parallel.
+            queue_size (int): Number of verifications allowed to wait for a worker.
+            rounds (int): Cost factor of new hashes. Defaults to None.
+
+        Returns:
+            None
+        """
+
+        self.workers = workers
+        self.queue_size = queue_size
+        self.rounds = rounds
+
+        self.pending = 0
+        self.verified = 0
+        self.rejected = 0
+        self.wait_time = 0.0
+        self.verify_time = 0.0
+        self.max_verify_time = 0.0
+        self.rehashed = 0
+        self.rehash_skipped = 0
+
+        self._executor = ThreadPoolExecutor(workers, thread_name_prefix="password")
+        self._slots = BoundedSemaphore(workers + queue_size)
+        self._lock = Lock()
+
+    def submit(self, password: str, hashed: str) -> Future:
+
+        """
+        Schedule password verification.
+
+        Args:
+            password (str): Password value to check against hash.
+            hashed (str): Stored bcrypt hash.
+
+        Returns:
+            Future: Future resolving to True if password matches hash.
+        """
+
+        # Fail fast if all workers are busy and queue is full. Slot is released by
+        # worker once verification is done, so it can't be held in a with statement.
+        if not self._slots.acquire(  # pylint: disable = consider-using-with
+            blocking=False
+        ):
+            with self._lock:
+                self.rejected += 1
+
+            logger.warning("Password verification pool is full.")
+            raise ServiceUnavailableException
+
+        with self._lock:
+            self.pending += 1
+
+        return self._executor.submit(self._verify, password, hashed, perf_counter())
+
+    def verify(self, password: str, hashed: str) -> bool:
+
+        """
+        Verify password, waiting for result.
+
+        Args:
+            password (str): Password value to check against hash.
+            hashed (str): Stored bcrypt hash.
+
+        Returns:
+            bool: True if password matches hash.
+        """
+
+        return self.submit(password, hashed).result()
+
+    async def averify(self, password: str, hashed: str) -> bool:
+
+        """
+        Verify password, awaiting result without blocking event loop.
+
+        Args:
+            password (str): Password value to check against hash.
+            hashed (str): Stored bcrypt hash.
+
+        Returns:
+            bool: True if password matches hash.
+        """
+
+        return await wrap_future(self.submit(password, hashed))
+
+    def rehash(self, password: str, hashed: str, update: Callable[[str], None]) -> None:
+
+        """
+        Rehash password in background, if its hash has another cost factor.
+
+        Rehash takes a pool slot like verifications do. If the pool is full, it is
+        skipped, and tried again on next login.
+
+        Args:
+            password (str): Verified password value.
+            hashed (str): Stored bcrypt hash.
+            update (Callable[[str], None]): Function storing new hash.
+
+        Returns:
+            None
+        """
+
+        if self.rounds is None or get_cost(hashed) == self.rounds:
+            return
+
+        # Slot is released by worker once rehash is done, as for verifications.
+        if not self._slots.acquire(  # pylint: disable = consider-using-with
+            blocking=False
+        ):
+            with self._lock:
+                self.rehash_skipped += 1
+
+            return
+
+        with self._lock:
+            self.pending += 1
+
+        self._executor.submit(self._rehash, password, update)
+
+    def stats(self) -> dict:
+
+        """
+        Get pool counters, useful to tune its capacity.
+
+        Returns:
+            dict: Pool size, queue depth and verification counters and latencies.
+        """
+
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "queue_size": self.queue_size,
+                "pending": self.pending,
+                "queued": max(self.pending - self.workers, 0),
+                "verified": self.verified,
+                "rejected": self.rejected,
+                "wait_seconds_total": self.wait_time,
+                "verify_seconds_total": self.verify_time,
+                "verify_seconds_max": self.max_verify_time,
+                "rounds": self.rounds or 0,
+                "rehashed": self.rehashed,
+                "rehash_skipped": self.rehash_skipped,
+            }
+
+    def _verify(self, password: str, hashed: str, submitted: float) -> bool:
+
+        """
+        Verify password in worker thread and record its timings.
+
+        Args:
+            password (str): Password value to check against hash.
+            hashed (str): Stored bcrypt hash.
+            submitted (float): Time when verification was submitted.
+
+        Returns:
+            bool: True if password matches hash.
+        """
+
+        started = perf_counter()
+
+        # pylint: disable = import-outside-toplevel
+        from bcrypt import checkpw
+
+        try:
+            return checkpw(password.encode(), hashed.encode())
+        finally:
+            finished = perf_counter()
+
+            metrics.observe("ralph_password_wait_seconds", started - submitted)
+            metrics.observe(
+                "ralph_password_verify_seconds",
+                finished - started,
+                cost=str(get_cost(hashed)),
+            )
+
+            with self._lock:
+                self.pending -= 1
+                self.verified += 1
+                self.wait_time += started - submitted
+                self.verify_time += finished - started
+                self.max_verify_time = max(self.max_verify_time, finished - started)
+
+            self._slots.release()
+
+    def _rehash(self, password: str, update: Callable[[str], None]) -> None:
+
+        """
+        Hash password with cost factor set and store it, in worker thread.
+
+        Args:
+            password (str): Verified password value.
+            update (Callable[[str], None]): Function storing new hash.
+
+        Returns:
+            None
+        """
+
+        # pylint: disable = import-outside-toplevel
+        from bcrypt import gensalt, hashpw
+
+        try:
+            update(hashpw(password.encode(), gensalt(self.rounds)).decode())
+        except Exception:  # pylint: disable = broad-except
+            logger.exception("Password rehash failed.")
+        else:
+            metrics.increment("ralph_password_rehashes_total", cost=str(self.rounds))
+
+            with self._lock:
+                self.rehashed += 1
+        finally:
+            with self._lock:
+                self.pending -= 1
+
+            self._slots.release()
+
+
+# Pool shared by login requests of the process.
+password_verifier = PasswordVerifier(
+    PASSWORD_WORKERS, PASSWORD_QUEUE_SIZE, BCRYPT_ROUNDS
+)
+
+# Expose pool statistics as metrics.
+metrics.register_collector("ralph_password_pool", password_verifier.stats)
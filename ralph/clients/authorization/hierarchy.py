@@ -0,0 +1,182 @@
+"""
+Maintain closure table of role hierarchy.
+
+Roles may inherit other roles, which grants their roles and permissions as well. The
+closure table holds, for each role, every role it implies, itself included, so
+effective roles and permissions are read with a single join. Entries are recomputed
+from inheritance edges for the roles affected by each change only. Hierarchies are
+small, so all edges are read at once and walked in memory.
+"""
+
+from collections import defaultdict
+from typing import Dict, Hashable, Iterable, List, Set
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+
+from ralph.clients.authorization.models import Role, RoleClosure
+
+
+def get_edges() -> Dict[Hashable, List[Hashable]]:
+
+    """
+    Get inheritance edges of all roles.
+
+    Returns:
+        Dict[Hashable, List[Hashable]]: Keys of inherited roles, by role key.
+    """
+
+    edges = defaultdict(list)
+
+    for role, inherited in Role.inherits.through.objects.values_list(
+        "from_role_id", "to_role_id"
+    ):
+        edges[role].append(inherited)
+
+    return edges
+
+
+def get_implied(edges: Dict[Hashable, List[Hashable]], role: Hashable) -> Set[Hashable]:
+
+    """
+    Get roles implied by role, walking inheritance edges.
+
+    Args:
+        edges (Dict[Hashable, List[Hashable]]): Keys of inherited roles, by role key.
+        role (Hashable): Role key.
+
+    Returns:
+        Set[Hashable]: Keys of implied roles, role itself included.
+    """
+
+    implied = {role}
+    pending = [role]
+
+    while pending:
+        for inherited in edges.get(pending.pop(), ()):
+            if inherited not in implied:
+                implied.add(inherited)
+                pending.append(inherited)
+
+    return implied
+
+
+def get_ancestors(roles: Iterable[Hashable]) -> Set[Hashable]:
+
+    """
+    Get roles implying any of the roles.
+
+    Args:
+        roles (Iterable[Hashable]): Role keys.
+
+    Returns:
+        Set[Hashable]: Keys of roles implying them, roles themselves included.
+    """
+
+    roles = set(roles)
+
+    return roles | set(
+        RoleClosure.objects.filter(implied__in=roles).values_list("role_id", flat=True)
+    )
+
+
+def check_acyclic(roles: Iterable[Hashable], inherited: Iterable[Hashable]) -> None:
+
+    """
+    Check that roles inheriting roles don't make hierarchy cyclic.
+
+    Args:
+        roles (Iterable[Hashable]): Keys of inheriting roles.
+        inherited (Iterable[Hashable]): Keys of inherited roles.
+
+    Returns:
+        None
+
+    Raises:
+        ValidationError: If any inherited role implies any inheriting role.
+    """
+
+    roles = set(roles)
+    inherited = set(inherited)
+
+    if (
+        roles & inherited
+        or RoleClosure.objects.filter(role__in=inherited, implied__in=roles).exists()
+    ):
+        raise ValidationError("Role hierarchy can't be cyclic.")
+
+
+def check_edges_acyclic(roles: Iterable[Hashable]) -> None:
+
+    """
+    Check that inheritance edges of roles, already written, don't make hierarchy
+    cyclic.
+
+    Unlike check_acyclic, edges are walked instead of closure table, so it holds for
+    edges written without model signals, before closure is rebuilt.
+
+    Args:
+        roles (Iterable[Hashable]): Keys of inheriting roles.
+
+    Returns:
+        None
+
+    Raises:
+        ValidationError: If any role implies itself through its inherited roles.
+    """
+
+    edges = get_edges()
+
+    for role in set(roles):
+        for inherited in edges.get(role, ()):
+            if role in get_implied(edges, inherited):
+                raise ValidationError("Role hierarchy can't be cyclic.")
+
+
+def refresh_closure(roles: Iterable[Hashable]) -> None:
+
+    """
+    Recompute closure entries of roles. Roles deleted meanwhile, such as the ones
+    deleted along with a role by the same query, are skipped.
+
+    Args:
+        roles (Iterable[Hashable]): Role keys.
+
+    Returns:
+        None
+    """
+
+    roles = set(roles)
+
+    if not roles:
+        return
+
+    roles = set(Role.objects.filter(pk__in=roles).values_list("pk", flat=True))
+
+    edges = get_edges()
+
+    with transaction.atomic():
+        RoleClosure.objects.filter(role__in=roles).delete()
+        RoleClosure.objects.bulk_create(
+            [
+                RoleClosure(role_id=role, implied_id=implied)
+                for role in roles
+                for implied in get_implied(edges, role)
+            ],
+            batch_size=1000,
+        )
+
+
+def rebuild_closure() -> int:
+
+    """
+    Recompute closure entries of all roles.
+
+    Returns:
+        int: Number of roles.
+    """
+
+    roles = list(Role.objects.values_list("pk", flat=True))
+    refresh_closure(roles)
+
+    return len(roles)
@@ -0,0 +1,197 @@
+"""
+Signing keys of bearer tokens.
+
+Tokens are signed with JWT_SECRET unless asymmetric signing keys are set. Then tokens
+are signed with the first key having a private key and carry its id in "kid" header,
+and public keys are published as a JSON Web Key Set, so other services can verify
+tokens locally instead of calling back. Tokens signed with JWT_SECRET are rejected
+from then on, unless they are explicitly accepted while switching.
+
+JOSE library and its cryptography backend are only imported when keys are first
+used, so processes not handling tokens don't pay for them.
+"""
+
+# pylint: disable = import-outside-toplevel
+
+from json import dumps
+from typing import List
+
+from django.core.exceptions import ImproperlyConfigured
+
+from ralph.common.exceptions import InvalidTokenException
+from settings import (
+    JWT_ACCEPT_SECRET_TOKENS,
+    JWT_ALGORITHM,
+    JWT_SECRET,
+    JWT_SIGNING_KEYS,
+)
+
+
+class KeyRing:
+
+    """
+    Set of keys used to sign and verify bearer tokens.
+
+    Keys are loaded once, on first use, and kept as constructed key objects, so PEM
+    files are not parsed again for every token. Keys without private key only verify
+    tokens, which allows rotation: a new key is added first, and the previous one is
+    kept until tokens signed with it expire.
+
+    Attributes:
+        configuration (List[dict]): Keys, as set in settings.
+        keys (dict): Algorithm and public key object of each key id.
+        signing_key (tuple): Id, algorithm and private key object of key used to
+            sign tokens, if any.
+        jwks (bytes): Encoded JSON Web Key Set of public keys.
+    """
+
+    def __init__(self, keys: List[dict]) -> None:
+
+        """
+        Constructor to key ring class.
+
+        Args:
+            keys (List[dict]): Keys, each with "kid", "algorithm" and either
+                "private_key_file" or "public_key_file".
+
+        Returns:
+            None
+        """
+
+        self.configuration = keys
+        self.keys = None
+        self.signing_key = None
+        self.jwks = None
+
+    def load(self) -> None:
+
+        """
+        Load keys, if not loaded yet.
+
+        Returns:
+            None
+        """
+
+        if self.keys is not None:
+            return
+
+        from jose import jwk
+        from jose.constants import ALGORITHMS
+
+        keys = {}
+        signing_key = None
+        public_keys = []
+
+        for item in self.configuration:
+            if item["algorithm"] not in ALGORITHMS.RSA | ALGORITHMS.EC:
+                raise ImproperlyConfigured(
+                    f"Unsupported signing key algorithm: {item['algorithm']}."
+                )
+
+            with open(
+                item.get("private_key_file") or item["public_key_file"],
+                encoding="utf-8",
+            ) as file:
+                key = jwk.construct(file.read(), item["algorithm"])
+
+            if "private_key_file" in item:
+                if signing_key is None:
+                    signing_key = (item["kid"], item["algorithm"], key)
+
+                key = key.public_key()
+
+            keys[item["kid"]] = (item["algorithm"], key)
+
+            public_keys.append(
+                {
+                    **key.to_dict(),
+                    "kid": item["kid"],
+                    "use": "sig",
+                }
+            )
+
+        # Keys are published last, so concurrent callers never see partial state.
+        self.signing_key = signing_key
+        self.jwks = dumps({"keys": public_keys}).encode()
+        self.keys = keys
+
+    def get_jwks(self) -> bytes:
+
+        """
+        Get encoded JSON Web Key Set of public keys.
+
+        Returns:
+            bytes: JSON Web Key Set.
+        """
+
+        self.load()
+
+        return self.jwks
+
+    def encode(self, payload: dict) -> str:
+
+        """
+        Sign payload as bearer token.
+
+        Args:
+            payload (dict): Token claims.
+
+        Returns:
+            str: Bearer token.
+        """
+
+        from jose import jwt
+
+        self.load()
+
+        if self.signing_key is None:
+            return jwt.encode(payload, JWT_SECRET, JWT_ALGORITHM)
+
+        kid, algorithm, key = self.signing_key
+
+        return jwt.encode(payload, key, algorithm, headers={"kid": kid})
+
+    def decode(self, token: str) -> dict:
+
+        """
+        Verify bearer token and decode its claims.
+
+        Tokens with "kid" header are verified with that key only, pinned to its
+        algorithm. Tokens without it are verified with JWT_SECRET, unless tokens are
+        signed with asymmetric keys, as anyone knowing the secret could then forge
+        them. JWT_ACCEPT_SECRET_TOKENS keeps them valid while switching.
+
+        Args:
+            token (str): Bearer token.
+
+        Returns:
+            dict: Token claims.
+
+        Raises:
+            InvalidTokenException: If token is not valid.
+        """
+
+        from jose import JWTError, jwt
+
+        self.load()
+
+        try:
+            kid = jwt.get_unverified_header(token).get("kid")
+
+            if kid is None:
+                if self.signing_key is not None and not JWT_ACCEPT_SECRET_TOKENS:
+                    raise JWTError("Token has no key id.")
+
+                return jwt.decode(token, JWT_SECRET, JWT_ALGORITHM)
+
+            if kid not in self.keys:
+                raise JWTError(f"Unknown key id: {kid}.")
+
+            algorithm, key = self.keys[kid]
+
+            return jwt.decode(token, key, algorithm)
+        except JWTError as exc:
+            raise InvalidTokenException from exc
+
+
+key_ring = KeyRing(JWT_SIGNING_KEYS)
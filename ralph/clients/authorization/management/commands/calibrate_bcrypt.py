@@ -0,0 +1,113 @@
+"""
+Pick bcrypt cost factor for a target login latency on this host.
+
+Usage:
+    python manage.py calibrate_bcrypt [--target-ms N] [--min-cost N] [--max-cost N]
+        [--samples N]
+
+Password verification is timed for each cost factor, from lowest, until it exceeds
+twice the target, and a report of latency and pool throughput by cost is printed.
+The highest cost within target is suggested for BCRYPT_ROUNDS. Run it on hardware
+serving logins, while idle, as other load skews measures.
+"""
+
+from statistics import median
+from time import perf_counter
+
+from django.core.management.base import BaseCommand, CommandError
+
+from settings import BCRYPT_ROUNDS, PASSWORD_WORKERS
+
+# Password timed, its value doesn't change hashing cost.
+PASSWORD = b"calibration"
+
+
+class Command(BaseCommand):
+
+    """
+    Command picking bcrypt cost factor for a target latency.
+    """
+
+    help = "Pick bcrypt cost factor for a target login latency on this host."
+
+    def add_arguments(self, parser: object) -> None:
+
+        """
+        Add command arguments.
+
+        Args:
+            parser (object): Argument parser.
+
+        Returns:
+            None
+        """
+
+        parser.add_argument(
+            "--target-ms",
+            type=float,
+            default=250,
+            help="Target password verification latency, in milliseconds.",
+        )
+        parser.add_argument("--min-cost", type=int, default=10, help="Lowest cost.")
+        parser.add_argument("--max-cost", type=int, default=16, help="Highest cost.")
+        parser.add_argument(
+            "--samples",
+            type=int,
+            default=5,
+            help="Verifications timed for each cost.",
+        )
+
+    def handle(self, *args, **options) -> None:
+
+        """
+        Time verifications by cost factor and suggest one.
+
+        Returns:
+            None
+        """
+
+        # pylint: disable = import-outside-toplevel
+        from bcrypt import checkpw, gensalt, hashpw
+
+        if not 4 <= options["min_cost"] <= options["max_cost"] <= 31:
+            raise CommandError("Costs must be between 4 and 31, lowest first.")
+
+        target = options["target_ms"] / 1e3
+        chosen = None
+
+        self.stdout.write(f"{'cost':>4} {'median ms':>10} {'logins/s':>10}")
+
+        for cost in range(options["min_cost"], options["max_cost"] + 1):
+            hashed = hashpw(PASSWORD, gensalt(cost))
+            latencies = []
+
+            for _ in range(options["samples"]):
+                start = perf_counter()
+                checkpw(PASSWORD, hashed)
+                latencies.append(perf_counter() - start)
+
+            latency = median(latencies)
+
+            # Pool verifies as many passwords in parallel as it has workers.
+            self.stdout.write(
+                f"{cost:>4} {latency * 1e3:>10.1f} {PASSWORD_WORKERS / latency:>10.1f}"
+            )
+
+            if latency <= target:
+                chosen = cost
+
+            # Each cost doubles latency, so higher ones are only slower.
+            if latency > 2 * target:
+                break
+
+        if chosen is None:
+            raise CommandError(
+                f"Lowest cost {options['min_cost']} is slower than target."
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Set BCRYPT_ROUNDS = {chosen} (currently {BCRYPT_ROUNDS}). "
+                "Hashes with another cost are rehashed on next login."
+            )
+        )
@@ -0,0 +1,274 @@
+"""
+Convert authorization tables to compact keys.
+
+Usage:
+    python manage.py convert_compact_keys [--drop-legacy]
+
+Must run with DB_COMPACT_KEYS enabled. Existing tables are renamed with a legacy
+suffix, tables with compact keys are created in their place, and rows are copied with
+INSERT ... SELECT statements, relations being translated from uuids and names to
+integer keys by joins on the new tables. Token issuers stay the same, as uuids are
+kept. Closure of role hierarchy is rebuilt from copied rows.
+"""
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from ralph.clients.authorization.hierarchy import rebuild_closure
+from ralph.clients.authorization.models import (
+    Permission,
+    RefreshToken,
+    RevokedUser,
+    Role,
+    RoleClosure,
+    User,
+)
+from settings import DB_COMPACT_KEYS
+
+# Suffix of renamed tables.
+LEGACY_SUFFIX = "_legacy"
+
+# Models converted, in creation order, and column referenced by legacy relations.
+MODELS = (
+    (Permission, "name"),
+    (Role, "name"),
+    (User, "uuid"),
+    (RefreshToken, None),
+    (RevokedUser, None),
+)
+
+# Relation tables converted, created along with models holding them.
+THROUGH_MODELS = (Role.permissions.through, Role.inherits.through, User.roles.through)
+
+# Tables derived from others, created empty and rebuilt after rows are copied.
+DERIVED_MODELS = (RoleClosure,)
+
+
+class Command(BaseCommand):
+
+    """
+    Command converting users, roles and permissions tables to compact keys.
+    """
+
+    help = "Convert users, roles and permissions tables to compact keys."
+
+    def add_arguments(self, parser: object) -> None:
+
+        """
+        Add command arguments.
+
+        Args:
+            parser (object): Argument parser.
+
+        Returns:
+            None
+        """
+
+        parser.add_argument(
+            "--drop-legacy",
+            action="store_true",
+            help="Drop legacy tables after rows are copied.",
+        )
+
+    def handle(self, *args, **options) -> None:
+
+        """
+        Convert tables.
+
+        Returns:
+            None
+        """
+
+        if not DB_COMPACT_KEYS:
+            raise CommandError("DB_COMPACT_KEYS must be enabled to convert tables.")
+
+        models = [model for model, _ in MODELS] + list(THROUGH_MODELS)
+        models += list(DERIVED_MODELS)
+
+        existing = connection.introspection.table_names()
+
+        if any(model._meta.db_table + LEGACY_SUFFIX in existing for model in models):
+            raise CommandError("Legacy tables already exist. Nothing to convert.")
+
+        # Tables added after database was created are only created.
+        tables = [
+            model._meta.db_table for model in models if model._meta.db_table in existing
+        ]
+
+        with connection.schema_editor() as editor:
+
+            # Move legacy tables away, with indexes and foreign keys whose names
+            # would collide with the ones of new tables.
+            for table in tables:
+                self.drop_constraints(editor, table)
+                editor.execute(
+                    editor.sql_rename_table
+                    % {
+                        "old_table": editor.quote_name(table),
+                        "new_table": editor.quote_name(table + LEGACY_SUFFIX),
+                    }
+                )
+
+            # Create tables with compact keys, relation tables included.
+            for model, _ in MODELS:
+                editor.create_model(model)
+
+            for model in DERIVED_MODELS:
+                editor.create_model(model)
+
+            for model, _ in MODELS:
+                if model._meta.db_table in tables:
+                    self.copy(editor, model)
+
+            for model in THROUGH_MODELS:
+                if model._meta.db_table in tables:
+                    self.copy_relation(editor, model)
+
+            if options["drop_legacy"]:
+                for table in reversed(tables):
+                    editor.execute(
+                        editor.sql_delete_table
+                        % {"table": editor.quote_name(table + LEGACY_SUFFIX)}
+                    )
+
+        rebuild_closure()
+
+        self.stdout.write(self.style.SUCCESS("Tables converted to compact keys."))
+
+    def drop_constraints(self, editor: object, table: str) -> None:
+
+        """
+        Drop foreign keys and secondary indexes of table.
+
+        Args:
+            editor (object): Schema editor.
+            table (str): Table name.
+
+        Returns:
+            None
+        """
+
+        with connection.cursor() as cursor:
+            constraints = connection.introspection.get_constraints(cursor, table)
+
+        # Foreign keys have database wide names on MySQL only.
+        if connection.vendor == "mysql":
+            for name, constraint in constraints.items():
+                if constraint["foreign_key"]:
+                    editor.execute(
+                        editor.sql_delete_fk
+                        % {
+                            "table": editor.quote_name(table),
+                            "name": editor.quote_name(name),
+                        }
+                    )
+
+        # Constraints declared inline, which SQLite reports under generated names,
+        # move along with table.
+        for name, constraint in constraints.items():
+            if constraint["primary_key"] or name.startswith(("__", "sqlite_")):
+                continue
+
+            if constraint["index"] or constraint["unique"]:
+                editor.execute(
+                    editor.sql_delete_index
+                    % {
+                        "table": editor.quote_name(table),
+                        "name": editor.quote_name(name),
+                    }
+                )
+
+    def copy(self, editor: object, model: type) -> None:
+
+        """
+        Copy rows of legacy table, keeping columns that exist in both tables.
+
+        Args:
+            editor (object): Schema editor.
+            model (type): Model of table.
+
+        Returns:
+            None
+        """
+
+        table = model._meta.db_table
+
+        with connection.cursor() as cursor:
+            legacy_columns = {
+                column.name
+                for column in connection.introspection.get_table_description(
+                    cursor, table + LEGACY_SUFFIX
+                )
+            }
+
+        columns = ", ".join(
+            editor.quote_name(field.column)
+            for field in model._meta.local_concrete_fields
+            if field.column in legacy_columns
+        )
+
+        self.run_copy(
+            table,
+            f"INSERT INTO {editor.quote_name(table)} ({columns}) "
+            f"SELECT {columns} FROM {editor.quote_name(table + LEGACY_SUFFIX)}",
+        )
+
+    def copy_relation(self, editor: object, model: type) -> None:
+
+        """
+        Copy rows of legacy relation table, translating legacy keys to compact keys.
+
+        Args:
+            editor (object): Schema editor.
+            model (type): Auto created relation model.
+
+        Returns:
+            None
+        """
+
+        table = model._meta.db_table
+        natural_keys = dict(MODELS)
+
+        columns = []
+        values = []
+        joins = []
+
+        # Join each related table by the column legacy keys were taken from.
+        for index, field in enumerate(model._meta.local_concrete_fields):
+            if not field.is_relation:
+                continue
+
+            related = field.related_model
+            alias = f"t{index}"
+
+            columns.append(editor.quote_name(field.column))
+            values.append(f"{alias}.{editor.quote_name(related._meta.pk.column)}")
+            joins.append(
+                f"JOIN {editor.quote_name(related._meta.db_table)} {alias} "
+                f"ON {alias}.{editor.quote_name(natural_keys[related])} "
+                f"= legacy.{editor.quote_name(field.column)}"
+            )
+
+        self.run_copy(
+            table,
+            f"INSERT INTO {editor.quote_name(table)} ({', '.join(columns)}) "
+            f"SELECT {', '.join(values)} "
+            f"FROM {editor.quote_name(table + LEGACY_SUFFIX)} legacy {' '.join(joins)}",
+        )
+
+    def run_copy(self, table: str, sql: str) -> None:
+
+        """
+        Execute copy statement and report number of rows copied.
+
+        Args:
+            table (str): Table rows are copied to.
+            sql (str): Copy statement.
+
+        Returns:
+            None
+        """
+
+        with connection.cursor() as cursor:
+            cursor.execute(sql)
+            self.stdout.write(f"{table}: {cursor.rowcount} rows copied.")
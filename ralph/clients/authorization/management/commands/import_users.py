@@ -0,0 +1,520 @@
+"""
+Import users, roles and permissions in bulk.
+
+Usage:
+    python manage.py import_users FILE [--kind users|roles] [--format csv|jsonl]
+        [--chunk-size N] [--workers N] [--rounds N] [--checkpoint FILE] [--restart]
+
+Records are streamed from CSV or JSON lines files in chunks, so memory stays constant
+whatever the file size. User records have "username", "email", "first_name",
+"last_name", optionally "uuid" and "is_active", either "password", hashed with bcrypt
+in a pool of processes, or "password_hash", stored as is, and "roles", a list or,
+in CSV files, names separated by "|". Role records have "name", optionally
+"description", "permissions" and "inherits", in the same way. Roles and permissions
+referenced but missing are created.
+
+Each chunk is written in a transaction, with bulk inserts into users or roles tables
+and their relation tables. Existing rows are left as they are and existing links are
+ignored, so imports can run again safely, but a user with the uuid of another user
+or roles inheriting each other stop the import. Number of records imported is saved
+to a checkpoint file after each chunk, and an interrupted import resumes from there.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from csv import DictReader
+from itertools import islice, repeat
+from json import dump, load, loads
+from os import cpu_count, path, remove, replace
+from time import perf_counter
+from typing import Iterator, List
+
+from django.core.exceptions import ValidationError
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from ralph.clients.authorization.hierarchy import (
+    check_edges_acyclic,
+    rebuild_closure,
+)
+from ralph.clients.authorization.models import Permission, Role, User
+from ralph.clients.authorization.versions import bump_authorization_version
+from ralph.common.routers import pin_primary
+from settings import BCRYPT_ROUNDS, PRINCIPAL_CACHE_TTL_IN_SECONDS
+
+# Separator of names in list columns of CSV files.
+LIST_SEPARATOR = "|"
+
+# Values read as true in boolean columns of CSV files.
+TRUE_VALUES = ("1", "true", "yes")
+
+
+def hash_password(password: str, rounds: int) -> str:
+
+    """
+    Hash password with bcrypt, in a worker process.
+
+    Args:
+        password (str): Password value.
+        rounds (int): bcrypt cost factor.
+
+    Returns:
+        str: bcrypt hash.
+    """
+
+    # pylint: disable = import-outside-toplevel
+    from bcrypt import gensalt, hashpw
+
+    return hashpw(password.encode(), gensalt(rounds)).decode()
+
+
+def get_list(record: dict, key: str) -> List[str]:
+
+    """
+    Get list of names from record.
+
+    Args:
+        record (dict): Input record.
+        key (str): Key of list.
+
+    Returns:
+        List[str]: Names, without empty ones.
+    """
+
+    value = record.get(key) or []
+
+    if isinstance(value, str):
+        value = value.split(LIST_SEPARATOR)
+
+    return [name.strip() for name in value if name.strip()]
+
+
+class Command(BaseCommand):
+
+    """
+    Command importing users, roles and permissions in bulk.
+
+    Attributes:
+        keys (dict): Key by name, of roles and permissions, kept across chunks.
+        rounds (int): bcrypt cost factor.
+        workers (int): Number of processes hashing passwords.
+        executor (Optional[ProcessPoolExecutor]): Pool hashing passwords, while
+            importing.
+        created (int): Number of users or roles created.
+        linked (int): Number of links written.
+    """
+
+    help = "Import users or roles, with their relations, from CSV or JSON lines."
+
+    def __init__(self, *args, **kwargs) -> None:
+
+        """
+        Constructor to import command class.
+
+        Returns:
+            None
+        """
+
+        super().__init__(*args, **kwargs)
+
+        self.keys = {Role: {}, Permission: {}}
+        self.rounds = BCRYPT_ROUNDS or 12
+        self.workers = cpu_count()
+        self.executor = None
+        self.created = 0
+        self.linked = 0
+
+    def add_arguments(self, parser: object) -> None:
+
+        """
+        Add command arguments.
+
+        Args:
+            parser (object): Argument parser.
+
+        Returns:
+            None
+        """
+
+        parser.add_argument("file", help="CSV or JSON lines file to import.")
+        parser.add_argument(
+            "--kind",
+            choices=["users", "roles"],
+            default="users",
+            help="Kind of records in file.",
+        )
+        parser.add_argument(
+            "--format",
+            choices=["csv", "jsonl"],
+            help="Format of file. Defaults to the one of file extension.",
+        )
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Number of records written in each transaction.",
+        )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=cpu_count(),
+            help="Number of processes hashing passwords.",
+        )
+        parser.add_argument(
+            "--rounds",
+            type=int,
+            default=BCRYPT_ROUNDS or 12,
+            help="bcrypt cost factor. Defaults to BCRYPT_ROUNDS.",
+        )
+        parser.add_argument(
+            "--checkpoint",
+            help="Checkpoint file. Defaults to file path with .checkpoint suffix.",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Ignore checkpoint and import from first record.",
+        )
+
+    def handle(self, *args, **options) -> None:
+
+        """
+        Import records, chunk by chunk.
+
+        Returns:
+            None
+        """
+
+        file_format = options["format"] or (
+            "csv" if options["file"].endswith(".csv") else "jsonl"
+        )
+        checkpoint = options["checkpoint"] or options["file"] + ".checkpoint"
+
+        self.keys = {Role: {}, Permission: {}}
+        self.rounds = options["rounds"]
+        self.workers = options["workers"]
+        self.created = 0
+        self.linked = 0
+
+        done = 0
+
+        if path.exists(checkpoint) and not options["restart"]:
+            with open(checkpoint, encoding="utf-8") as file:
+                done = load(file)["records"]
+
+            self.stdout.write(f"Resuming after {done} records.")
+
+        start = perf_counter()
+        imported = 0
+
+        with ProcessPoolExecutor(self.workers) as executor:
+            self.executor = executor
+
+            records = islice(self.read(options["file"], file_format), done, None)
+
+            while chunk := list(islice(records, options["chunk_size"])):
+                with transaction.atomic():
+                    if options["kind"] == "users":
+                        self.import_users(chunk)
+                    else:
+                        self.import_roles(chunk)
+
+                done += len(chunk)
+                imported += len(chunk)
+                self.save_checkpoint(checkpoint, done)
+
+                self.stdout.write(
+                    f"{done} records imported, "
+                    f"{imported / (perf_counter() - start):.0f} records/s."
+                )
+
+        if path.exists(checkpoint):
+            remove(checkpoint)
+
+        # Rows were written without model signals, so role hierarchy closure is
+        # rebuilt and authorization versions are bumped here, which every worker
+        # reads from database. Principals cached by running workers are not dropped,
+        # they expire after their time to live.
+        rebuild_closure()
+        bump_authorization_version()
+        pin_primary()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{imported} records imported in {perf_counter() - start:.1f}s: "
+                f"{self.created} {options['kind']} created, "
+                f"{self.linked} links written."
+            )
+        )
+        self.stdout.write(
+            self.style.WARNING(
+                "Running workers keep cached principals for "
+                f"{PRINCIPAL_CACHE_TTL_IN_SECONDS}s, restart them to serve imported "
+                "changes right away."
+            )
+        )
+
+    def read(self, file_path: str, file_format: str) -> Iterator[dict]:
+
+        """
+        Stream records of file.
+
+        Args:
+            file_path (str): File path.
+            file_format (str): File format, "csv" or "jsonl".
+
+        Returns:
+            Iterator[dict]: Records.
+        """
+
+        with open(file_path, encoding="utf-8", newline="") as file:
+            if file_format == "csv":
+                yield from DictReader(file)
+                return
+
+            for line in file:
+                if line.strip():
+                    yield loads(line)
+
+    def import_users(self, records: List[dict]) -> None:
+
+        """
+        Import chunk of user records with their roles.
+
+        Args:
+            records (List[dict]): User records.
+
+        Returns:
+            None
+        """
+
+        for record in records:
+            if not record.get("username"):
+                raise CommandError(f"User record without username: {record}.")
+
+            if not record.get("password") and not record.get("password_hash"):
+                raise CommandError(f"User {record['username']} has no password.")
+
+        usernames = [record["username"] for record in records]
+
+        # Users already imported are not hashed again.
+        existing = set(
+            User.objects.filter(username__in=usernames).values_list(
+                "username", flat=True
+            )
+        )
+        new = [record for record in records if record["username"] not in existing]
+
+        # Users whose uuid is taken would be dropped silently by bulk insert.
+        taken = dict(
+            User.objects.filter(
+                uuid__in=[record["uuid"] for record in new if record.get("uuid")]
+            ).values_list("uuid", "username")
+        )
+
+        for record in new:
+            if not record.get("uuid"):
+                continue
+
+            owner = taken.setdefault(record["uuid"], record["username"])
+
+            if owner != record["username"]:
+                raise CommandError(
+                    f"User {record['username']} has uuid {record['uuid']} of user "
+                    f"{owner}."
+                )
+
+        plain = [record for record in new if not record.get("password_hash")]
+
+        hashes = self.executor.map(
+            hash_password,
+            [record["password"] for record in plain],
+            repeat(self.rounds),
+            chunksize=max(len(plain) // (self.workers * 4), 1),
+        )
+
+        for record, hashed in zip(plain, hashes):
+            record["password_hash"] = hashed
+
+        users = []
+
+        for record in new:
+            user = User(
+                username=record["username"],
+                password=record["password_hash"],
+                email=record.get("email", ""),
+                first_name=record.get("first_name", ""),
+                last_name=record.get("last_name", ""),
+            )
+
+            if record.get("uuid"):
+                user.uuid = record["uuid"]
+
+            if record.get("is_active") not in (None, ""):
+                user.is_active = str(record["is_active"]).lower() in TRUE_VALUES
+
+            users.append(user)
+
+        User.objects.bulk_create(users, ignore_conflicts=True)
+
+        # Backends don't return keys nor number of rows inserted ignoring conflicts.
+        user_keys = dict(
+            User.objects.filter(username__in=usernames).values_list("username", "pk")
+        )
+        self.created += len(user_keys) - len(existing)
+
+        self.link(
+            User.roles.through,
+            "user_id",
+            "role_id",
+            Role,
+            {
+                user_keys[record["username"]]: get_list(record, "roles")
+                for record in records
+            },
+        )
+
+    def import_roles(self, records: List[dict]) -> None:
+
+        """
+        Import chunk of role records with their permissions and inherited roles.
+
+        Args:
+            records (List[dict]): Role records.
+
+        Returns:
+            None
+        """
+
+        for record in records:
+            if not record.get("name"):
+                raise CommandError(f"Role record without name: {record}.")
+
+        names = [record["name"] for record in records]
+        existing = set(
+            Role.objects.filter(name__in=names).values_list("name", flat=True)
+        )
+
+        roles = [
+            Role(name=record["name"], description=record.get("description") or None)
+            for record in records
+            if record["name"] not in existing
+        ]
+
+        Role.objects.bulk_create(roles, ignore_conflicts=True)
+
+        # Backends don't return number of rows inserted ignoring conflicts.
+        self.created += Role.objects.filter(name__in=names).count() - len(existing)
+
+        role_keys = self.get_keys(Role, names)
+
+        self.link(
+            Role.permissions.through,
+            "role_id",
+            "permission_id",
+            Permission,
+            {
+                role_keys[record["name"]]: get_list(record, "permissions")
+                for record in records
+            },
+        )
+        self.link(
+            Role.inherits.through,
+            "from_role_id",
+            "to_role_id",
+            Role,
+            {
+                role_keys[record["name"]]: get_list(record, "inherits")
+                for record in records
+            },
+        )
+
+        # Links are written without model signals, so cycles are checked here, before
+        # chunk is committed.
+        try:
+            check_edges_acyclic(role_keys[name] for name in names)
+        except ValidationError as error:
+            raise CommandError(
+                f"Roles inherited by records {names[0]} to {names[-1]} make hierarchy "
+                "cyclic."
+            ) from error
+
+    def link(
+        self,
+        through: type,
+        source: str,
+        target: str,
+        model: type,
+        links: dict,
+    ) -> None:
+
+        """
+        Insert links into relation table, ignoring existing ones.
+
+        Args:
+            through (type): Relation model.
+            source (str): Column of linked rows.
+            target (str): Column of rows linked to.
+            model (type): Model of rows linked to, by name.
+            links (dict): Names of rows linked to, by key of linked row.
+
+        Returns:
+            None
+        """
+
+        keys = self.get_keys(
+            model, {name for names in links.values() for name in names}
+        )
+
+        rows = [
+            through(**{source: key, target: keys[name]})
+            for key, names in links.items()
+            for name in names
+        ]
+
+        through.objects.bulk_create(rows, ignore_conflicts=True)
+        self.linked += len(rows)
+
+    def get_keys(self, model: type, names: set) -> dict:
+
+        """
+        Get keys of roles or permissions, creating missing ones.
+
+        Args:
+            model (type): Role or Permission.
+            names (set): Names.
+
+        Returns:
+            dict: Key of each name.
+        """
+
+        keys = self.keys[model]
+
+        missing = set(names) - set(keys)
+
+        if missing:
+            model.objects.bulk_create(
+                [model(name=name) for name in missing], ignore_conflicts=True
+            )
+            keys.update(
+                model.objects.filter(name__in=missing).values_list("name", "pk")
+            )
+
+        return keys
+
+    def save_checkpoint(self, checkpoint: str, records: int) -> None:
+
+        """
+        Save number of records imported, replacing checkpoint file atomically.
+
+        Args:
+            checkpoint (str): Checkpoint file path.
+            records (int): Number of records imported.
+
+        Returns:
+            None
+        """
+
+        with open(checkpoint + ".tmp", "w", encoding="utf-8") as file:
+            dump({"records": records}, file)
+
+        replace(checkpoint + ".tmp", checkpoint)
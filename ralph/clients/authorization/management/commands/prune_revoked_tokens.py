@@ -0,0 +1,43 @@
+"""
+Delete revoked tokens and user revocations that expired.
+
+Usage:
+    python manage.py prune_revoked_tokens
+
+Revoked tokens are only needed until they expire, as expired tokens are rejected
+anyway, and user revocations until tokens issued before them expire. Workers skip
+expired entries when they load revocations, but don't delete them, so deletion runs
+in a single place. Run it periodically, such as daily.
+"""
+
+from django.core.management.base import BaseCommand
+from django.utils.timezone import now
+
+from ralph.clients.authorization.models import RevokedToken, RevokedUser
+
+
+class Command(BaseCommand):
+
+    """
+    Command deleting expired revoked tokens and user revocations.
+    """
+
+    help = "Delete revoked tokens and user revocations that expired."
+
+    def handle(self, *args, **options) -> None:
+
+        """
+        Delete expired revoked tokens and user revocations.
+
+        Returns:
+            None
+        """
+
+        tokens, _ = RevokedToken.objects.filter(expires__lte=now()).delete()
+        users, _ = RevokedUser.objects.filter(expires__lte=now()).delete()
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"{tokens} revoked tokens and {users} user revocations deleted."
+            )
+        )
@@ -0,0 +1,283 @@
+"""
+Publish snapshot of users, roles and permissions shared by workers.
+
+Usage:
+    python manage.py publish_snapshot [--path FILE]
+
+Users, with their effective roles, and roles, with their permissions, are read from
+primary database and written to a new snapshot file, which then replaces the
+published one atomically. Workers load it on their next check. Run it periodically,
+as users changed after a snapshot is published are read from database until the
+next one.
+"""
+
+from collections import defaultdict
+from json import dumps
+from os import fsync, getpid, path, replace
+from struct import Struct, pack
+from time import perf_counter, time
+from typing import Dict, Iterable, List, Tuple
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+
+from ralph.clients.authorization.auth import ROLES_LOOKUP, USER_FIELDS
+from ralph.clients.authorization.models import Permission, Role, User
+from ralph.clients.authorization.snapshot import (
+    HEADER,
+    MAGIC,
+    PERMISSION,
+    ROLE,
+    USER,
+    digest,
+)
+from settings import SNAPSHOT_PATH
+
+
+class Command(BaseCommand):
+
+    """
+    Command publishing snapshot of users, roles and permissions.
+    """
+
+    help = "Publish snapshot of users, roles and permissions shared by workers."
+
+    def add_arguments(self, parser: object) -> None:
+
+        """
+        Add command arguments.
+
+        Args:
+            parser (object): Argument parser.
+
+        Returns:
+            None
+        """
+
+        parser.add_argument(
+            "--path", default=SNAPSHOT_PATH, help="Snapshot file. Defaults to setting."
+        )
+
+    def handle(self, *args, **options) -> None:
+
+        """
+        Build and publish snapshot.
+
+        Returns:
+            None
+        """
+
+        if not options["path"]:
+            raise CommandError("SNAPSHOT_PATH must be set to publish a snapshot.")
+
+        start = perf_counter()
+
+        # Changes committed while reading are newer than snapshot.
+        generation = time()
+        content = self.build(generation)
+
+        # Write next to published file, so it can be renamed over it.
+        temporary = f"{options['path']}.{getpid()}.tmp"
+
+        with open(temporary, "wb") as file:
+            for part in content["parts"]:
+                file.write(part)
+
+            file.flush()
+            fsync(file.fileno())
+
+        replace(temporary, options["path"])
+
+        self.stdout.write(
+            self.style.SUCCESS(
+                f"Snapshot of {content['users']} users published to "
+                f"{path.abspath(options['path'])}: "
+                f"{path.getsize(options['path'])} bytes, "
+                f"{perf_counter() - start:.1f}s."
+            )
+        )
+
+    def build(self, generation: float) -> dict:
+
+        """
+        Read authorizations from primary database and encode snapshot.
+
+        Args:
+            generation (float): Time when reading started.
+
+        Returns:
+            dict: Encoded parts of snapshot, in order, and number of users.
+        """
+
+        permissions, roles, role_permissions = read_roles()
+        users, user_roles = read_users(
+            {name: index for index, name in enumerate(roles)}
+        )
+
+        # Encode tables, storing names and profiles in strings section.
+        strings = bytearray()
+        fields = add_string(strings, dumps(USER_FIELDS).encode())
+        permission_table = [
+            PERMISSION.pack(*add_string(strings, name.encode())) for name in permissions
+        ]
+        role_table, role_permission_indexes = encode_records(
+            ROLE,
+            strings,
+            (((), name.encode(), role_permissions.get(name, [])) for name in roles),
+        )
+        user_table, user_role_indexes = encode_records(
+            USER,
+            strings,
+            (
+                (
+                    (key,),
+                    dumps(values, separators=(",", ":")).encode(),
+                    user_roles.get(values[0], []),
+                )
+                for key, values in users
+            ),
+        )
+
+        return {
+            "users": len(users),
+            "parts": [
+                HEADER.pack(
+                    MAGIC,
+                    generation,
+                    len(users),
+                    len(roles),
+                    len(permissions),
+                    len(user_role_indexes),
+                    len(role_permission_indexes),
+                    *fields,
+                ),
+                user_table,
+                role_table,
+                b"".join(permission_table),
+                pack(f"<{len(user_role_indexes)}I", *user_role_indexes),
+                pack(f"<{len(role_permission_indexes)}I", *role_permission_indexes),
+                bytes(strings),
+            ],
+        }
+
+
+def read_roles() -> Tuple[List[str], List[str], Dict[str, List[int]]]:
+
+    """
+    Read permissions and roles, with their permissions, from primary database.
+
+    Returns:
+        Tuple[List[str], List[str], Dict[str, List[int]]]: Permission names and role
+            names, sorted, and permission indexes by role name.
+    """
+
+    # Read from primary, as replicas may lag behind change times.
+    permissions = list(
+        Permission.objects.using(DEFAULT_DB_ALIAS)
+        .order_by("name")
+        .values_list("name", flat=True)
+    )
+    permission_indexes = {name: index for index, name in enumerate(permissions)}
+
+    roles = list(
+        Role.objects.using(DEFAULT_DB_ALIAS)
+        .order_by("name")
+        .values_list("name", flat=True)
+    )
+
+    role_permissions = defaultdict(list)
+
+    for role, permission in (
+        Role.objects.using(DEFAULT_DB_ALIAS)
+        .filter(permissions__isnull=False)
+        .values_list("name", "permissions__name")
+    ):
+        role_permissions[role].append(permission_indexes[permission])
+
+    return permissions, roles, role_permissions
+
+
+def read_users(role_indexes: Dict[str, int]) -> Tuple[list, Dict[str, List[int]]]:
+
+    """
+    Read users, with their roles, from primary database.
+
+    Args:
+        role_indexes (Dict[str, int]): Role index by role name.
+
+    Returns:
+        Tuple[list, Dict[str, List[int]]]: Digest of uuid and profile fields of
+            users, sorted by digest, and role indexes by user uuid.
+    """
+
+    user_roles = defaultdict(list)
+
+    for uuid, role in (
+        User.objects.using(DEFAULT_DB_ALIAS)
+        .filter(**{f"{ROLES_LOOKUP}__isnull": False})
+        .values_list("uuid", f"{ROLES_LOOKUP}__name")
+        .distinct()
+        .iterator()
+    ):
+        user_roles[uuid].append(role_indexes[role])
+
+    users = sorted(
+        (digest(fields[0]), fields)
+        for fields in User.objects.using(DEFAULT_DB_ALIAS)
+        .values_list(*USER_FIELDS)
+        .iterator()
+    )
+
+    return users, user_roles
+
+
+def encode_records(
+    record: Struct, strings: bytearray, entries: Iterable[tuple]
+) -> Tuple[bytes, List[int]]:
+
+    """
+    Encode records pointing to a string and to a range of indexes.
+
+    Args:
+        record (Struct): Record format.
+        strings (bytearray): Strings section, where strings are appended.
+        entries (Iterable[tuple]): Leading record fields, string and indexes, by
+            record.
+
+    Returns:
+        Tuple[bytes, List[int]]: Encoded records and indexes of all records.
+    """
+
+    table = []
+    indexes = []
+
+    for fields, value, entry_indexes in entries:
+        table.append(
+            record.pack(
+                *fields,
+                *add_string(strings, value),
+                len(indexes),
+                len(entry_indexes),
+            )
+        )
+        indexes.extend(entry_indexes)
+
+    return b"".join(table), indexes
+
+
+def add_string(strings: bytearray, value: bytes) -> tuple:
+
+    """
+    Append bytes to strings section.
+
+    Args:
+        strings (bytearray): Strings section.
+        value (bytes): Bytes appended.
+
+    Returns:
+        tuple: Position and length of bytes in strings section.
+    """
+
+    strings.extend(value)
+
+    return len(strings) - len(value), len(value)
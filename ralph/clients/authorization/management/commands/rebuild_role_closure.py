@@ -0,0 +1,43 @@
+"""
+Rebuild closure table of role hierarchy.
+
+Usage:
+    python manage.py rebuild_role_closure
+
+Closure entries are kept up to date by model signals. This command recomputes them
+for all roles, which is needed once when role hierarchy is enabled on a database
+with roles created before, or after roles or their inheritance are written with
+bulk or raw queries.
+"""
+
+from django.core.management.base import BaseCommand
+
+from ralph.clients.authorization.hierarchy import rebuild_closure
+from ralph.clients.authorization.versions import bump_authorization_version
+from ralph.common.routers import pin_primary
+
+
+class Command(BaseCommand):
+
+    """
+    Command rebuilding closure table of role hierarchy.
+    """
+
+    help = "Rebuild closure table of role hierarchy."
+
+    def handle(self, *args, **options) -> None:
+
+        """
+        Rebuild closure table.
+
+        Returns:
+            None
+        """
+
+        roles = rebuild_closure()
+
+        # Effective roles may have changed, so cached principals are outdated.
+        bump_authorization_version()
+        pin_primary()
+
+        self.stdout.write(self.style.SUCCESS(f"Closure rebuilt for {roles} roles."))
@@ -1,27 +1,412 @@
-from datetime import datetime, timedelta
+from datetime import datetime, timedelta, timezone
+from functools import partial
+from hashlib import sha256
+from secrets import token_urlsafe
+from typing import List
+from uuid import uuid4
 
-from bcrypt import checkpw
-from jose import jwt
+from asgiref.sync import sync_to_async
+from django.db import close_old_connections
+from django.utils.timezone import now
 
-from ralph.common.exceptions import InvalidCredentialException
-from ralph.clients.authorization.models import User
+from ralph.common.exceptions import InvalidCredentialException, InvalidTokenException
+from ralph.clients.authorization.auth import USER_FIELDS, Authorization
+from ralph.clients.authorization.hashing import password_verifier
+from ralph.clients.authorization.keys import key_ring
+from ralph.clients.authorization.models import (
+    RefreshToken,
+    RevokedToken,
+    RevokedUser,
+    User,
+)
+from ralph.clients.authorization.revocation import revocation_list
+from ralph.clients.authorization.throttle import ip_throttle, username_throttle
+from ralph.clients.authorization.versions import (
+    authorization_versions,
+    get_authorization_version,
+)
 from ralph.common.logger import get_logger
-from settings import JWT_ALGORITHM, JWT_SECRET, JWT_TIMEDELTA_IN_MINUTES
+from ralph.common.metrics import timed
+from settings import (
+    JWT_STATELESS,
+    JWT_TIMEDELTA_IN_MINUTES,
+    REFRESH_TOKEN_TIMEDELTA_IN_DAYS,
+)
 
 logger = get_logger(__name__)
 
+# Authorization without requirements, used to resolve principals of tokens.
+_authorization = Authorization()
 
-def login(username: str, password: str) -> str:
+
+def login(username: str, password: str, client_ip: str = None) -> dict:
 
     """
-    Generates a bearer token if credentials are successful.
+    Generates a bearer token and a refresh token if credentials are successful.
+
+    Attempts are rejected before any database or password work if username or
+    client IP failed too many times recently.
 
     Args:
         username (str): Requested username value of user trying to login.
         password (str): Password value to check against hash.
+        client_ip (str): Client IP address. Defaults to None.
 
     Returns:
-        str: Bearer token.
+        dict: Bearer token and refresh token.
+    """
+
+    # Reject throttled attempts first, so they cost no password check.
+    username_throttle.check(username)
+    ip_throttle.check(client_ip)
+
+    try:
+        user = _get_user(username)
+
+        # Check if password is correct.
+        with timed("login_password"):
+            verified = password_verifier.verify(password, user.password)
+
+        if not verified:
+            logger.warning("Invalid password for username: %s.", username)
+            raise InvalidCredentialException
+    except InvalidCredentialException:
+        username_throttle.add(username)
+        ip_throttle.add(client_ip)
+        raise
+
+    # Rehash password in background if its cost factor is outdated.
+    password_verifier.rehash(
+        password, user.password, partial(_update_password, user.uuid, user.password)
+    )
+
+    return _generate_tokens(user.uuid)
+
+
+async def alogin(username: str, password: str, client_ip: str = None) -> dict:
+
+    """
+    Generates a bearer token and a refresh token if credentials are successful, for
+    async endpoints.
+
+    Database access runs in a thread managed by Django and password check runs in
+    the password verification pool, so the event loop is never blocked.
+
+    Args:
+        username (str): Requested username value of user trying to login.
+        password (str): Password value to check against hash.
+        client_ip (str): Client IP address. Defaults to None.
+
+    Returns:
+        dict: Bearer token and refresh token.
+    """
+
+    # Reject throttled attempts first, so they cost no password check.
+    await username_throttle.acheck(username)
+    await ip_throttle.acheck(client_ip)
+
+    try:
+        user = await sync_to_async(_get_user)(username)
+
+        # Check if password is correct.
+        with timed("login_password"):
+            verified = await password_verifier.averify(password, user.password)
+
+        if not verified:
+            logger.warning("Invalid password for username: %s.", username)
+            raise InvalidCredentialException
+    except InvalidCredentialException:
+        await username_throttle.aadd(username)
+        await ip_throttle.aadd(client_ip)
+        raise
+
+    # Rehash password in background if its cost factor is outdated.
+    password_verifier.rehash(
+        password, user.password, partial(_update_password, user.uuid, user.password)
+    )
+
+    return await sync_to_async(_generate_tokens)(user.uuid)
+
+
+@timed("refresh", queries=True)
+def refresh(refresh_token: str) -> dict:
+
+    """
+    Generates a new bearer token and rotates refresh token.
+
+    Refresh token is found with a single indexed lookup on its digest and no password
+    hashing is done. A token that was already consumed or revoked means it leaked, so
+    every token of its family is revoked.
+
+    Args:
+        refresh_token (str): Refresh token issued by login or previous refresh.
+
+    Returns:
+        dict: Bearer token and refresh token.
+    """
+
+    digest = sha256(refresh_token.encode()).hexdigest()
+
+    # Try to get refresh token object from its digest.
+    try:
+        logger.info("Trying to get refresh token.")
+        token = RefreshToken.objects.filter(digest=digest).get()
+    except RefreshToken.DoesNotExist as exc:
+        logger.warning("No refresh token found.")
+        raise InvalidTokenException from exc
+
+    if token.expires <= now():
+        logger.warning("Refresh token expired.")
+        raise InvalidTokenException
+
+    # Consume token, unless it was consumed by a concurrent refresh in the meantime.
+    consumed = (
+        not token.is_used
+        and not token.is_revoked
+        and RefreshToken.objects.filter(
+            id=token.id, is_used=False, is_revoked=False
+        ).update(is_used=True)
+    )
+
+    if not consumed:
+        logger.warning("Refresh token reused. Revoking family: %s.", token.family)
+        RefreshToken.objects.filter(family=token.family).update(is_revoked=True)
+        raise InvalidTokenException
+
+    return _generate_tokens(token.user_id, token.family)
+
+
+@timed("revoke", queries=True)
+def revoke(tokens: List[str]) -> int:
+
+    """
+    Revoke bearer tokens before their expiration.
+
+    Invalid tokens and tokens without id are skipped, as they can't be used anyway or
+    can't be told apart. Revocations apply at once in this process and within refresh
+    interval in the others.
+
+    Args:
+        tokens (List[str]): Bearer tokens.
+
+    Returns:
+        int: Number of tokens revoked.
+    """
+
+    logger.info("Revoking %s tokens.", len(tokens))
+
+    entries = []
+
+    for token in tokens:
+        try:
+            decoded_token = Authorization.decode_token(token)
+        except InvalidTokenException:
+            continue
+
+        if "jti" in decoded_token:
+            entries.append(
+                RevokedToken(
+                    jti=decoded_token["jti"],
+                    expires=datetime.fromtimestamp(decoded_token["exp"], timezone.utc),
+                )
+            )
+
+    RevokedToken.objects.bulk_create(entries, ignore_conflicts=True)
+
+    for entry in entries:
+        revocation_list.add(entry.jti, entry.expires.timestamp())
+
+    return len(entries)
+
+
+@timed("revoke_jtis", queries=True)
+def revoke_jtis(jtis: List[str]) -> int:
+
+    """
+    Revoke bearer tokens by their id, without the tokens themselves.
+
+    Expiration of tokens is unknown, so revocations are kept as long as a token
+    issued now would be valid.
+
+    Args:
+        jtis (List[str]): Token ids, as in "jti" claim.
+
+    Returns:
+        int: Number of token ids revoked.
+    """
+
+    logger.info("Revoking %s token ids.", len(jtis))
+
+    expires = now() + timedelta(minutes=JWT_TIMEDELTA_IN_MINUTES)
+    entries = [RevokedToken(jti=jti, expires=expires) for jti in dict.fromkeys(jtis)]
+
+    RevokedToken.objects.bulk_create(entries, ignore_conflicts=True)
+
+    for entry in entries:
+        revocation_list.add(entry.jti, expires.timestamp())
+
+    return len(entries)
+
+
+@timed("revoke_users", queries=True)
+def revoke_users(uuids: List[str]) -> int:
+
+    """
+    Revoke every bearer token and refresh token issued to users until now.
+
+    Tokens issued before now are rejected, and refresh tokens are revoked, so they
+    can't issue new ones. Users can still login again.
+
+    Args:
+        uuids (List[str]): User uuids.
+
+    Returns:
+        int: Number of existing users revoked.
+    """
+
+    logger.info("Revoking tokens of %s users.", len(uuids))
+
+    uuids = list(User.objects.filter(uuid__in=uuids).values_list("uuid", flat=True))
+    not_before = now()
+
+    RevokedUser.objects.bulk_create(
+        [
+            RevokedUser(
+                user_id=uuid,
+                not_before=not_before,
+                expires=not_before + timedelta(minutes=JWT_TIMEDELTA_IN_MINUTES),
+            )
+            for uuid in uuids
+        ]
+    )
+    RefreshToken.objects.filter(user_id__in=uuids, is_revoked=False).update(
+        is_revoked=True
+    )
+
+    for uuid in uuids:
+        revocation_list.add_user(uuid, not_before.timestamp())
+
+    return len(uuids)
+
+
+def logout(token: str, refresh_token: str = None) -> None:
+
+    """
+    Revoke bearer token of user and, if passed, its refresh token family.
+
+    Args:
+        token (str): Bearer token.
+        refresh_token (str): Refresh token issued with bearer token. Defaults to None.
+
+    Returns:
+        None
+    """
+
+    revoke([token])
+
+    if refresh_token is not None:
+        logger.info("Revoking refresh token family.")
+        RefreshToken.objects.filter(
+            family__in=RefreshToken.objects.filter(
+                digest=sha256(refresh_token.encode()).hexdigest()
+            ).values("family")
+        ).update(is_revoked=True)
+
+
+def introspect(tokens: List[str]) -> List[dict]:
+
+    """
+    Validate a batch of tokens and resolve their principals.
+
+    Principals are taken from token claims or principal cache when possible, and all
+    the remaining ones are resolved with a single query, so cost grows with the
+    number of distinct users, not with the number of tokens.
+
+    Args:
+        tokens (List[str]): Bearer tokens.
+
+    Returns:
+        List[dict]: For each token, in the same order, if it is active and principal
+            information of its user.
+    """
+
+    logger.info("Introspecting %s tokens.", len(tokens))
+
+    decoded_tokens = []
+
+    # Decode tokens, marking invalid ones as None.
+    for token in tokens:
+        try:
+            decoded_tokens.append(Authorization.decode_token(token))
+        except InvalidTokenException:
+            decoded_tokens.append(None)
+
+    # Check versions of token claims at once, marking outdated tokens as None.
+    if JWT_STATELESS:
+        claimed = [
+            index
+            for index, decoded_token in enumerate(decoded_tokens)
+            if decoded_token is not None and "ver" in decoded_token
+        ]
+        current = authorization_versions.are_current(
+            (decoded_tokens[index].get("iss"), decoded_tokens[index]["ver"])
+            for index in claimed
+        )
+
+        for index, is_current in zip(claimed, current):
+            if not is_current:
+                decoded_tokens[index] = None
+
+    principals = {}
+    missing = set()
+
+    # Get principals known without querying database.
+    for index, decoded_token in enumerate(decoded_tokens):
+        if decoded_token is None:
+            continue
+
+        try:
+            principal = _authorization.get_known_principal(decoded_token, True)
+        except InvalidTokenException:
+            decoded_tokens[index] = None
+            continue
+
+        if principal is None:
+            missing.add(decoded_token.get("iss"))
+        else:
+            principals[decoded_token.get("iss")] = principal
+
+    # Resolve remaining principals at once.
+    if missing:
+        principals.update(Authorization.get_principals(missing))
+
+    results = []
+
+    for decoded_token in decoded_tokens:
+        principal = principals.get(decoded_token.get("iss")) if decoded_token else None
+
+        results.append(
+            {
+                "active": principal is not None,
+                "exp": decoded_token.get("exp") if principal else None,
+                "data": principal.payload if principal else None,
+            }
+        )
+
+    return results
+
+
+@timed("login_user", queries=True)
+def _get_user(username: str) -> User:
+
+    """
+    Get user trying to login.
+
+    Args:
+        username (str): Requested username value of user trying to login.
+
+    Returns:
+        User: User object.
     """
 
     # Try to get user object from username.
@@ -34,21 +419,63 @@ def login(username: str, password: str) -> str:
 
     logger.info("User found. Checking password (No log if correct password).")
 
-    # Check if password is correct.
-    if not checkpw(password.encode(), user.password.encode()):
-        logger.warning("Invalid password: %s", password)
-        raise InvalidCredentialException
+    return user
 
-    return _generate_token(user.uuid)
 
+def _update_password(uuid: str, hashed: str, new_hashed: str) -> None:
 
+    """
+    Store password rehashed with current cost factor.
+
+    Stored hash is only replaced if it didn't change meanwhile. This runs in the
+    password verification pool, out of any request.
+
+    Args:
+        uuid (str): User uuid.
+        hashed (str): Hash verified at login.
+        new_hashed (str): New hash of password.
+
+    Returns:
+        None
+    """
+
+    try:
+        User.objects.filter(uuid=uuid, password=hashed).update(password=new_hashed)
+    finally:
+        # Connections of pool threads are not closed by request handling.
+        close_old_connections()
+
+
+def _generate_tokens(uuid: str, family: str = None) -> dict:
+
+    """
+    Generates a bearer token and a refresh token.
+
+    Args:
+        uuid (str): User uuid.
+        family (str): Family of refresh token. Defaults to a new family.
+
+    Returns:
+        dict: Bearer token and refresh token.
+    """
+
+    return {
+        "token": _generate_token(uuid),
+        "refresh_token": _generate_refresh_token(uuid, family or str(uuid4())),
+    }
+
+
+@timed("login_token", queries=True)
 def _generate_token(uuid: str) -> str:
 
     """
     Generates a bearer token.
 
+    If stateless mode is enabled, authorization claims of user are also added to the
+    token.
+
     Args:
-        username (str): User uuid to be added as issuer of token.
+        uuid (str): User uuid to be added as issuer of token.
 
     Returns:
         str: Bearer token.
@@ -59,8 +486,71 @@ def _generate_token(uuid: str) -> str:
     # Create payload for JWT token.
     payload = {
         "iss": uuid,
+        "jti": uuid4().hex,
         "iat": datetime.utcnow(),
         "exp": datetime.utcnow() + timedelta(minutes=JWT_TIMEDELTA_IN_MINUTES),
     }
 
-    return jwt.encode(payload, JWT_SECRET, JWT_ALGORITHM)
+    if JWT_STATELESS:
+        payload.update(_generate_claims(uuid))
+
+    return key_ring.encode(payload)
+
+
+@timed("login_refresh_token", queries=True)
+def _generate_refresh_token(uuid: str, family: str) -> str:
+
+    """
+    Generates a refresh token.
+
+    Token is random, so a fast digest is enough to store it safely.
+
+    Args:
+        uuid (str): User uuid.
+        family (str): Family of refresh token.
+
+    Returns:
+        str: Refresh token.
+    """
+
+    logger.info("Generating refresh token.")
+
+    token = token_urlsafe(32)
+
+    RefreshToken.objects.create(
+        digest=sha256(token.encode()).hexdigest(),
+        family=family,
+        user_id=uuid,
+        expires=now() + timedelta(days=REFRESH_TOKEN_TIMEDELTA_IN_DAYS),
+    )
+
+    return token
+
+
+def _generate_claims(uuid: str) -> dict:
+
+    """
+    Generates authorization claims of user.
+
+    Claims carry the authorization version of user, read before user information, so
+    any change made while claims are generated results in an outdated token.
+
+    Args:
+        uuid (str): User uuid.
+
+    Returns:
+        dict: User profile fields, roles, permissions and authorization version.
+    """
+
+    logger.info("Generating authorization claims.")
+
+    version = get_authorization_version(uuid)
+
+    user = Authorization.get_user(uuid)
+
+    return {
+        **{field: user[field] for field in USER_FIELDS if field != "uuid"},
+        "roles": Authorization.get_user_roles(user),
+        "permissions": Authorization.get_user_permissions(user),
+        "ver": version,
+    }
@@ -3,6 +3,8 @@ import uuid
 from django.db import models
 from django.utils.timezone import now
 
+from settings import DB_COMPACT_KEYS
+
 
 class User(models.Model):
 
@@ -12,6 +14,8 @@ class User(models.Model):
     This class models database table to store user information.
 
     Attributes:
+        id (object): BIGINT column with auto increment used as user id, only with
+            compact keys.
         uuid (object): VARCHAR column to store user unique identifier.
         username (object): VARCHAR column to store user username.
         password (object): VARCHAR column to store user password.
@@ -24,9 +28,16 @@ class User(models.Model):
         roles (object): MANYTOMANY relation between user table and role table.
     """
 
-    uuid = models.CharField(
-        max_length=40, primary_key=True, default=uuid.uuid4, null=False
-    )
+    # Compact keys make relations and their indexes use integers instead of uuids.
+    if DB_COMPACT_KEYS:
+        id = models.BigAutoField(primary_key=True)
+        uuid = models.CharField(
+            max_length=40, unique=True, default=uuid.uuid4, null=False
+        )
+    else:
+        uuid = models.CharField(
+            max_length=40, primary_key=True, default=uuid.uuid4, null=False
+        )
     username = models.CharField(max_length=30, null=False, unique=True)
     password = models.CharField(max_length=100, null=False)
     email = models.CharField(max_length=100, null=False)
@@ -50,26 +61,65 @@ class Role(models.Model):
     This class models database table to store user roles information.
 
     Attributes:
-        id (object): INTEGER column with auto increment used as role id.
+        id (object): INTEGER column with auto increment used as role id, only with
+            compact keys.
         name (object): VARCHAR column to store name of role.
         description (object): VARCHAR column to store basic description of the role.
         created (object): DATETIME column to store date of role creation.
         updated (object): DATETIME column to store date of role last updated.
         permissions (object): MANYTOMANY relation between role table and permission
             table.
+        inherits (object): MANYTOMANY relation between role table and itself, to
+            roles whose roles and permissions are granted along with the role.
     """
 
-    name = models.CharField(max_length=50, primary_key=True)
+    if DB_COMPACT_KEYS:
+        id = models.AutoField(primary_key=True)
+        name = models.CharField(max_length=50, unique=True)
+    else:
+        name = models.CharField(max_length=50, primary_key=True)
+
     description = models.CharField(max_length=150, null=True)
     created = models.DateTimeField(default=now)
     updated = models.DateTimeField(default=now)
 
     permissions = models.ManyToManyField(to="Permission")
+    inherits = models.ManyToManyField(
+        to="self", symmetrical=False, related_name="inherited_by"
+    )
 
     class Meta:
         db_table = "roles"
 
 
+class RoleClosure(models.Model):
+
+    """
+    Model for role hierarchy closure entries.
+
+    This class models database table to store every role implied by each role,
+    directly or through any chain of inherited roles, and each role itself. It is
+    derived from role inheritance and kept up to date by signals, so effective roles
+    of a user are read with a single indexed join instead of walking the hierarchy.
+
+    Attributes:
+        id (object): INTEGER column with auto increment used as closure entry id.
+        role (object): FOREIGNKEY relation to role granted.
+        implied (object): FOREIGNKEY relation to role implied by granted role.
+    """
+
+    role = models.ForeignKey(
+        to="Role", on_delete=models.CASCADE, related_name="closure"
+    )
+    implied = models.ForeignKey(
+        to="Role", on_delete=models.CASCADE, related_name="implied_by"
+    )
+
+    class Meta:
+        db_table = "roles_closure"
+        unique_together = ("role", "implied")
+
+
 class Permission(models.Model):
 
     """
@@ -78,7 +128,8 @@ class Permission(models.Model):
     This class models database table to store role permissions information.
 
     Attributes:
-        id (object): INTEGER column with auto increment used as permission id.
+        id (object): INTEGER column with auto increment used as permission id, only
+            with compact keys.
         name (object): VARCHAR column to store name of permission.
         created (object): DATETIME column to store date of permission creation.
         updated (object): DATETIME column to store date of permission last updated.
@@ -86,10 +137,127 @@ class Permission(models.Model):
             permission.
     """
 
-    name = models.CharField(max_length=50, null=False, primary_key=True)
+    if DB_COMPACT_KEYS:
+        id = models.AutoField(primary_key=True)
+        name = models.CharField(max_length=50, null=False, unique=True)
+    else:
+        name = models.CharField(max_length=50, null=False, primary_key=True)
+
     description = models.CharField(max_length=150, null=True)
     created = models.DateTimeField(default=now)
     updated = models.DateTimeField(default=now)
 
     class Meta:
         db_table = "permissions"
+
+
+class AuthorizationVersion(models.Model):
+
+    """
+    Model for authorization version entries.
+
+    This class models database table to store counters bumped whenever
+    authorizations change. The entry with empty key is bumped when any role or
+    permission changes, and the entry of a user when that user or its roles change.
+    Counters only grow, so tokens carrying claims of an older version are rejected.
+
+    Attributes:
+        key (object): VARCHAR column to store user uuid, or empty for all users.
+        version (object): BIGINT column to store counter.
+        changed (object): DATETIME column to store date of last bump.
+    """
+
+    key = models.CharField(max_length=40, primary_key=True)
+    version = models.BigIntegerField(default=0, null=False)
+    changed = models.DateTimeField(default=now, db_index=True)
+
+    class Meta:
+        db_table = "authorization_versions"
+
+
+class RefreshToken(models.Model):
+
+    """
+    Model for refresh token entries.
+
+    This class models database table to store refresh tokens. Only a digest of each
+    token is stored. Every refresh consumes a token and issues a new one in the same
+    family, so a consumed token presented again reveals a leaked token and the whole
+    family is revoked.
+
+    Attributes:
+        id (object): INTEGER column with auto increment used as refresh token id.
+        digest (object): VARCHAR column to store SHA-256 digest of token.
+        family (object): VARCHAR column to store identifier shared by rotated tokens.
+        user (object): FOREIGNKEY relation between refresh token table and user
+            table, by user uuid.
+        is_used (object): BOOLEAN column to store information if token was consumed.
+        is_revoked (object): BOOLEAN column to store information if token was
+            revoked.
+        expires (object): DATETIME column to store date of token expiration.
+        created (object): DATETIME column to store date of token creation.
+    """
+
+    digest = models.CharField(max_length=64, null=False, unique=True)
+    family = models.CharField(max_length=40, null=False, db_index=True)
+    user = models.ForeignKey(to="User", to_field="uuid", on_delete=models.CASCADE)
+    is_used = models.BooleanField(default=False, null=False)
+    is_revoked = models.BooleanField(default=False, null=False)
+    expires = models.DateTimeField(null=False)
+    created = models.DateTimeField(default=now)
+
+    class Meta:
+        db_table = "refresh_tokens"
+
+
+class RevokedToken(models.Model):
+
+    """
+    Model for revoked token entries.
+
+    This class models database table to store bearer tokens revoked before their
+    expiration. Entries are only needed until token expiration and are pruned after.
+
+    Attributes:
+        id (object): INTEGER column with auto increment used as revoked token id,
+            also used to read new entries incrementally.
+        jti (object): VARCHAR column to store unique identifier of token.
+        expires (object): DATETIME column to store date of token expiration.
+        created (object): DATETIME column to store date of token revocation.
+    """
+
+    jti = models.CharField(max_length=40, null=False, unique=True)
+    expires = models.DateTimeField(null=False, db_index=True)
+    created = models.DateTimeField(default=now)
+
+    class Meta:
+        db_table = "revoked_tokens"
+
+
+class RevokedUser(models.Model):
+
+    """
+    Model for revoked user entries.
+
+    This class models database table to store times before which every token of a
+    user is revoked, so all sessions of a compromised user are cut off at once.
+    Entries are only needed until tokens issued before them expire and are pruned
+    after.
+
+    Attributes:
+        id (object): INTEGER column with auto increment used as revoked user id, also
+            used to read new entries incrementally.
+        user (object): FOREIGNKEY relation between revoked user table and user table,
+            by user uuid.
+        not_before (object): DATETIME column to store date before which tokens of user
+            are revoked.
+        expires (object): DATETIME column to store date when tokens issued before
+            entry are all expired.
+    """
+
+    user = models.ForeignKey(to="User", to_field="uuid", on_delete=models.CASCADE)
+    not_before = models.DateTimeField(null=False)
+    expires = models.DateTimeField(null=False, db_index=True)
+
+    class Meta:
+        db_table = "revoked_users"
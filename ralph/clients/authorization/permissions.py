@@ -0,0 +1,179 @@
+"""
+Match namespaced permissions against wildcard grants.
+
+Permission names are namespaced by colons, such as "orders:read". A grant ending
+with a wildcard segment, such as "billing:*", grants every permission under its
+namespace, and "*" alone grants every permission. Wildcards in other segments have
+no special meaning.
+
+Granted permissions are compiled into a prefix trie of segments, so checking a
+permission walks its segments once, whatever the number of grants. Tries are cached
+by set of granted permissions, so users with the same roles share the same trie.
+Users without wildcard grants get no trie, as exact names are matched by masks.
+"""
+
+from typing import Iterable, List, Optional
+
+from ralph.clients.authorization.cache import trie_cache
+
+# Separator of namespace segments.
+SEPARATOR = ":"
+
+# Segment granting every permission under a namespace.
+WILDCARD = "*"
+
+# Key of trie nodes whose namespace is granted entirely.
+_ALL = object()
+
+# Key of trie nodes granted exactly.
+_GRANTED = object()
+
+
+class PermissionTrie:
+
+    """
+    Prefix trie of granted permissions, by namespace segment.
+    """
+
+    __slots__ = ("_root",)
+
+    def __init__(self, permissions: Iterable[str]) -> None:
+
+        """
+        Constructor to permission trie class.
+
+        Args:
+            permissions (Iterable[str]): Granted permission names.
+
+        Returns:
+            None
+        """
+
+        self._root = {}
+
+        for permission in permissions:
+            self.add(permission)
+
+    def add(self, permission: str) -> None:
+
+        """
+        Add granted permission to trie.
+
+        Args:
+            permission (str): Granted permission name, possibly a wildcard grant.
+
+        Returns:
+            None
+        """
+
+        *namespace, last = permission.split(SEPARATOR)
+        node = self._root
+
+        for segment in namespace:
+            node = node.setdefault(segment, {})
+
+        if last == WILDCARD:
+            node[_ALL] = True
+        else:
+            node.setdefault(last, {})[_GRANTED] = True
+
+    def match(self, permission: str) -> bool:
+
+        """
+        Check if permission is granted.
+
+        Args:
+            permission (str): Required permission name.
+
+        Returns:
+            bool: True if permission is granted exactly or by a wildcard grant.
+        """
+
+        node = self._root
+
+        for segment in permission.split(SEPARATOR):
+            if _ALL in node:
+                return True
+
+            node = node.get(segment)
+
+            if node is None:
+                return False
+
+        return _GRANTED in node
+
+    def match_any(self, permissions: Iterable[str]) -> bool:
+
+        """
+        Check if any of the permissions is granted.
+
+        Args:
+            permissions (Iterable[str]): Required permission names.
+
+        Returns:
+            bool: True if any permission is granted.
+        """
+
+        return any(self.match(permission) for permission in permissions)
+
+
+def is_wildcard(permission: str) -> bool:
+
+    """
+    Check if permission name is a wildcard grant.
+
+    Args:
+        permission (str): Permission name.
+
+    Returns:
+        bool: True if permission grants a whole namespace.
+    """
+
+    return permission == WILDCARD or permission.endswith(SEPARATOR + WILDCARD)
+
+
+def get_trie(permissions: Iterable[str]) -> Optional[PermissionTrie]:
+
+    """
+    Get compiled trie of granted permissions, if any of them is a wildcard grant.
+
+    Args:
+        permissions (Iterable[str]): Granted permission names.
+
+    Returns:
+        Optional[PermissionTrie]: Trie of granted permissions, or None if there is no
+            wildcard grant.
+    """
+
+    key = frozenset(permissions)
+
+    if not any(is_wildcard(permission) for permission in key):
+        return None
+
+    trie = trie_cache.get(key)
+
+    if trie is None:
+        trie = PermissionTrie(key)
+        trie_cache.set(key, trie)
+
+    return trie
+
+
+def get_grants(permission: str) -> List[str]:
+
+    """
+    Get names of grants that would grant permission.
+
+    Args:
+        permission (str): Required permission name.
+
+    Returns:
+        List[str]: Permission itself and wildcard grants of each of its namespaces.
+    """
+
+    segments = permission.split(SEPARATOR)
+
+    return [permission, WILDCARD] + [
+        SEPARATOR.join(segments[:index] + [WILDCARD])
+        for index in range(1, len(segments))
+    ]
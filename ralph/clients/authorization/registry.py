@@ -0,0 +1,90 @@
+"""
+Registries mapping role and permission names to bits.
+
+Each name registered gets its own bit, so a set of names can be represented as an
+integer mask and checking if two sets intersect is a single AND operation. Names are
+registered the first time they are read from database or required by an endpoint,
+and also when a role or permission is saved, so registries grow incrementally and
+never need to be rebuilt. Names sent by clients are never registered, so registries
+only grow with names that exist. Bits are local to each process and must never be
+stored or shared.
+"""
+
+from threading import Lock
+from typing import Iterable
+
+
+class PermissionRegistry:
+
+    """
+    Thread safe registry assigning a bit to each name.
+    """
+
+    def __init__(self) -> None:
+
+        """
+        Constructor to registry class.
+
+        Returns:
+            None
+        """
+
+        self._bits = {}
+        self._lock = Lock()
+
+    def __len__(self) -> int:
+
+        """
+        Get number of registered names.
+
+        Returns:
+            int: Number of registered names.
+        """
+
+        return len(self._bits)
+
+    def bit(self, name: str) -> int:
+
+        """
+        Get bit of name, registering it if needed.
+
+        Args:
+            name (str): Role or permission name.
+
+        Returns:
+            int: Integer with only the bit of name set.
+        """
+
+        bit = self._bits.get(name)
+
+        if bit is None:
+            with self._lock:
+                bit = self._bits.setdefault(name, 1 << len(self._bits))
+
+        return bit
+
+    def mask(self, names: Iterable[str], register: bool = True) -> int:
+
+        """
+        Compile names into a mask.
+
+        Args:
+            names (Iterable[str]): Role or permission names.
+            register (bool): If names without bit are registered. Otherwise they are
+                left out of mask, so they match nothing. Defaults to True.
+
+        Returns:
+            int: Integer with bits of all names set.
+        """
+
+        mask = 0
+
+        for name in names:
+            mask |= self.bit(name) if register else self._bits.get(name, 0)
+
+        return mask
+
+
+# Registries of role names and of permission names.
+role_registry = PermissionRegistry()
+permission_registry = PermissionRegistry()
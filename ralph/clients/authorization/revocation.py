@@ -0,0 +1,285 @@
+"""
+In-memory list of revoked tokens.
+
+Each worker process keeps the identifiers of revoked tokens that are not expired yet,
+and the time before which tokens of each revoked user are revoked, so checking a
+token is two dictionary lookups that never wait. The list is
+loaded when the application starts, before serving requests. A background thread
+reads new revocations incrementally, by increasing id, and periodically reloads the
+whole list, which drops expired entries and recovers revocations committed out of id
+order. Expired entries are deleted from database by prune_revoked_tokens command.
+"""
+
+from os import getpid
+from threading import Lock, Thread
+from time import monotonic, sleep
+from typing import Dict, Optional
+
+from django.db import DatabaseError, close_old_connections
+from django.utils.timezone import now
+
+from ralph.clients.authorization.models import RevokedToken, RevokedUser
+from ralph.common.logger import get_logger
+from ralph.common.metrics import metrics
+from settings import REVOCATION_RELOAD_IN_SECONDS, REVOCATION_REFRESH_IN_SECONDS
+
+logger = get_logger(__name__)
+
+
+class RevocationList:
+
+    """
+    Thread safe set of revoked token identifiers and revoked users.
+
+    Lookups don't take the lock: reloads build a new dictionary and replace the
+    reference, and incremental reads only add entries.
+
+    Attributes:
+        revoked (Dict[str, float]): Expiration timestamp of each revoked token id.
+        users (Dict[str, float]): Timestamp before which tokens are revoked, by user
+            uuid.
+        last_id (int): Greatest revocation id read from database.
+        last_user_id (int): Greatest user revocation id read from database.
+        pid (int): Process owning the refresh thread, if started.
+        reloads (int): Number of full reloads.
+        refreshes (int): Number of incremental reads.
+        errors (int): Number of reads that failed.
+    """
+
+    def __init__(self) -> None:
+
+        """
+        Constructor to revocation list class.
+
+        Returns:
+            None
+        """
+
+        self.revoked: Dict[str, float] = {}
+        self.users: Dict[str, float] = {}
+        self.last_id = 0
+        self.last_user_id = 0
+        self.pid = None
+        self.reloads = 0
+        self.refreshes = 0
+        self.errors = 0
+
+        self._lock = Lock()
+
+    def is_revoked(
+        self, jti: Optional[str], uuid: str = None, issued: float = None
+    ) -> bool:
+
+        """
+        Check if token was revoked, by its id or along with all tokens of its user.
+
+        Refresh thread is started on first check of each process forked after the list
+        was loaded, without waiting for it, as the list loaded before fork is kept.
+
+        Args:
+            jti (Optional[str]): Token id, if token has one.
+            uuid (str): User uuid of token. Defaults to None.
+            issued (float): Timestamp when token was issued. Defaults to None, as for
+                tokens issued before any revocation.
+
+        Returns:
+            bool: If token was revoked.
+        """
+
+        if self.pid != getpid():
+            self.start(load=False)
+
+        if jti is not None and jti in self.revoked:
+            return True
+
+        not_before = self.users.get(uuid)
+
+        return not_before is not None and (issued or 0) <= not_before
+
+    def add(self, jti: str, expires: float) -> None:
+
+        """
+        Add revocation made by this process, so it applies without waiting for refresh.
+
+        Args:
+            jti (str): Token id.
+            expires (float): Expiration timestamp of token.
+
+        Returns:
+            None
+        """
+
+        with self._lock:
+            self.revoked[jti] = expires
+
+    def add_user(self, uuid: str, not_before: float) -> None:
+
+        """
+        Add user revocation made by this process, so it applies without waiting for
+        refresh.
+
+        Args:
+            uuid (str): User uuid.
+            not_before (float): Timestamp before which tokens of user are revoked.
+
+        Returns:
+            None
+        """
+
+        with self._lock:
+            self.users[uuid] = max(not_before, self.users.get(uuid, not_before))
+
+    def start(self, load: bool = True) -> None:
+
+        """
+        Start refresh thread of current process.
+
+        Called when the application starts, so revocations are loaded before requests
+        are served.
+
+        Args:
+            load (bool): If revocations are loaded before returning, blocking caller.
+                Otherwise refresh thread loads them. Defaults to True.
+
+        Returns:
+            None
+        """
+
+        with self._lock:
+            if self.pid == getpid():
+                return
+
+            self.pid = getpid()
+
+        if load:
+            try:
+                self.reload()
+            except DatabaseError:
+                logger.exception("Couldn't load revoked tokens.")
+                self.errors += 1
+                load = False
+            finally:
+                close_old_connections()
+
+        Thread(
+            target=self._refresh_periodically,
+            args=(load,),
+            name="revocation",
+            daemon=True,
+        ).start()
+
+    def reload(self) -> None:
+
+        """
+        Load all revocations not expired yet.
+
+        Returns:
+            None
+        """
+
+        revoked = {}
+        users = {}
+        last_id = self.last_id
+        last_user_id = self.last_user_id
+
+        for id_, jti, expires in RevokedToken.objects.filter(
+            expires__gt=now()
+        ).values_list("id", "jti", "expires"):
+            revoked[jti] = expires.timestamp()
+            last_id = max(last_id, id_)
+
+        for id_, uuid, not_before in RevokedUser.objects.filter(
+            expires__gt=now()
+        ).values_list("id", "user_id", "not_before"):
+            users[uuid] = max(not_before.timestamp(), users.get(uuid, 0))
+            last_user_id = max(last_user_id, id_)
+
+        with self._lock:
+            self.revoked = revoked
+            self.users = users
+            self.last_id = last_id
+            self.last_user_id = last_user_id
+            self.reloads += 1
+
+    def refresh(self) -> None:
+
+        """
+        Load revocations created since last read.
+
+        Returns:
+            None
+        """
+
+        rows = list(
+            RevokedToken.objects.filter(id__gt=self.last_id)
+            .order_by("id")
+            .values_list("id", "jti", "expires")
+        )
+        user_rows = list(
+            RevokedUser.objects.filter(id__gt=self.last_user_id)
+            .order_by("id")
+            .values_list("id", "user_id", "not_before")
+        )
+
+        with self._lock:
+            for id_, jti, expires in rows:
+                self.revoked[jti] = expires.timestamp()
+                self.last_id = id_
+
+            for id_, uuid, not_before in user_rows:
+                self.users[uuid] = max(not_before.timestamp(), self.users.get(uuid, 0))
+                self.last_user_id = id_
+
+            self.refreshes += 1
+
+    def stats(self) -> Dict[str, float]:
+
+        """
+        Get revocation list statistics.
+
+        Returns:
+            Dict[str, float]: Size and number of reads.
+        """
+
+        return {
+            "size": len(self.revoked),
+            "users": len(self.users),
+            "reloads": self.reloads,
+            "refreshes": self.refreshes,
+            "errors": self.errors,
+        }
+
+    def _refresh_periodically(self, loaded: bool) -> None:
+
+        """
+        Read revocations forever, reloading them at configured interval.
+
+        Args:
+            loaded (bool): If revocations were just loaded.
+
+        Returns:
+            None
+        """
+
+        next_reload = monotonic() + REVOCATION_RELOAD_IN_SECONDS if loaded else 0.0
+
+        while True:
+            try:
+                if monotonic() >= next_reload:
+                    self.reload()
+                    next_reload = monotonic() + REVOCATION_RELOAD_IN_SECONDS
+                else:
+                    self.refresh()
+            except DatabaseError:
+                logger.exception("Couldn't read revoked tokens.")
+                self.errors += 1
+            finally:
+                close_old_connections()
+
+            sleep(REVOCATION_REFRESH_IN_SECONDS)
+
+
+revocation_list = RevocationList()
+
+# Expose revocation list statistics as metrics.
+metrics.register_collector("ralph_revocation_list", revocation_list.stats)
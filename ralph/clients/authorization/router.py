@@ -1,18 +1,59 @@
+from django.http import HttpResponse
 from ninja import Router
 
-from ralph.clients.authorization.methods import login
-from ralph.clients.authorization.schemas import LoginSchema, TokenOut
+from ralph.clients.authorization.auth import EndpointAuthorization
+from ralph.clients.authorization.keys import key_ring
+from ralph.clients.authorization.methods import (
+    alogin,
+    introspect,
+    login,
+    logout,
+    refresh,
+    revoke,
+    revoke_jtis,
+    revoke_users,
+)
+from ralph.clients.authorization.schemas import (
+    IntrospectOut,
+    IntrospectSchema,
+    LoginSchema,
+    LogoutSchema,
+    RefreshSchema,
+    RevokeOut,
+    RevokeSchema,
+    TokenOut,
+)
+from ralph.clients.authorization.throttle import get_client_ip
+from ralph.common.views import configured_view
+from settings import ASYNC_ENDPOINTS, JWKS_MAX_AGE_IN_SECONDS
 
 router = Router()
 
 
+def get_bearer_token(request: object) -> str:
+
+    """
+    Get Bearer token passed via header of an authenticated request.
+
+    Args:
+        request (object): Object containing request information.
+
+    Returns:
+        str: Bearer token.
+    """
+
+    return request.headers["Authorization"].partition(" ")[2]
+
+
 @router.post("/login", response=TokenOut)
+@configured_view
 def user_login(request: object, data: LoginSchema) -> TokenOut:
 
     """
     Endpoint for user login.
 
-    This endpoint is used to generate a Bearer token.
+    This endpoint is used to generate a Bearer token. With async endpoints, login
+    is awaited in the event loop, as it never blocks it.
 
     Args:
         data (LoginSchema): Credentials for login.
@@ -21,4 +62,114 @@ def user_login(request: object, data: LoginSchema) -> TokenOut:
         TokenOut: Response with token information.
     """
 
-    return {"token": login(**data.dict())}
+    method = alogin if ASYNC_ENDPOINTS else login
+
+    return method(**data.dict(), client_ip=get_client_ip(request))
+
+
+@router.post("/refresh", response=TokenOut)
+@configured_view(blocking=True)
+def token_refresh(request: object, data: RefreshSchema) -> TokenOut:
+
+    """
+    Endpoint for token refresh.
+
+    This endpoint is used to generate a new Bearer token without credentials.
+
+    Args:
+        data (RefreshSchema): Refresh token.
+
+    Returns:
+        TokenOut: Response with token information.
+    """
+
+    return refresh(data.refresh_token)
+
+
+@router.post("/logout", response={204: None}, auth=EndpointAuthorization())
+@configured_view(blocking=True)
+def user_logout(request: object, data: LogoutSchema) -> tuple:
+
+    """
+    Endpoint for user logout.
+
+    This endpoint is used to revoke the Bearer token of request and, if passed, its
+    refresh token.
+
+    Args:
+        data (LogoutSchema): Refresh token to be revoked, if any.
+
+    Returns:
+        tuple: Empty response.
+    """
+
+    logout(get_bearer_token(request), data.refresh_token)
+
+    return 204, None
+
+
+@router.post(
+    "/revoke",
+    response=RevokeOut,
+    auth=EndpointAuthorization(permissions=["token_revoke"]),
+)
+@configured_view(blocking=True)
+def token_revoke(request: object, data: RevokeSchema) -> RevokeOut:
+
+    """
+    Endpoint for token revocation.
+
+    This endpoint is used by administrators to revoke tokens of other users, passed
+    as tokens or token ids, or every token of compromised users.
+
+    Args:
+        data (RevokeSchema): Tokens, token ids and users to be revoked.
+
+    Returns:
+        RevokeOut: Response with number of tokens and users revoked.
+    """
+
+    return {
+        "revoked": revoke(data.tokens) + revoke_jtis(data.jtis),
+        "users": revoke_users(data.users),
+    }
+
+
+@router.post(
+    "/introspect",
+    response=IntrospectOut,
+    auth=EndpointAuthorization(permissions=["token_introspect"]),
+)
+@configured_view(blocking=True)
+def token_introspect(request: object, data: IntrospectSchema) -> IntrospectOut:
+
+    """
+    Endpoint for batch token introspection.
+
+    This endpoint is used by gateways to validate many tokens at once.
+
+    Args:
+        data (IntrospectSchema): Tokens to be introspected.
+
+    Returns:
+        IntrospectOut: Response with validity and user information of each token.
+    """
+
+    return {"results": introspect(data.tokens)}
+
+
+@router.get("/.well-known/jwks.json")
+@configured_view
+def jwks(request: object) -> HttpResponse:
+
+    """
+    Endpoint for published signing keys.
+
+    This endpoint is used by other services to verify tokens locally. Key set is
+    encoded once, on first use, and may be cached by clients.
+    """
+
+    response = HttpResponse(key_ring.get_jwks(), content_type="application/json")
+    response["Cache-Control"] = f"public, max-age={JWKS_MAX_AGE_IN_SECONDS}"
+
+    return response
@@ -1,4 +1,9 @@
+from typing import List, Optional
+
 from ninja import Schema
+from pydantic import Field
+
+from settings import INTROSPECT_MAX_TOKENS, REVOKE_MAX_TOKENS
 
 
 class LoginSchema(Schema):
@@ -22,6 +27,103 @@ class TokenOut(Schema):
 
     Attributes:
         token (str): Token generated to user.
+        refresh_token (str): Refresh token generated to user.
     """
 
     token: str
+    refresh_token: Optional[str] = None
+
+
+class RefreshSchema(Schema):
+
+    """
+    Token refresh schema.
+
+    Attributes:
+        refresh_token (str): Refresh token issued by login or previous refresh.
+    """
+
+    refresh_token: str
+
+
+class IntrospectSchema(Schema):
+
+    """
+    Tokens introspection schema.
+
+    Attributes:
+        tokens (List[str]): Tokens to be introspected.
+    """
+
+    tokens: List[str] = Field(..., max_length=INTROSPECT_MAX_TOKENS)
+
+
+class TokenIntrospection(Schema):
+
+    """
+    Introspection of a single token.
+
+    Attributes:
+        active (bool): If token is valid and its user exists.
+        exp (int): Expiration timestamp of token, if active.
+        data (dict): Information on the token user, if active.
+    """
+
+    active: bool
+    exp: Optional[int] = None
+    data: Optional[dict] = None
+
+
+class IntrospectOut(Schema):
+
+    """
+    Response for tokens introspection.
+
+    Attributes:
+        results (List[TokenIntrospection]): Introspection of each token, in the same
+            order as requested.
+    """
+
+    results: List[TokenIntrospection]
+
+
+class LogoutSchema(Schema):
+
+    """
+    Logout schema.
+
+    Attributes:
+        refresh_token (str): Refresh token to be revoked with bearer token, if any.
+    """
+
+    refresh_token: Optional[str] = None
+
+
+class RevokeSchema(Schema):
+
+    """
+    Tokens revocation schema.
+
+    Attributes:
+        tokens (List[str]): Tokens to be revoked.
+        jtis (List[str]): Ids of tokens to be revoked, as in their "jti" claim.
+        users (List[str]): Uuids of users whose tokens are all revoked.
+    """
+
+    tokens: List[str] = Field([], max_length=REVOKE_MAX_TOKENS)
+    jtis: List[str] = Field([], max_length=REVOKE_MAX_TOKENS)
+    users: List[str] = Field([], max_length=REVOKE_MAX_TOKENS)
+
+
+class RevokeOut(Schema):
+
+    """
+    Response for tokens revocation.
+
+    Attributes:
+        revoked (int): Number of tokens revoked, by token or by id.
+        users (int): Number of users whose tokens were all revoked.
+    """
+
+    revoked: int
+    users: int
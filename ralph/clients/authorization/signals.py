@@ -0,0 +1,193 @@
+"""
+Keep authorization caches consistent with the database.
+
+This module connects receivers to model signals, so any change on users, roles,
+permissions and their relations drops the affected cached principals right away and
+bumps authorization versions, so tokens with outdated claims are rejected. Changes
+of roles and their inheritance also update the closure of role hierarchy. Reads
+are also pinned to primary database for a while, so replicas lagging behind don't
+serve outdated principals.
+"""
+
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from ralph.clients.authorization.cache import principal_cache
+from ralph.clients.authorization.hierarchy import (
+    check_acyclic,
+    get_ancestors,
+    rebuild_closure,
+    refresh_closure,
+)
+from ralph.clients.authorization.models import Permission, Role, User
+from ralph.clients.authorization.registry import permission_registry, role_registry
+from ralph.clients.authorization.versions import bump_authorization_version
+from ralph.common.routers import pin_primary
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def on_user_change(
+    sender: type, instance: User, **kwargs  # pylint: disable = unused-argument
+) -> None:
+
+    """
+    Drop cached principal of changed user.
+    """
+
+    # Uuid of users created in this process is not converted to string yet.
+    principal_cache.delete(str(instance.uuid))
+    bump_authorization_version(str(instance.uuid))
+
+
+@receiver(post_save, sender=Role)
+@receiver(post_delete, sender=Role)
+@receiver(post_save, sender=Permission)
+@receiver(post_delete, sender=Permission)
+@receiver(m2m_changed, sender=Role.permissions.through)
+@receiver(m2m_changed, sender=Role.inherits.through)
+def on_role_or_permission_change(
+    sender: type, **kwargs  # pylint: disable = unused-argument
+) -> None:
+
+    """
+    Drop all cached principals, since any of them may hold changed role.
+    """
+
+    principal_cache.clear()
+    bump_authorization_version()
+
+
+@receiver(m2m_changed, sender=User.roles.through)
+def on_user_roles_change(
+    sender: type,  # pylint: disable = unused-argument
+    instance: object,
+    action: str,
+    reverse: bool,
+    **kwargs,  # pylint: disable = unused-argument
+) -> None:
+
+    """
+    Drop cached principals affected by a change in user roles.
+    """
+
+    if not action.startswith("post_"):
+        return
+
+    # Change made from role side may affect any user.
+    if reverse:
+        principal_cache.clear()
+        bump_authorization_version()
+    else:
+        principal_cache.delete(str(instance.uuid))
+        bump_authorization_version(str(instance.uuid))
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+@receiver(post_save, sender=Role)
+@receiver(post_delete, sender=Role)
+@receiver(post_save, sender=Permission)
+@receiver(post_delete, sender=Permission)
+@receiver(m2m_changed, sender=Role.permissions.through)
+@receiver(m2m_changed, sender=Role.inherits.through)
+@receiver(m2m_changed, sender=User.roles.through)
+def on_authorization_change(
+    sender: type, **kwargs  # pylint: disable = unused-argument
+) -> None:
+
+    """
+    Read from primary database until replicas catch up with change.
+    """
+
+    pin_primary()
+
+
+@receiver(post_save, sender=Role)
+def on_role_save(
+    sender: type, instance: Role, **kwargs  # pylint: disable = unused-argument
+) -> None:
+
+    """
+    Register bit of saved role.
+    """
+
+    role_registry.bit(instance.name)
+
+
+@receiver(post_save, sender=Permission)
+def on_permission_save(
+    sender: type, instance: Permission, **kwargs  # pylint: disable = unused-argument
+) -> None:
+
+    """
+    Register bit of saved permission.
+    """
+
+    permission_registry.bit(instance.name)
+
+
+@receiver(post_save, sender=Role)
+def on_role_create(
+    sender: type,  # pylint: disable = unused-argument
+    instance: Role,
+    created: bool,
+    **kwargs,  # pylint: disable = unused-argument
+) -> None:
+
+    """
+    Add created role to closure of role hierarchy.
+    """
+
+    if created:
+        refresh_closure([instance.pk])
+
+
+@receiver(pre_delete, sender=Role)
+def on_role_pre_delete(
+    sender: type, instance: Role, **kwargs  # pylint: disable = unused-argument
+) -> None:
+
+    """
+    Keep roles implying deleted role, whose closure entries must be recomputed.
+    """
+
+    instance.closure_ancestors = get_ancestors([instance.pk]) - {instance.pk}
+
+
+@receiver(post_delete, sender=Role)
+def on_role_delete(
+    sender: type, instance: Role, **kwargs  # pylint: disable = unused-argument
+) -> None:
+
+    """
+    Recompute closure entries of roles implying deleted role.
+    """
+
+    refresh_closure(getattr(instance, "closure_ancestors", ()))
+
+
+@receiver(m2m_changed, sender=Role.inherits.through)
+def on_role_inherits_change(
+    sender: type,  # pylint: disable = unused-argument
+    instance: Role,
+    action: str,
+    reverse: bool,
+    pk_set: set,
+    **kwargs,  # pylint: disable = unused-argument
+) -> None:
+
+    """
+    Keep closure of role hierarchy consistent with role inheritance.
+    """
+
+    # Inheriting roles are the instance, or the ones passed when changed from
+    # inherited side.
+    roles = pk_set if reverse else {instance.pk}
+
+    if action == "pre_add":
+        check_acyclic(roles, {instance.pk} if reverse else pk_set)
+    elif action in ("post_add", "post_remove"):
+        refresh_closure(get_ancestors(roles))
+    elif action == "post_clear":
+        rebuild_closure()
@@ -0,0 +1,478 @@
+"""
+Read shared snapshot of users, roles and permissions.
+
+A snapshot is a compact binary file published by publish_snapshot command and memory
+mapped by every worker, so its pages are loaded once in the page cache and shared by
+all workers, and memory stays flat as their number grows. Users are looked up by
+binary search over fixed size records sorted by digest of their uuid, reading only
+the pages touched. Role and permission names are few and decoded once.
+
+Layout, little endian:
+    header      magic, generation, counts and position of field names
+    users       digest, profile position, first role and number of roles, by user
+    roles       name position, first permission and number of permissions, by role
+    permissions name position, by permission
+    user roles  role indexes of users
+    role perms  permission indexes of roles
+    strings     UTF-8 names and JSON encoded user profiles
+
+Snapshots are replaced atomically by renaming a new file over the old one. Workers
+check for a newer file every few seconds, and mappings in use stay valid until
+dropped. Users changed after a snapshot was published, by change times of
+authorization versions kept in memory, or missing from it, are read from database.
+"""
+
+from hashlib import blake2b
+from json import loads
+from mmap import ACCESS_READ, mmap
+from os import stat
+from struct import Struct, error, unpack_from
+from threading import Lock
+from time import monotonic
+from typing import Dict, Iterable, Optional
+
+from ralph.clients.authorization.versions import authorization_versions
+from ralph.common.logger import get_logger
+from ralph.common.metrics import metrics
+from settings import (
+    SNAPSHOT_CHECK_IN_SECONDS,
+    SNAPSHOT_MARGIN_IN_SECONDS,
+    SNAPSHOT_PATH,
+)
+
+logger = get_logger(__name__)
+
+# Identifier of snapshot files and of their format version.
+MAGIC = b"RALPHSN1"
+
+# Magic, generation, users, roles, permissions, user roles, role permissions, and
+# position and length of field names.
+HEADER = Struct("<8sdIIIIIII")
+
+# Uuid digest, profile position and length, first role and number of roles.
+USER = Struct("<16sIIII")
+
+# Name position and length, first permission and number of permissions.
+ROLE = Struct("<IIII")
+
+# Name position and length.
+PERMISSION = Struct("<II")
+
+# Role or permission index.
+INDEX = Struct("<I")
+
+
+def digest(uuid: str) -> bytes:
+
+    """
+    Get digest of uuid, by which users are sorted and searched.
+
+    Args:
+        uuid (str): User uuid.
+
+    Returns:
+        bytes: 16 bytes digest.
+    """
+
+    return blake2b(uuid.encode(), digest_size=16).digest()
+
+
+class Snapshot:
+
+    """
+    Memory mapped snapshot file.
+
+    Attributes:
+        generation (float): Time when snapshot started to be read from database, as
+            seconds since epoch.
+        users (int): Number of users.
+        fields (List[str]): User fields of profiles.
+        roles (List[tuple]): Name, first permission and number of permissions, by
+            role.
+        permissions (List[str]): Name, by permission.
+    """
+
+    def __init__(self, path: str) -> None:
+
+        """
+        Constructor to snapshot class.
+
+        Args:
+            path (str): Snapshot file path.
+
+        Returns:
+            None
+
+        Raises:
+            ValueError: If file is not a snapshot.
+        """
+
+        with open(path, "rb") as file:
+            self._map = mmap(file.fileno(), 0, access=ACCESS_READ)
+
+        (
+            magic,
+            self.generation,
+            self.users,
+            *counts,
+            fields_position,
+            fields_length,
+        ) = HEADER.unpack_from(self._map)
+
+        if magic != MAGIC:
+            raise ValueError(f"Not an authorization snapshot: {path}.")
+
+        (
+            self._users,
+            roles_position,
+            permissions_position,
+            self._user_roles,
+            self._role_permissions,
+            self._strings,
+        ) = self._locate(self.users, *counts)
+
+        self.fields = loads(self._read(fields_position, fields_length))
+        self.permissions = [
+            self._read(*PERMISSION.unpack_from(self._map, position)).decode()
+            for position in range(
+                permissions_position,
+                self._user_roles,
+                PERMISSION.size,
+            )
+        ]
+        self.roles = self._read_roles(roles_position, permissions_position)
+
+    def get(self, uuid: str) -> Optional[dict]:
+
+        """
+        Get user fields, roles and permissions.
+
+        Args:
+            uuid (str): User uuid.
+
+        Returns:
+            Optional[dict]: User fields, plus role names and permission names, as
+                returned by database. None if user is not in snapshot.
+        """
+
+        key = digest(uuid)
+        index = self._find(key)
+
+        if index is None:
+            return None
+
+        found, profile_position, profile_length, first, count = USER.unpack_from(
+            self._map, self._users + index * USER.size
+        )
+
+        if found != key:
+            return None
+
+        user = dict(
+            zip(self.fields, loads(self._read(profile_position, profile_length)))
+        )
+
+        # Digests may collide, so uuid is compared too.
+        if user["uuid"] != uuid:
+            return None
+
+        user["roles"] = {}
+        user["permissions"] = {}
+
+        # Use dicts as ordered sets to remove duplicates.
+        for role in self._indexes(self._user_roles, first, count):
+            name, first_permission, permissions = self.roles[role]
+            user["roles"][name] = None
+            user["permissions"].update(
+                dict.fromkeys(
+                    self.permissions[permission]
+                    for permission in self._indexes(
+                        self._role_permissions, first_permission, permissions
+                    )
+                )
+            )
+
+        return user
+
+    @staticmethod
+    def _locate(
+        users: int, roles: int, permissions: int, user_roles: int, role_permissions: int
+    ) -> tuple:
+
+        """
+        Get positions of sections, which follow each other in layout order.
+
+        Args:
+            users (int): Number of users.
+            roles (int): Number of roles.
+            permissions (int): Number of permissions.
+            user_roles (int): Number of role indexes of users.
+            role_permissions (int): Number of permission indexes of roles.
+
+        Returns:
+            tuple: Positions of users, roles, permissions, user roles, role
+                permissions and strings sections.
+        """
+
+        roles_position = HEADER.size + users * USER.size
+        permissions_position = roles_position + roles * ROLE.size
+        user_roles_position = permissions_position + permissions * PERMISSION.size
+        role_permissions_position = user_roles_position + user_roles * INDEX.size
+
+        return (
+            HEADER.size,
+            roles_position,
+            permissions_position,
+            user_roles_position,
+            role_permissions_position,
+            role_permissions_position + role_permissions * INDEX.size,
+        )
+
+    def _read_roles(self, start: int, end: int) -> list:
+
+        """
+        Read roles section.
+
+        Args:
+            start (int): Position of roles section.
+            end (int): Position following roles section.
+
+        Returns:
+            list: Name, first permission and number of permissions, by role.
+        """
+
+        roles = []
+
+        for position in range(start, end, ROLE.size):
+            name_position, name_length, first, count = ROLE.unpack_from(
+                self._map, position
+            )
+            roles.append(
+                (self._read(name_position, name_length).decode(), first, count)
+            )
+
+        return roles
+
+    def _find(self, key: bytes) -> Optional[int]:
+
+        """
+        Find user by binary search over digests.
+
+        Args:
+            key (bytes): Digest of user uuid.
+
+        Returns:
+            Optional[int]: Index of first user whose digest is not lower than key,
+                or None if there is none.
+        """
+
+        low, high = 0, self.users
+
+        while low < high:
+            middle = (low + high) // 2
+            position = self._users + middle * USER.size
+
+            if self._map[position : position + len(key)] < key:
+                low = middle + 1
+            else:
+                high = middle
+
+        return None if low == self.users else low
+
+    def _read(self, position: int, length: int) -> bytes:
+
+        """
+        Read bytes of strings section.
+
+        Args:
+            position (int): Position in strings section.
+            length (int): Number of bytes.
+
+        Returns:
+            bytes: Bytes read.
+        """
+
+        start = self._strings + position
+
+        return self._map[start : start + length]
+
+    def _indexes(self, section: int, first: int, count: int) -> tuple:
+
+        """
+        Read indexes of an index section.
+
+        Args:
+            section (int): Position of section.
+            first (int): First index read.
+            count (int): Number of indexes read.
+
+        Returns:
+            tuple: Indexes.
+        """
+
+        return unpack_from(f"<{count}I", self._map, section + first * INDEX.size)
+
+
+class SnapshotReader:
+
+    """
+    Latest published snapshot, reloaded when a newer one is published.
+
+    Attributes:
+        path (str): Snapshot file path. None disables snapshot.
+        check_interval (float): Seconds between checks for a newer snapshot.
+        margin (float): Seconds before publication within which changes are read
+            from database.
+        snapshot (Snapshot): Current snapshot, if any.
+        hits (int): Number of users found in snapshot.
+        misses (int): Number of users missing from snapshot.
+        stale (int): Number of users changed after snapshot was published.
+        reloads (int): Number of snapshots loaded.
+    """
+
+    def __init__(self, path: str, check_interval: float, margin: float) -> None:
+
+        """
+        Constructor to snapshot reader class.
+
+        Args:
+            path (str): Snapshot file path.
+            check_interval (float): Seconds between checks for a newer snapshot.
+            margin (float): Seconds before publication within which changes are read
+                from database.
+
+        Returns:
+            None
+        """
+
+        self.path = path
+        self.check_interval = check_interval
+        self.margin = margin
+        self.snapshot = None
+
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.reloads = 0
+
+        self._checked = None
+        self._file = None
+        self._lock = Lock()
+
+    def current(self) -> Optional[Snapshot]:
+
+        """
+        Get current snapshot, loading a newer one if it was published.
+
+        Returns:
+            Optional[Snapshot]: Current snapshot, or None if there is none.
+        """
+
+        if not self.path:
+            return None
+
+        now = monotonic()
+
+        if self._checked is not None and now - self._checked < self.check_interval:
+            return self.snapshot
+
+        self._checked = now
+
+        try:
+            info = stat(self.path)
+        except FileNotFoundError:
+            self.snapshot = self._file = None
+            return None
+
+        file = (info.st_ino, info.st_mtime_ns, info.st_size)
+
+        if file != self._file:
+            try:
+                snapshot = Snapshot(self.path)
+            except (OSError, ValueError, error):
+                logger.exception("Authorization snapshot can't be loaded.")
+                return self.snapshot
+
+            # Previous mapping stays valid for lookups still using it.
+            self.snapshot = snapshot
+            self._file = file
+
+            with self._lock:
+                self.reloads += 1
+
+            logger.info(
+                "Authorization snapshot loaded, generation %s.", snapshot.generation
+            )
+
+        return self.snapshot
+
+    def get_users(self, uuids: Iterable[str]) -> Dict[str, dict]:
+
+        """
+        Get users from snapshot, except the ones changed after it was published.
+
+        Args:
+            uuids (Iterable[str]): User uuids.
+
+        Returns:
+            Dict[str, dict]: User fields, plus role names and permission names, by
+                user uuid. Users not found or changed are missing.
+        """
+
+        snapshot = self.current()
+
+        if snapshot is None:
+            return {}
+
+        users = {}
+        stale = []
+        missing = []
+
+        for uuid, changed in authorization_versions.get_change_times(uuids).items():
+            if changed > snapshot.generation - self.margin:
+                stale.append(uuid)
+                continue
+
+            user = snapshot.get(uuid)
+
+            if user is None:
+                missing.append(uuid)
+            else:
+                users[uuid] = user
+
+        with self._lock:
+            self.hits += len(users)
+            self.misses += len(missing)
+            self.stale += len(stale)
+
+        return users
+
+    def stats(self) -> dict:
+
+        """
+        Get snapshot counters, useful to decide how often to publish.
+
+        Returns:
+            dict: Generation, number of users and lookup counters.
+        """
+
+        snapshot = self.snapshot
+
+        with self._lock:
+            return {
+                "generation": snapshot.generation if snapshot else 0,
+                "users": snapshot.users if snapshot else 0,
+                "hits": self.hits,
+                "misses": self.misses,
+                "stale": self.stale,
+                "reloads": self.reloads,
+            }
+
+
+# Snapshot shared by requests of the process.
+snapshot_reader = SnapshotReader(
+    SNAPSHOT_PATH, SNAPSHOT_CHECK_IN_SECONDS, SNAPSHOT_MARGIN_IN_SECONDS
+)
+
+# Expose snapshot statistics as metrics.
+metrics.register_collector("ralph_snapshot", snapshot_reader.stats)
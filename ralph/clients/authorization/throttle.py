@@ -0,0 +1,324 @@
+"""
+Throttle login attempts per username and per client IP.
+
+Each failed login costs a full password verification, so credential stuffing is also
+a denial of service against the authorization tier. This module counts failed logins
+over a sliding window, approximated from counters of the current and previous fixed
+windows, and rejects further attempts before any database or password work is done.
+
+Counters are kept by each worker in a bounded least recently used cache, so memory
+stays fixed whatever the number of attacked usernames or addresses. They can be kept
+in the shared Django cache instead, so limits apply across workers. Behind reverse
+proxies, client IP is read from X-Forwarded-For header, trusting only the addresses
+appended by them.
+"""
+
+from hashlib import sha256
+from math import ceil
+from threading import Lock
+from time import time
+from typing import Optional
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+
+from ralph.clients.authorization.cache import LRUCache
+from ralph.common.exceptions import TooManyRequestsException
+from ralph.common.logger import get_logger
+from ralph.common.metrics import metrics
+from settings import (
+    LOGIN_THROTTLE_IP_LIMIT,
+    LOGIN_THROTTLE_SHARED,
+    LOGIN_THROTTLE_SIZE,
+    LOGIN_THROTTLE_TRUSTED_PROXIES,
+    LOGIN_THROTTLE_USERNAME_LIMIT,
+    LOGIN_THROTTLE_WINDOW_IN_SECONDS,
+)
+
+logger = get_logger(__name__)
+
+THROTTLE_KEY = "login-throttle:%s:%s:%s"
+
+
+def get_client_ip(request: object) -> Optional[str]:
+
+    """
+    Get IP of client sending request.
+
+    Each trusted proxy appends address of its peer to X-Forwarded-For header, so client
+    IP is the one appended by the first of them. Addresses before it are sent by the
+    client and may be forged.
+
+    Args:
+        request (object): Object containing request information.
+
+    Returns:
+        Optional[str]: Client IP, or connection address if request didn't go through
+            all trusted proxies.
+    """
+
+    if LOGIN_THROTTLE_TRUSTED_PROXIES <= 0:
+        return request.META.get("REMOTE_ADDR")
+
+    addresses = [
+        address.strip()
+        for address in request.META.get("HTTP_X_FORWARDED_FOR", "").split(",")
+        if address.strip()
+    ]
+
+    if len(addresses) < LOGIN_THROTTLE_TRUSTED_PROXIES:
+        return request.META.get("REMOTE_ADDR")
+
+    return addresses[-LOGIN_THROTTLE_TRUSTED_PROXIES]
+
+
+class LoginThrottle:
+
+    """
+    Sliding window counters of failed logins by key.
+
+    Attributes:
+        name (str): Name of keys counted, such as "username" or "ip".
+        limit (int): Failed logins allowed per window. Zero disables throttle.
+        window (int): Window length, in seconds.
+        shared (bool): Whether counters are kept in shared cache.
+        checked (int): Number of attempts checked.
+        throttled (int): Number of attempts rejected.
+        failures (int): Number of failed logins recorded.
+    """
+
+    def __init__(
+        self, name: str, limit: int, window: int, size: int, shared: bool
+    ) -> None:
+
+        """
+        Constructor to login throttle class.
+
+        Args:
+            name (str): Name of keys counted.
+            limit (int): Failed logins allowed per window.
+            window (int): Window length, in seconds.
+            size (int): Number of counters kept in memory.
+            shared (bool): Whether counters are kept in shared cache.
+
+        Returns:
+            None
+        """
+
+        self.name = name
+        self.limit = limit
+        self.window = window
+        self.shared = shared
+
+        self.checked = 0
+        self.throttled = 0
+        self.failures = 0
+
+        # Counters are stored as key -> (window index, previous count, count).
+        self._counters = LRUCache(size, 2 * window)
+        self._lock = Lock()
+
+    def check(self, key: str) -> None:
+
+        """
+        Reject attempt if key is over its limit.
+
+        Args:
+            key (str): Username or client IP of attempt.
+
+        Returns:
+            None
+
+        Raises:
+            TooManyRequestsException: If key is throttled, with seconds to wait.
+        """
+
+        if self.limit <= 0 or not key:
+            return
+
+        now = time()
+        previous, current = self._read(key, int(now // self.window))
+
+        # Previous window only counts for the part still inside sliding window.
+        elapsed = now % self.window
+        estimate = previous * (1 - elapsed / self.window) + current
+
+        with self._lock:
+            self.checked += 1
+
+            if estimate < self.limit:
+                return
+
+            self.throttled += 1
+
+        # Wait until estimate is back under limit, within this window or the next.
+        if current < self.limit:
+            wait = self.window * (1 - (self.limit - current) / previous) - elapsed
+        else:
+            wait = self.window - elapsed + self.window * (1 - self.limit / current)
+
+        logger.warning("Login throttled by %s.", self.name)
+        raise TooManyRequestsException(max(ceil(wait), 1))
+
+    def add(self, key: str) -> None:
+
+        """
+        Record failed login of key.
+
+        Args:
+            key (str): Username or client IP of attempt.
+
+        Returns:
+            None
+        """
+
+        if self.limit <= 0 or not key:
+            return
+
+        index = int(time() // self.window)
+
+        with self._lock:
+            self.failures += 1
+
+            if not self.shared:
+                previous, current = self._read(key, index)
+                self._counters.set(key, (index, previous, current + 1))
+                return
+
+        shared_key = THROTTLE_KEY % (self.name, self._hash(key), index)
+
+        # Counter must be created on its first increment.
+        try:
+            cache.incr(shared_key)
+        except ValueError:
+            cache.add(shared_key, 0, timeout=2 * self.window)
+            cache.incr(shared_key)
+
+    async def acheck(self, key: str) -> None:
+
+        """
+        Reject attempt if key is over its limit, for async endpoints.
+
+        Args:
+            key (str): Username or client IP of attempt.
+
+        Returns:
+            None
+        """
+
+        if self.shared:
+            await sync_to_async(self.check)(key)
+        else:
+            self.check(key)
+
+    async def aadd(self, key: str) -> None:
+
+        """
+        Record failed login of key, for async endpoints.
+
+        Args:
+            key (str): Username or client IP of attempt.
+
+        Returns:
+            None
+        """
+
+        if self.shared:
+            await sync_to_async(self.add)(key)
+        else:
+            self.add(key)
+
+    def stats(self) -> dict:
+
+        """
+        Get throttle counters, useful to spot attacks and tune limits.
+
+        Returns:
+            dict: Limit, counters kept and checked, throttled and failed attempts.
+        """
+
+        with self._lock:
+            return {
+                "limit": self.limit,
+                "size": self._counters.stats()["size"],
+                "checked": self.checked,
+                "throttled": self.throttled,
+                "failures": self.failures,
+            }
+
+    def _read(self, key: str, index: int) -> tuple:
+
+        """
+        Read counts of previous and current windows.
+
+        Args:
+            key (str): Username or client IP.
+            index (int): Index of current window.
+
+        Returns:
+            tuple: Failed logins in previous and current windows.
+        """
+
+        if self.shared:
+            hashed = self._hash(key)
+            counts = cache.get_many(
+                [
+                    THROTTLE_KEY % (self.name, hashed, index - offset)
+                    for offset in (1, 0)
+                ]
+            )
+
+            return (
+                counts.get(THROTTLE_KEY % (self.name, hashed, index - 1), 0),
+                counts.get(THROTTLE_KEY % (self.name, hashed, index), 0),
+            )
+
+        counter = self._counters.get(key)
+
+        if counter is None:
+            return 0, 0
+
+        # Counters of a window that just ended become previous counts.
+        if counter[0] == index:
+            return counter[1], counter[2]
+
+        if counter[0] == index - 1:
+            return counter[2], 0
+
+        return 0, 0
+
+    @staticmethod
+    def _hash(key: str) -> str:
+
+        """
+        Hash key, so any username is a valid shared cache key.
+
+        Args:
+            key (str): Username or client IP.
+
+        Returns:
+            str: Hashed key.
+        """
+
+        return sha256(key.encode()).hexdigest()[:32]
+
+
+# Throttles shared by login requests of the process.
+username_throttle = LoginThrottle(
+    "username",
+    LOGIN_THROTTLE_USERNAME_LIMIT,
+    LOGIN_THROTTLE_WINDOW_IN_SECONDS,
+    LOGIN_THROTTLE_SIZE,
+    LOGIN_THROTTLE_SHARED,
+)
+ip_throttle = LoginThrottle(
+    "ip",
+    LOGIN_THROTTLE_IP_LIMIT,
+    LOGIN_THROTTLE_WINDOW_IN_SECONDS,
+    LOGIN_THROTTLE_SIZE,
+    LOGIN_THROTTLE_SHARED,
+)
+
+# Expose throttle statistics as metrics.
+metrics.register_collector("ralph_login_throttle_username", username_throttle.stats)
+metrics.register_collector("ralph_login_throttle_ip", ip_throttle.stats)
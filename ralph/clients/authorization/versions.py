@@ -0,0 +1,429 @@
+"""
+Authorization versions of users.
+
+Versions are counters kept in the database and bumped whenever a user, role or
+permission changes, so tokens carrying claims from an older version are rejected.
+They are written to primary database, in the same transaction as the change, and
+never go back, whatever happens to caches or processes. Time of last bump is kept
+along, so data read before a change, such as a published snapshot, can be discarded.
+
+Each worker process keeps the versions changed recently in memory, so checking a
+token is a few dictionary lookups that never wait. They are loaded when the
+application starts, a background thread reads versions changed since last read and
+periodically reloads them, dropping the ones changed before retention. Tokens are
+issued within retention, so a user missing from memory has the version read at
+login, and only the global version must be compared.
+"""
+
+from datetime import timedelta
+from os import getpid
+from threading import Lock, Thread
+from time import monotonic, sleep
+from typing import Dict, Iterable, List, Tuple
+
+from django.db import DatabaseError, IntegrityError, close_old_connections, transaction
+from django.db.models import F, Q
+from django.utils.timezone import now
+
+from ralph.clients.authorization.models import AuthorizationVersion
+from ralph.common.logger import get_logger
+from ralph.common.metrics import metrics
+from settings import (
+    VERSIONS_MARGIN_IN_SECONDS,
+    VERSIONS_REFRESH_IN_SECONDS,
+    VERSIONS_RELOAD_IN_SECONDS,
+    VERSIONS_RETENTION_IN_SECONDS,
+)
+
+logger = get_logger(__name__)
+
+# Key of version bumped for all users.
+GLOBAL_VERSION_KEY = ""
+
+
+def get_authorization_version(uuid: str) -> List[int]:
+
+    """
+    Get current authorization version of user from database.
+
+    The version is made of the global counter, bumped when roles or permissions
+    change, and the user counter, bumped when user or its roles change. Both only
+    grow, so any change results in a greater version.
+
+    Args:
+        uuid (str): User uuid.
+
+    Returns:
+        List[int]: Global and user counters.
+    """
+
+    versions = dict(
+        AuthorizationVersion.objects.filter(
+            key__in=[GLOBAL_VERSION_KEY, uuid]
+        ).values_list("key", "version")
+    )
+
+    return [versions.get(GLOBAL_VERSION_KEY, 0), versions.get(uuid, 0)]
+
+
+def bump_authorization_version(uuid: str = None) -> None:
+
+    """
+    Increment authorization version of a user or, if none is passed, of all users.
+
+    Args:
+        uuid (str): User uuid. Defaults to None.
+
+    Returns:
+        None
+    """
+
+    key = GLOBAL_VERSION_KEY if uuid is None else uuid
+    versions = AuthorizationVersion.objects.filter(key=key)
+    changed = now()
+
+    # Counter is created on its first bump, possibly by a concurrent one.
+    if not versions.update(version=F("version") + 1, changed=changed):
+        try:
+            with transaction.atomic():
+                AuthorizationVersion.objects.create(key=key, version=1, changed=changed)
+        except IntegrityError:
+            versions.update(version=F("version") + 1, changed=changed)
+
+    # Apply bump in this process without waiting for refresh, once committed.
+    transaction.on_commit(lambda: authorization_versions.read_keys([key]))
+
+
+def get_change_times(uuids: Iterable[str]) -> Dict[str, float]:
+
+    """
+    Get time of last change of authorizations of each user, with a single query.
+
+    Args:
+        uuids (Iterable[str]): User uuids.
+
+    Returns:
+        Dict[str, float]: Time of last change, as seconds since epoch, by user uuid.
+            Zero if authorizations never changed.
+    """
+
+    uuids = list(uuids)
+    times = {
+        key: changed.timestamp()
+        for key, changed in AuthorizationVersion.objects.filter(
+            key__in=[GLOBAL_VERSION_KEY, *uuids]
+        ).values_list("key", "changed")
+    }
+    changed = times.get(GLOBAL_VERSION_KEY, 0)
+
+    return {uuid: max(changed, times.get(uuid, 0)) for uuid in uuids}
+
+
+class AuthorizationVersions:
+
+    """
+    Thread safe map of authorization versions changed within retention.
+
+    Lookups don't take the lock: reloads build a new dictionary and replace the
+    reference, and incremental reads only add entries.
+
+    Attributes:
+        versions (Dict[str, Tuple[int, float]]): Counter and time of last change, as
+            seconds since epoch, by key. Global version is always kept.
+        since (Optional[float]): Time of changes kept, as seconds since epoch. None
+            until versions are loaded.
+        last_changed (Optional[object]): Greatest change time read from database.
+        pid (int): Process owning the refresh thread, if started.
+        reloads (int): Number of full reloads.
+        refreshes (int): Number of incremental reads.
+        errors (int): Number of reads that failed.
+    """
+
+    def __init__(self) -> None:
+
+        """
+        Constructor to authorization versions class.
+
+        Returns:
+            None
+        """
+
+        self.versions: Dict[str, Tuple[int, float]] = {}
+        self.since = None
+        self.last_changed = None
+        self.pid = None
+        self.reloads = 0
+        self.refreshes = 0
+        self.errors = 0
+
+        self._lock = Lock()
+
+    @property
+    def loaded(self) -> bool:
+
+        """
+        Whether versions were loaded, starting refresh thread of a forked process.
+
+        Returns:
+            bool: If versions can be read from memory.
+        """
+
+        if self.pid != getpid():
+            self.start(load=False)
+
+        return self.since is not None
+
+    def are_current(self, claims: Iterable[Tuple[str, object]]) -> List[bool]:
+
+        """
+        Check if versions claimed by tokens are current.
+
+        Versions are read from memory once loaded, otherwise from database, with a
+        single query for all users.
+
+        Args:
+            claims (Iterable[Tuple[str, object]]): User uuid and version claimed, by
+                token.
+
+        Returns:
+            List[bool]: For each claim, in the same order, if version is current.
+        """
+
+        claims = list(claims)
+
+        if not claims:
+            return []
+
+        if self.loaded:
+            versions = self.versions
+            current = {
+                uuid: (
+                    versions.get(GLOBAL_VERSION_KEY, (0, 0))[0],
+                    versions.get(uuid, (None, 0))[0],
+                )
+                for uuid, _ in claims
+            }
+        else:
+            versions = dict(
+                AuthorizationVersion.objects.filter(
+                    key__in={GLOBAL_VERSION_KEY, *(uuid for uuid, _ in claims)}
+                ).values_list("key", "version")
+            )
+            current = {
+                uuid: (versions.get(GLOBAL_VERSION_KEY, 0), versions.get(uuid, 0))
+                for uuid, _ in claims
+            }
+
+        results = []
+
+        for uuid, version in claims:
+            global_version, user_version = current[uuid]
+
+            # User missing from memory didn't change since token was issued, and
+            # tokens may be issued with versions not read yet.
+            results.append(
+                isinstance(version, list)
+                and len(version) == 2
+                and version[0] >= global_version
+                and (user_version is None or version[1] >= user_version)
+            )
+
+        return results
+
+    def get_change_times(self, uuids: Iterable[str]) -> Dict[str, float]:
+
+        """
+        Get time of last change of authorizations of each user.
+
+        Times are read from memory once loaded, otherwise from database. Users
+        missing from memory changed before retention, whose start is returned.
+
+        Args:
+            uuids (Iterable[str]): User uuids.
+
+        Returns:
+            Dict[str, float]: Time of last change, or time before which it changed,
+                as seconds since epoch, by user uuid.
+        """
+
+        if not self.loaded:
+            return get_change_times(uuids)
+
+        versions = self.versions
+        since = self.since
+        changed = versions.get(GLOBAL_VERSION_KEY, (0, 0))[1]
+
+        return {uuid: max(changed, versions.get(uuid, (0, since))[1]) for uuid in uuids}
+
+    def start(self, load: bool = True) -> None:
+
+        """
+        Start refresh thread of current process.
+
+        Called when the application starts, so versions are loaded before requests
+        are served.
+
+        Args:
+            load (bool): If versions are loaded before returning, blocking caller.
+                Otherwise refresh thread loads them. Defaults to True.
+
+        Returns:
+            None
+        """
+
+        with self._lock:
+            if self.pid == getpid():
+                return
+
+            self.pid = getpid()
+
+        if load:
+            try:
+                self.reload()
+            except DatabaseError:
+                logger.exception("Couldn't load authorization versions.")
+                self.errors += 1
+                load = False
+            finally:
+                close_old_connections()
+
+        Thread(
+            target=self._refresh_periodically,
+            args=(load,),
+            name="versions",
+            daemon=True,
+        ).start()
+
+    def reload(self) -> None:
+
+        """
+        Load versions changed within retention, and global version.
+
+        Returns:
+            None
+        """
+
+        since = now() - timedelta(seconds=VERSIONS_RETENTION_IN_SECONDS)
+        versions = {}
+        last_changed = since
+
+        for key, version, changed in AuthorizationVersion.objects.filter(
+            Q(changed__gte=since) | Q(key=GLOBAL_VERSION_KEY)
+        ).values_list("key", "version", "changed"):
+            versions[key] = (version, changed.timestamp())
+            last_changed = max(last_changed, changed)
+
+        with self._lock:
+            self.versions = versions
+            self.since = since.timestamp()
+            self.last_changed = last_changed
+            self.reloads += 1
+
+    def refresh(self) -> None:
+
+        """
+        Load versions changed since last read, and within margin before it, so
+        changes committed late are read too.
+
+        Returns:
+            None
+        """
+
+        self._merge(
+            AuthorizationVersion.objects.filter(
+                changed__gte=self.last_changed
+                - timedelta(seconds=VERSIONS_MARGIN_IN_SECONDS)
+            )
+        )
+
+        with self._lock:
+            self.refreshes += 1
+
+    def read_keys(self, keys: Iterable[str]) -> None:
+
+        """
+        Load versions of keys, bumped by this process.
+
+        Args:
+            keys (Iterable[str]): Version keys.
+
+        Returns:
+            None
+        """
+
+        if self.since is not None:
+            self._merge(AuthorizationVersion.objects.filter(key__in=list(keys)))
+
+    def stats(self) -> Dict[str, float]:
+
+        """
+        Get authorization versions statistics.
+
+        Returns:
+            Dict[str, float]: Size and number of reads.
+        """
+
+        return {
+            "size": len(self.versions),
+            "reloads": self.reloads,
+            "refreshes": self.refreshes,
+            "errors": self.errors,
+        }
+
+    def _merge(self, versions: object) -> None:
+
+        """
+        Add versions read, keeping greatest ones, as counters only grow.
+
+        Args:
+            versions (object): Query of versions.
+
+        Returns:
+            None
+        """
+
+        rows = list(versions.values_list("key", "version", "changed"))
+
+        with self._lock:
+            for key, version, changed in rows:
+                known = self.versions.get(key, (0, 0))
+                self.versions[key] = (
+                    max(version, known[0]),
+                    max(changed.timestamp(), known[1]),
+                )
+                self.last_changed = max(self.last_changed, changed)
+
+    def _refresh_periodically(self, loaded: bool) -> None:
+
+        """
+        Read versions forever, reloading them at configured interval.
+
+        Args:
+            loaded (bool): If versions were just loaded.
+
+        Returns:
+            None
+        """
+
+        next_reload = monotonic() + VERSIONS_RELOAD_IN_SECONDS if loaded else 0.0
+
+        while True:
+            try:
+                if monotonic() >= next_reload:
+                    self.reload()
+                    next_reload = monotonic() + VERSIONS_RELOAD_IN_SECONDS
+                else:
+                    self.refresh()
+            except DatabaseError:
+                logger.exception("Couldn't read authorization versions.")
+                self.errors += 1
+            finally:
+                close_old_connections()
+
+            sleep(VERSIONS_REFRESH_IN_SECONDS)
+
+
+authorization_versions = AuthorizationVersions()
+
+# Expose authorization versions statistics as metrics.
+metrics.register_collector("ralph_authorization_versions", authorization_versions.stats)
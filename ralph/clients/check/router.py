@@ -1,11 +1,69 @@
+from hmac import compare_digest
+from typing import Optional
+
+from django.http import HttpResponse
 from ninja import Router
+from ninja.security import HttpBearer
 
-from ralph.clients.authorization.auth import Authorization
+from ralph.clients.authorization.auth import EndpointAuthorization, authorize_many
+from ralph.clients.check.schemas import AuthorizeOut, AuthorizeSchema
+from ralph.common.metrics import collect
+from ralph.common.views import configured_view
+from settings import METRICS_TOKEN
 
 router = Router()
 
 
+class MetricsAuthorization(HttpBearer):
+
+    """
+    Handles authorization of metrics scrapers, by token set in settings.
+    """
+
+    def authenticate(
+        self, request: object, token: str  # pylint: disable = unused-argument
+    ) -> Optional[bool]:
+
+        """
+        Check if token is the one set for scrapers.
+
+        Args:
+            request (object): Object containing request information.
+            token (str): Bearer token passed via header.
+
+        Returns:
+            Optional[bool]: True if token matches, or None to reject request.
+        """
+
+        if METRICS_TOKEN and compare_digest(token.encode(), METRICS_TOKEN.encode()):
+            return True
+
+        return None
+
+
+def principal_response(request: object) -> HttpResponse:
+
+    """
+    Respond with information on authenticated user, as {"data": ...}.
+
+    Payload encoded along with principal is reused, so no dictionary is built or
+    encoded for the response.
+
+    Args:
+        request (object): Object containing request information.
+
+    Returns:
+        HttpResponse: Response with user information.
+    """
+
+    return HttpResponse(
+        b'{"data":' + request.principal.encoded_payload + b"}",
+        content_type="application/json",
+    )
+
+
 @router.get("/healthcheck")
+@configured_view
 def healthcheck(request: object) -> dict:
 
     """
@@ -17,8 +75,9 @@ def healthcheck(request: object) -> dict:
     return {"message": "System is running."}
 
 
-@router.get("/login-check", auth=Authorization())
-def login_check(request: object) -> dict:
+@router.get("/login-check", auth=EndpointAuthorization())
+@configured_view
+def login_check(request: object) -> HttpResponse:
 
     """
     Basic authorization endpoint for token.
@@ -27,11 +86,12 @@ def login_check(request: object) -> dict:
     generated by logging in to the API.
     """
 
-    return {"data": request.auth}
+    return principal_response(request)
 
 
-@router.get("/role-check", auth=Authorization(roles=["role_check"]))
-def role_check(request: object) -> dict:
+@router.get("/role-check", auth=EndpointAuthorization(roles=["role_check"]))
+@configured_view
+def role_check(request: object) -> HttpResponse:
 
     """
     Basic authorization endpoint for role.
@@ -40,11 +100,14 @@ def role_check(request: object) -> dict:
     is not part of 'role_check' role.
     """
 
-    return {"data": request.auth}
+    return principal_response(request)
 
 
-@router.get("/permission-check", auth=Authorization(permissions=["permission_check"]))
-def permission_check(request: object) -> dict:
+@router.get(
+    "/permission-check", auth=EndpointAuthorization(permissions=["permission_check"])
+)
+@configured_view
+def permission_check(request: object) -> HttpResponse:
 
     """
     Basic authorization endpoint for permission.
@@ -53,4 +116,44 @@ def permission_check(request: object) -> dict:
     has not 'permission_check' permission.
     """
 
-    return {"data": request.auth}
+    return principal_response(request)
+
+
+@router.post(
+    "/authorize",
+    response=AuthorizeOut,
+    auth=EndpointAuthorization(permissions=["authorization_decide"]),
+)
+@configured_view(blocking=True)
+def authorize(request: object, data: AuthorizeSchema) -> AuthorizeOut:
+
+    """
+    Bulk authorization decision endpoint.
+
+    This endpoint function evaluates many requirements for many users at once, with
+    the same semantics of endpoint authorization, to filter lists or render pages.
+    """
+
+    decisions = authorize_many(
+        data.users, [requirement.dict() for requirement in data.requirements]
+    )
+
+    return {
+        "decisions": [
+            "".join("1" if item else "0" for item in row) for row in decisions
+        ]
+    }
+
+
+@router.get("/metrics", include_in_schema=False, auth=MetricsAuthorization())
+def metrics(request: object) -> HttpResponse:
+
+    """
+    Metrics endpoint.
+
+    This endpoint function exposes phase durations, database queries, cache and
+    password pool statistics of all worker processes, in Prometheus text format, to
+    scrapers sending token set in METRICS_TOKEN.
+    """
+
+    return HttpResponse(collect(), content_type="text/plain; version=0.0.4")
@@ -0,0 +1,50 @@
+from typing import List
+
+from ninja import Schema
+from pydantic import Field
+
+from settings import AUTHORIZE_MAX_REQUIREMENTS, AUTHORIZE_MAX_USERS
+
+
+class RequirementSchema(Schema):
+
+    """
+    Authorization requirement schema.
+
+    Attributes:
+        roles (List[str]): User must have at least one of those roles, if any.
+        permissions (List[str]): User must have at least one of those permissions, if
+            any.
+    """
+
+    roles: List[str] = []
+    permissions: List[str] = []
+
+
+class AuthorizeSchema(Schema):
+
+    """
+    Bulk authorization decision schema.
+
+    Attributes:
+        users (List[str]): Uuids of users.
+        requirements (List[RequirementSchema]): Requirements evaluated for each user.
+    """
+
+    users: List[str] = Field(..., max_length=AUTHORIZE_MAX_USERS)
+    requirements: List[RequirementSchema] = Field(
+        ..., max_length=AUTHORIZE_MAX_REQUIREMENTS
+    )
+
+
+class AuthorizeOut(Schema):
+
+    """
+    Response for bulk authorization decision.
+
+    Attributes:
+        decisions (List[str]): For each user, in the same order as requested, a string
+            with "1" for each requirement met and "0" for each requirement not met.
+    """
+
+    decisions: List[str]
@@ -30,3 +30,27 @@ class InvalidCredentialException(Exception):
     """
 
     ...
+
+
+class ServiceUnavailableException(Exception):
+
+    """
+    Custom exception for service unavailable.
+
+    This exception is raised when the server is overloaded and can't handle the
+    request right now.
+    """
+
+    ...
+
+
+class TooManyRequestsException(Exception):
+
+    """
+    Custom exception for too many requests.
+
+    This exception is raised when a client exceeds its allowed number of attempts.
+    Seconds to wait before trying again are passed as its argument.
+    """
+
+    ...
@@ -2,37 +2,274 @@
 Configure logging system.
 
 This module will configure logging system and make a function to generate a logger
-that can be imported by other modules. It will also check if logs folder exists and,
-if not, will create one, so it can store log files.
+that can be imported by other modules. Logs folder and file are only created when
+the first record is written, so importing this module touches no files.
+
+Records are put in a queue by the thread logging them, with their message already
+merged, and are formatted and written, to a file and to stdout, by a background
+listener thread, so requests never wait for writes. The file is shared by all worker
+processes, each reopening it when it is moved, so it must be rotated externally, such
+as by logrotate. INFO records can be sampled and rate limited per logger, so the hot
+path doesn't flood the pipeline.
 """
 
-from datetime import datetime
-from os import path, mkdir
+from copy import copy
+from logging.handlers import QueueHandler, QueueListener, WatchedFileHandler
+from os import makedirs, path
+from queue import Full, Queue
+from random import random
+from threading import Lock
+from time import monotonic
+import atexit
+import json
 import logging
 import sys
 
-# Check if logs folder exists.
-if not path.exists("logs"):
-    mkdir("logs")
+from settings import (
+    LOG_DIRECTORY,
+    LOG_FORMAT,
+    LOG_LEVEL,
+    LOG_QUEUE_SIZE,
+    LOG_RATE_LIMIT_PER_SECOND,
+    LOG_SAMPLE_RATE,
+)
+
+# Format used when structured output is disabled.
+TEXT_FORMAT = "%(asctime)s | [%(levelname)s] %(name)s -> %(message)s"
+
+# Formatter of exceptions, rendered before records are enqueued.
+_exception_formatter = logging.Formatter()
+
+
+class JSONFormatter(logging.Formatter):
+
+    """
+    Formats records as one JSON object per line.
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+
+        """
+        Format record as JSON.
+
+        Args:
+            record (logging.LogRecord): Record to be formatted.
+
+        Returns:
+            str: JSON object with time, level, logger name and message of record.
+        """
+
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+
+        return json.dumps(entry, default=str)
+
+
+class SamplingFilter(logging.Filter):
+
+    """
+    Samples and rate limits records below WARNING level, per logger.
+
+    Each logger has a token bucket refilled at rate limit per second, holding at most
+    one second of tokens. Records of WARNING level or above always pass.
+
+    Attributes:
+        sample_rate (float): Fraction of records kept, between 0 and 1.
+        rate_limit (float): Records kept per second and per logger. Zero disables
+            rate limit.
+        dropped (int): Number of records dropped.
+    """
+
+    def __init__(self, sample_rate: float, rate_limit: float) -> None:
+
+        """
+        Constructor to sampling filter class.
+
+        Args:
+            sample_rate (float): Fraction of records kept, between 0 and 1.
+            rate_limit (float): Records kept per second and per logger.
+
+        Returns:
+            None
+        """
+
+        super().__init__()
+
+        self.sample_rate = sample_rate
+        self.rate_limit = rate_limit
+        self.dropped = 0
+
+        # Buckets are stored as logger name -> (tokens, last refill time).
+        self._buckets = {}
+        self._lock = Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+
+        """
+        Decide if record is kept.
+
+        Args:
+            record (logging.LogRecord): Record to be checked.
+
+        Returns:
+            bool: True if record must be logged.
+        """
+
+        if record.levelno >= logging.WARNING:
+            return True
+
+        if self.sample_rate < 1 and random() >= self.sample_rate:
+            self.dropped += 1
+            return False
+
+        if not self.rate_limit:
+            return True
+
+        now = monotonic()
+
+        with self._lock:
+            tokens, last = self._buckets.get(record.name, (self.rate_limit, now))
+            tokens = min(self.rate_limit, tokens + (now - last) * self.rate_limit)
+
+            if tokens < 1:
+                self._buckets[record.name] = (tokens, now)
+                self.dropped += 1
+                return False
+
+            self._buckets[record.name] = (tokens - 1, now)
+
+        return True
 
-# Gets current datetime.
-now = datetime.now()
 
-# Set filename with current date.
-filename = f"{now.year}{now.month}{now.day}.log"
+class DeferredQueueHandler(QueueHandler):
 
-# Create log stream to file.
-file_handler = logging.FileHandler(filename="logs/" + filename)
+    """
+    Queue handler that leaves most formatting to the listener thread.
+
+    Default queue handler formats records before enqueuing them. Only message and
+    exception are rendered instead, so arguments changed after logging don't alter
+    them, and time and output format are left to listener. Records are dropped if
+    queue is full, so logging never blocks the caller.
+
+    Attributes:
+        dropped (int): Number of records dropped because queue was full.
+    """
+
+    dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+
+        """
+        Render message and exception of record.
+
+        Args:
+            record (logging.LogRecord): Record to be enqueued.
+
+        Returns:
+            logging.LogRecord: Copy of record, with arguments merged in message.
+        """
+
+        # Copy record, as other handlers may still format original one.
+        record = copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+
+        if record.exc_info:
+            record.exc_text = _exception_formatter.formatException(record.exc_info)
+            record.exc_info = None
+
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+
+        """
+        Put record in queue, dropping it if queue is full.
+
+        Args:
+            record (logging.LogRecord): Record to be enqueued.
+
+        Returns:
+            None
+        """
+
+        try:
+            self.queue.put_nowait(record)
+        except Full:
+            self.dropped += 1
+
+
+class DeferredFileHandler(WatchedFileHandler):
+
+    """
+    File handler reopening file when moved, creating its folder and file on first
+    write.
+    """
 
-# Create log strem to stdout.
-stdout_handler = logging.StreamHandler(sys.stdout)
+    def _open(self) -> object:
+
+        """
+        Create folder of log file, if missing, and open file.
+
+        Returns:
+            object: File stream.
+        """
+
+        makedirs(path.dirname(self.baseFilename), exist_ok=True)
+
+        return super()._open()
+
+
+def create_output_handlers(directory: str) -> list:
+
+    """
+    Create handlers writing formatted records to file and stdout.
+
+    Args:
+        directory (str): Folder to store log files.
+
+    Returns:
+        list: File and stdout handlers.
+    """
+
+    formatter = (
+        JSONFormatter() if LOG_FORMAT == "json" else logging.Formatter(TEXT_FORMAT)
+    )
+
+    # Create log stream to file, shared by workers and opened on first write.
+    file_handler = DeferredFileHandler(
+        filename=path.join(directory, "ralph.log"), encoding="utf-8", delay=True
+    )
+
+    # Create log stream to stdout.
+    stdout_handler = logging.StreamHandler(sys.stdout)
+
+    for handler in (file_handler, stdout_handler):
+        handler.setFormatter(formatter)
+
+    return [file_handler, stdout_handler]
+
+
+# Create queue handler, used by all loggers, and filter it.
+queue_handler = DeferredQueueHandler(Queue(LOG_QUEUE_SIZE))
+queue_handler.addFilter(SamplingFilter(LOG_SAMPLE_RATE, LOG_RATE_LIMIT_PER_SECOND))
+
+# Create listener to write records in background and stop it at exit, flushing queue.
+listener = QueueListener(queue_handler.queue, *create_output_handlers(LOG_DIRECTORY))
+listener.start()
+atexit.register(listener.stop)
 
 # Generate configuration of logging.
-logging.basicConfig(
-    level=logging.INFO,
-    format="%(asctime)s | [%(levelname)s] %(name)s -> %(message)s",
-    handlers=[file_handler, stdout_handler],
-)
+logging.basicConfig(level=LOG_LEVEL, handlers=[queue_handler])
 
 
 def get_logger(name: str) -> object:
@@ -0,0 +1,432 @@
+"""
+Collect metrics and expose them in Prometheus text format.
+
+Durations are aggregated in histograms with fixed buckets and events in counters,
+both kept in memory and labeled. Recording a value costs a lock and a few additions,
+so instrumentation can stay on in production.
+
+When a metrics folder is configured, a background thread of each worker process,
+started when it first records or collects metrics, so forked workers have their own,
+periodically writes its metrics to a file named after the process id, and rendering
+merges the files of all processes, so any worker can answer a scrape for all of them.
+Counters and histograms are summed across processes, while gauges, such as cache
+sizes, are labeled with their process id. Files of processes that exited or stopped
+writing are removed when metrics are collected.
+"""
+
+from bisect import bisect_left
+from contextlib import contextmanager
+from glob import glob
+from os import getpid, kill, makedirs, path, remove, replace
+from threading import Lock, Thread
+from time import perf_counter, sleep, time
+from typing import Callable, Dict, Iterator, List, Tuple
+import json
+
+from django.db import connection
+
+from settings import METRICS_DIRECTORY, METRICS_ENABLED, METRICS_FLUSH_IN_SECONDS
+
+# Number of flush intervals after which files of processes are considered stale.
+STALE_FLUSHES = 3
+
+# Upper bounds of histogram buckets, in seconds.
+BUCKETS = (
+    0.0001,
+    0.00025,
+    0.0005,
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+)
+
+
+class Metrics:
+
+    """
+    Thread safe store of counters, gauges and histograms.
+
+    Metrics are identified by name and sorted label pairs. Histograms are stored as
+    bucket counts, followed by sum and count of observations.
+
+    Attributes:
+        pid (int): Process owning the flush thread, if started.
+    """
+
+    def __init__(self) -> None:
+
+        """
+        Constructor to metrics class.
+
+        Returns:
+            None
+        """
+
+        self.counters = {}
+        self.gauges = {}
+        self.histograms = {}
+        self.collectors = []
+        self.pid = None
+        self._lock = Lock()
+
+    def increment(self, name: str, amount: float = 1, **labels) -> None:
+
+        """
+        Increment counter.
+
+        Args:
+            name (str): Metric name.
+            amount (float): Value added to counter. Defaults to 1.
+            labels: Labels of metric.
+
+        Returns:
+            None
+        """
+
+        if self.pid != getpid():
+            self.start()
+
+        key = (name, tuple(sorted(labels.items())))
+
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name: str, value: float, **labels) -> None:
+
+        """
+        Record value in histogram.
+
+        Args:
+            name (str): Metric name.
+            value (float): Observed value, in seconds.
+            labels: Labels of metric.
+
+        Returns:
+            None
+        """
+
+        if self.pid != getpid():
+            self.start()
+
+        key = (name, tuple(sorted(labels.items())))
+        index = bisect_left(BUCKETS, value)
+
+        with self._lock:
+            histogram = self.histograms.get(key)
+
+            if histogram is None:
+                histogram = self.histograms[key] = [0] * (len(BUCKETS) + 2)
+
+            # Buckets are stored without accumulation, accumulated when rendered.
+            if index < len(BUCKETS):
+                histogram[index] += 1
+
+            histogram[-2] += value
+            histogram[-1] += 1
+
+    def register_collector(
+        self, prefix: str, collector: Callable[[], Dict[str, float]]
+    ) -> None:
+
+        """
+        Register function returning statistics, exposed as gauges when collected.
+
+        Useful to expose counters kept elsewhere, such as cache statistics.
+
+        Args:
+            prefix (str): Prefix of gauge names.
+            collector (Callable[[], Dict[str, float]]): Function returning values by
+                statistic name.
+
+        Returns:
+            None
+        """
+
+        self.collectors.append((prefix, collector))
+
+    def start(self) -> None:
+
+        """
+        Start flush thread of current process, if a metrics folder is configured.
+
+        Metrics inherited from a parent process are dropped, as the parent reports
+        them.
+
+        Returns:
+            None
+        """
+
+        with self._lock:
+            if self.pid == getpid():
+                return
+
+            if self.pid is not None:
+                self.counters = {}
+                self.histograms = {}
+
+            self.pid = getpid()
+
+        if METRICS_ENABLED and METRICS_DIRECTORY:
+            makedirs(METRICS_DIRECTORY, exist_ok=True)
+            Thread(target=_flush_periodically, name="metrics", daemon=True).start()
+
+    def snapshot(self) -> dict:
+
+        """
+        Collect metrics of process in a JSON serializable object.
+
+        Gauges are labeled with process id, as values such as sizes and maxima can't
+        be summed across processes.
+
+        Returns:
+            dict: Counters, gauges and histograms, as lists of name, labels and value.
+        """
+
+        gauges = {}
+        labels = (("pid", str(getpid())),)
+
+        for prefix, collector in self.collectors:
+            for name, value in collector().items():
+                gauges[(f"{prefix}_{name}", labels)] = value
+
+        with self._lock:
+            return {
+                "counters": [[*key, value] for key, value in self.counters.items()],
+                "gauges": [[*key, value] for key, value in gauges.items()],
+                "histograms": [
+                    [*key, list(value)] for key, value in self.histograms.items()
+                ],
+            }
+
+
+def merge(snapshots: List[dict]) -> dict:
+
+    """
+    Merge snapshots of several processes, summing values with same name and labels.
+
+    Args:
+        snapshots (List[dict]): Snapshots of processes.
+
+    Returns:
+        dict: Merged metrics, by kind and by name and labels.
+    """
+
+    merged = {"counters": {}, "gauges": {}, "histograms": {}}
+
+    for snapshot in snapshots:
+        for kind in ("counters", "gauges"):
+            for name, labels, value in snapshot[kind]:
+                key = (name, tuple(tuple(label) for label in labels))
+                merged[kind][key] = merged[kind].get(key, 0) + value
+
+        for name, labels, value in snapshot["histograms"]:
+            key = (name, tuple(tuple(label) for label in labels))
+            current = merged["histograms"].get(key, [0] * len(value))
+            merged["histograms"][key] = [a + b for a, b in zip(current, value)]
+
+    return merged
+
+
+def render(merged: dict) -> str:
+
+    """
+    Render merged metrics in Prometheus text format.
+
+    Args:
+        merged (dict): Merged metrics, as returned by merge function.
+
+    Returns:
+        str: Metrics in Prometheus text exposition format.
+    """
+
+    def format_labels(labels: Tuple, *extra: Tuple) -> str:
+        pairs = [*labels, *extra]
+
+        if not pairs:
+            return ""
+
+        return "{" + ",".join(f'{key}="{value}"' for key, value in pairs) + "}"
+
+    lines = []
+    types = {"counters": "counter", "gauges": "gauge", "histograms": "histogram"}
+
+    for kind, metric_type in types.items():
+        typed = set()
+
+        for (name, labels), value in sorted(merged[kind].items()):
+            if name not in typed:
+                lines.append(f"# TYPE {name} {metric_type}")
+                typed.add(name)
+
+            if kind != "histograms":
+                lines.append(f"{name}{format_labels(labels)} {value}")
+                continue
+
+            cumulative = 0
+
+            for bound, count in zip(BUCKETS, value):
+                cumulative += count
+                lines.append(
+                    f"{name}_bucket{format_labels(labels, ('le', bound))} {cumulative}"
+                )
+
+            lines.append(
+                f"{name}_bucket{format_labels(labels, ('le', '+Inf'))} {value[-1]}"
+            )
+            lines.append(f"{name}_sum{format_labels(labels)} {value[-2]}")
+            lines.append(f"{name}_count{format_labels(labels)} {value[-1]}")
+
+    return "\n".join(lines) + "\n"
+
+
+def write_snapshot() -> None:
+
+    """
+    Write metrics of process to metrics folder, replacing file atomically.
+
+    Returns:
+        None
+    """
+
+    filename = path.join(METRICS_DIRECTORY, f"{getpid()}.json")
+
+    with open(f"{filename}.tmp", "w", encoding="utf-8") as file:
+        json.dump(metrics.snapshot(), file)
+
+    replace(f"{filename}.tmp", filename)
+
+
+def collect() -> str:
+
+    """
+    Collect metrics of all processes in Prometheus text format.
+
+    Returns:
+        str: Metrics in Prometheus text exposition format.
+    """
+
+    if metrics.pid != getpid():
+        metrics.start()
+
+    if not METRICS_DIRECTORY:
+        return render(merge([metrics.snapshot()]))
+
+    # Write current process snapshot, so it is up to date, then read all of them.
+    write_snapshot()
+
+    snapshots = []
+
+    for filename in glob(path.join(METRICS_DIRECTORY, "*.json")):
+        try:
+            if is_stale(filename):
+                remove(filename)
+                continue
+
+            with open(filename, encoding="utf-8") as file:
+                snapshots.append(json.load(file))
+        except (OSError, ValueError):
+            continue
+
+    return render(merge(snapshots))
+
+
+def is_stale(filename: str) -> bool:
+
+    """
+    Check if snapshot file belongs to a process that exited or stopped writing.
+
+    Args:
+        filename (str): Snapshot file, named after process id.
+
+    Returns:
+        bool: If file must be removed.
+
+    Raises:
+        OSError: If file can't be read.
+    """
+
+    if time() - path.getmtime(filename) > STALE_FLUSHES * METRICS_FLUSH_IN_SECONDS:
+        return True
+
+    try:
+        kill(int(path.basename(filename)[: -len(".json")]), 0)
+    except ProcessLookupError:
+        return True
+    except (PermissionError, ValueError):
+        return False
+
+    return False
+
+
+@contextmanager
+def timed(phase: str, queries: bool = False) -> Iterator[None]:
+
+    """
+    Measure duration of a phase and, optionally, its database queries.
+
+    Can be used as context manager or as decorator.
+
+    Args:
+        phase (str): Phase name, used as label.
+        queries (bool): If database queries must be counted. Defaults to False.
+
+    Returns:
+        Iterator[None]: Context in which phase runs.
+    """
+
+    if not METRICS_ENABLED:
+        yield
+        return
+
+    count = [0]
+
+    def counter(execute, sql, params, many, context):  # pylint: disable = R0913
+        count[0] += 1
+        return execute(sql, params, many, context)
+
+    start = perf_counter()
+
+    try:
+        if queries:
+            with connection.execute_wrapper(counter):
+                yield
+        else:
+            yield
+    finally:
+        metrics.observe(
+            "ralph_phase_duration_seconds", perf_counter() - start, phase=phase
+        )
+
+        if queries:
+            metrics.increment("ralph_phase_queries_total", count[0], phase=phase)
+
+
+def _flush_periodically() -> None:
+
+    """
+    Write snapshot of process to metrics folder forever, at configured interval.
+
+    Returns:
+        None
+    """
+
+    while True:
+        sleep(METRICS_FLUSH_IN_SECONDS)
+
+        try:
+            write_snapshot()
+        except OSError:
+            continue
+
+
+# Metrics of process.
+metrics = Metrics()
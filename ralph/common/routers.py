@@ -0,0 +1,128 @@
+"""
+Database routing between primary database and read replicas.
+
+Reads of users, roles, permissions and their relations are spread over replicas,
+while every write, and every read of other models, such as refresh and revoked
+tokens, goes to primary. After any authorization change, reads are pinned to primary
+for a short window kept in the Django cache, which must be shared by workers when
+replicas are configured, so changes are seen by all of them before replicas catch
+up. Without replicas every read goes to primary and the window is never checked.
+"""
+
+from random import choice
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import cache
+
+from settings import DB_READ_YOUR_WRITES_IN_SECONDS
+
+# Alias of primary database.
+PRIMARY = "default"
+
+# Models whose reads may be served by replicas.
+REPLICA_MODELS = {
+    "authorization.user",
+    "authorization.user_roles",
+    "authorization.role",
+    "authorization.role_permissions",
+    "authorization.permission",
+}
+
+# Shared cache key present while reads are pinned to primary.
+PRIMARY_PIN_KEY = "primary-pin"
+
+
+def pin_primary() -> None:
+
+    """
+    Send reads to primary database during read your writes window.
+
+    Returns:
+        None
+    """
+
+    if DB_READ_YOUR_WRITES_IN_SECONDS and len(settings.DATABASES) > 1:
+        cache.set(PRIMARY_PIN_KEY, True, DB_READ_YOUR_WRITES_IN_SECONDS)
+
+
+class ReplicaRouter:
+
+    """
+    Router sending authorization reads to replicas and everything else to primary.
+
+    Attributes:
+        replicas (list): Aliases of replica databases.
+    """
+
+    def __init__(self) -> None:
+
+        """
+        Constructor to router class.
+
+        Returns:
+            None
+        """
+
+        self.replicas = [alias for alias in settings.DATABASES if alias != PRIMARY]
+
+    def db_for_read(
+        self, model: type, **hints  # pylint: disable = unused-argument
+    ) -> Optional[str]:
+
+        """
+        Choose database for read.
+
+        Args:
+            model (type): Model being read.
+
+        Returns:
+            Optional[str]: Alias of a replica, or None to use primary.
+        """
+
+        if not self.replicas or model._meta.label_lower not in REPLICA_MODELS:
+            return None
+
+        if cache.get(PRIMARY_PIN_KEY):
+            return PRIMARY
+
+        return choice(self.replicas)
+
+    def db_for_write(
+        self, model: type, **hints  # pylint: disable = unused-argument
+    ) -> str:
+
+        """
+        Choose database for write.
+
+        Returns:
+            str: Alias of primary.
+        """
+
+        return PRIMARY
+
+    def allow_relation(
+        self, obj1: object, obj2: object, **hints  # pylint: disable = unused-argument
+    ) -> bool:
+
+        """
+        Allow relations between objects of any database, as all hold the same data.
+
+        Returns:
+            bool: True.
+        """
+
+        return True
+
+    def allow_migrate(
+        self, db: str, app_label: str, **hints  # pylint: disable = unused-argument
+    ) -> bool:
+
+        """
+        Create tables on primary only, replicas get them by replication.
+
+        Returns:
+            bool: If database is primary.
+        """
+
+        return db == PRIMARY
@@ -0,0 +1,55 @@
+"""
+Prepare a worker process to serve requests.
+
+URL configuration, with Ninja routers and schemas, is built at boot instead of on
+first request, and revoked tokens and authorization versions are loaded, so token
+checks never wait for them.
+Libraries only needed to sign, verify and hash, which are imported on
+first use, are preloaded by a background thread, so the worker is ready to serve
+before they are loaded and the first logins usually don't wait for them.
+"""
+
+# pylint: disable = import-outside-toplevel, unused-import
+
+from threading import Thread
+
+from django.urls import get_resolver
+
+
+def warmup() -> None:
+
+    """
+    Build URL configuration, load revoked tokens and authorization versions, and
+    preload libraries in background.
+
+    Returns:
+        None
+    """
+
+    from ralph.clients.authorization.revocation import revocation_list
+    from ralph.clients.authorization.versions import authorization_versions
+
+    # Importing URL configuration builds API routers and schemas.
+    get_resolver().url_patterns
+
+    revocation_list.start()
+    authorization_versions.start()
+
+    Thread(target=_preload, name="preload", daemon=True).start()
+
+
+def _preload() -> None:
+
+    """
+    Import libraries deferred to first use and load signing keys.
+
+    Returns:
+        None
+    """
+
+    import bcrypt
+    from jose import jwt
+
+    from ralph.clients.authorization.keys import key_ring
+
+    key_ring.load()
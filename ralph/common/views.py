@@ -0,0 +1,55 @@
+"""
+Helpers shared by endpoints.
+
+This module makes endpoints follow the configured serving mode, so the same view can
+be served synchronously, under WSGI, or asynchronously, under ASGI.
+"""
+
+from functools import wraps
+from inspect import isawaitable
+from typing import Callable
+
+from asgiref.sync import sync_to_async
+
+from settings import ASYNC_ENDPOINTS
+
+
+def configured_view(view: Callable = None, blocking: bool = False) -> Callable:
+
+    """
+    Make view asynchronous if async endpoints are enabled.
+
+    Views that don't block, such as views returning information already resolved by
+    authorization, run inline in the event loop. Awaitables they return, such as
+    calls to async methods, are awaited. Blocking views, such as views querying the
+    database, run in a thread managed by Django.
+
+    Args:
+        view (Callable): Synchronous view function.
+        blocking (bool): If view blocks. Defaults to False.
+
+    Returns:
+        Callable: View function matching serving mode.
+    """
+
+    if view is None:
+        return lambda view: configured_view(view, blocking)
+
+    if not ASYNC_ENDPOINTS:
+        return view
+
+    if blocking:
+
+        @wraps(view)
+        async def async_view(*args, **kwargs) -> object:
+            return await sync_to_async(view)(*args, **kwargs)
+
+    else:
+
+        @wraps(view)
+        async def async_view(*args, **kwargs) -> object:
+            response = view(*args, **kwargs)
+
+            return await response if isawaitable(response) else response
+
+    return async_view
@@ -11,7 +11,16 @@ https://docs.djangoproject.com/en/3.2/ref/settings/
 """
 
 from pathlib import Path
+
+from django.core.exceptions import ImproperlyConfigured
+
 from settings import (
+    CACHE_BACKEND,
+    CACHE_LOCATION,
+    CACHE_OPTIONS,
+    DB_CONN_HEALTH_CHECKS,
+    DB_CONN_MAX_AGE,
+    DB_REPLICAS,
     DB_TYPE,
     DB_NAME,
     DB_USER,
@@ -19,6 +28,9 @@ from settings import (
     DB_HOST,
     DB_PORT,
     DEBUG as _DEBUG,
+    ALLOWED_HOSTS as _ALLOWED_HOSTS,
+    PROFILE,
+    SECRET_KEY as _SECRET_KEY,
 )
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -28,24 +40,34 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/3.2/howto/deployment/checklist/
 
+SECRET_KEY = _SECRET_KEY
+
 DEBUG = _DEBUG
 
+ALLOWED_HOSTS = _ALLOWED_HOSTS
+
 # Application definition
 
-INSTALLED_APPS = [
-    "django.contrib.contenttypes",
-    "django.contrib.sessions",
-    "ralph.clients.authorization",
-    "ralph.clients.check",
-]
+# Token API needs no sessions, cookies, CSRF protection or content types.
+INSTALLED_APPS = (
+    []
+    if PROFILE == "stateless"
+    else ["django.contrib.contenttypes", "django.contrib.sessions"]
+) + ["ralph.clients.authorization", "ralph.clients.check"]
 
 MIDDLEWARE = [
+    "ralph.common.middleware.metrics_middleware",
     "django.middleware.security.SecurityMiddleware",
-    "django.contrib.sessions.middleware.SessionMiddleware",
-    "django.middleware.common.CommonMiddleware",
-    "django.middleware.csrf.CsrfViewMiddleware",
-    "django.middleware.clickjacking.XFrameOptionsMiddleware",
-]
+] + (
+    []
+    if PROFILE == "stateless"
+    else [
+        "django.contrib.sessions.middleware.SessionMiddleware",
+        "django.middleware.common.CommonMiddleware",
+        "django.middleware.csrf.CsrfViewMiddleware",
+        "django.middleware.clickjacking.XFrameOptionsMiddleware",
+    ]
+)
 
 ROOT_URLCONF = "ralph.urls"
 
@@ -71,9 +93,41 @@ else:
             "PASSWORD": DB_PASSWORD,
             "HOST": DB_HOST,
             "PORT": DB_PORT,
+            "CONN_MAX_AGE": DB_CONN_MAX_AGE,
+            "CONN_HEALTH_CHECKS": DB_CONN_HEALTH_CHECKS,
         }
     }
 
+    # Replicas share primary settings, and tests use primary in their place.
+    for index, replica in enumerate(DB_REPLICAS):
+        DATABASES[f"replica_{index}"] = {
+            **DATABASES["default"],
+            **replica,
+            "TEST": {"MIRROR": "default"},
+        }
+
+DATABASE_ROUTERS = ["ralph.common.routers.ReplicaRouter"]
+
+
+# Cache
+# https://docs.djangoproject.com/en/3.2/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": CACHE_BACKEND,
+        "LOCATION": CACHE_LOCATION,
+        "OPTIONS": CACHE_OPTIONS,
+    }
+}
+
+# Read your writes windows are kept in cache, so with replicas it must be shared by
+# workers, or reads of other workers would not be pinned after a change.
+if len(DATABASES) > 1 and CACHE_BACKEND in (
+    "django.core.cache.backends.locmem.LocMemCache",
+    "django.core.cache.backends.dummy.DummyCache",
+):
+    raise ImproperlyConfigured("DB_REPLICAS require a CACHE_BACKEND shared by workers.")
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/3.2/topics/i18n/
@@ -82,7 +136,8 @@ LANGUAGE_CODE = "en-us"
 
 TIME_ZONE = "UTC"
 
-USE_I18N = True
+# Responses aren't translated, so stateless profile skips translation machinery.
+USE_I18N = PROFILE != "stateless"
 
 USE_L10N = True
 
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "ralph.settings")
 
 application = get_wsgi_application()
+
+# pylint: disable = wrong-import-position
+from ralph.common.startup import warmup
+
+warmup()
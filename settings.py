@@ -2,6 +2,32 @@
 SECRET_KEY = "ralph"
 DEBUG = True
 ALLOWED_HOSTS = []
+# Serve endpoints asynchronously, for ASGI deployments.
+ASYNC_ENDPOINTS = False
+# Either "default" or "stateless". Stateless profile runs only apps and middleware a
+# token API needs, for faster startup and less work per request.
+PROFILE = "default"
+
+### Logging settings ###
+LOG_LEVEL = "INFO"
+# Either "json" or "text".
+LOG_FORMAT = "json"
+# Log file is shared by worker processes and reopened when moved, so rotate it
+# externally, such as by logrotate.
+LOG_DIRECTORY = "logs"
+LOG_QUEUE_SIZE = 10000
+# INFO records are sampled and rate limited per logger. Zero disables rate limit.
+LOG_SAMPLE_RATE = 1.0
+LOG_RATE_LIMIT_PER_SECOND = 100
+
+### Metrics settings ###
+METRICS_ENABLED = True
+# Folder shared by worker processes, so any of them can report all. None if single
+# process.
+METRICS_DIRECTORY = None
+METRICS_FLUSH_IN_SECONDS = 5
+# Bearer token scrapers must send to read /metrics. None denies every scrape.
+METRICS_TOKEN = None
 
 ### Database settings ###
 DB_TYPE = "SQLite"
@@ -10,8 +36,121 @@ DB_USER = None
 DB_PASSWORD = None
 DB_HOST = None
 DB_PORT = None
+# Use integer keys for users, roles and permissions, keeping uuids and names as unique
+# columns. Existing tables are converted with convert_compact_keys command.
+DB_COMPACT_KEYS = False
+# Seconds connections are kept open for reuse, and if they are checked before reuse.
+DB_CONN_MAX_AGE = 60
+DB_CONN_HEALTH_CHECKS = True
+# Read replicas of MySQL database, each a dict overriding primary connection settings,
+# such as {"HOST": "replica-1"}. User, role and permission reads are sent to them.
+# Replicas require a CACHE_BACKEND shared by workers, such as Redis or Memcached.
+DB_REPLICAS = []
+# Seconds reads are sent to primary after users, roles or permissions change, so
+# changes are seen before replicas catch up.
+DB_READ_YOUR_WRITES_IN_SECONDS = 5
 
 ### JWT settings ###
 JWT_SECRET = "ralph"
 JWT_ALGORITHM = "HS256"
 JWT_TIMEDELTA_IN_MINUTES = 15
+# Asymmetric keys used instead of JWT_SECRET, each a dict with "kid", "algorithm"
+# (RS256, ES256, ...) and "private_key_file" or "public_key_file" (PEM). First key
+# with private key signs tokens, others only verify them. To rotate, add new key
+# first and remove old one after JWT_TIMEDELTA_IN_MINUTES.
+JWT_SIGNING_KEYS = []
+# Keep accepting tokens signed with JWT_SECRET once a signing key is set. Enable it
+# only while switching, for JWT_TIMEDELTA_IN_MINUTES, as anyone knowing the secret
+# can forge tokens.
+JWT_ACCEPT_SECRET_TOKENS = False
+# Seconds other services may cache published keys.
+JWKS_MAX_AGE_IN_SECONDS = 300
+# Refresh tokens are rotated on every use and expire after this many days.
+REFRESH_TOKEN_TIMEDELTA_IN_DAYS = 30
+# Embed roles, permissions and profile in token, so authorization only checks their
+# version, kept in memory, instead of resolving them.
+JWT_STATELESS = False
+# Maximum number of tokens introspected in a single request.
+INTROSPECT_MAX_TOKENS = 1000
+# Maximum number of users and requirements in a single bulk authorization decision.
+AUTHORIZE_MAX_USERS = 1000
+AUTHORIZE_MAX_REQUIREMENTS = 100
+
+### Authorization versions settings ###
+# Authorization versions changed recently are kept in memory by each worker. Versions
+# changed since last read, or within margin before it, covering transactions
+# committed late, are read every refresh interval, and all of them are reloaded
+# every reload interval, dropping the ones changed before retention, which must
+# exceed JWT_TIMEDELTA_IN_MINUTES and the age of published snapshots.
+VERSIONS_REFRESH_IN_SECONDS = 1
+VERSIONS_MARGIN_IN_SECONDS = 10
+VERSIONS_RELOAD_IN_SECONDS = 300
+VERSIONS_RETENTION_IN_SECONDS = 86400
+
+### Role settings ###
+# Roles grant roles and permissions of the roles they inherit, read from a closure
+# table kept up to date on every change. Run rebuild_role_closure command once
+# after enabling it on a database with roles created before.
+ROLE_HIERARCHY = False
+
+### Snapshot settings ###
+# File holding a snapshot of users, roles and permissions, published by
+# publish_snapshot command and memory mapped by every worker, which read principals
+# from it before database. None disables it. Users changed after a snapshot was
+# published are read from database, by change times kept along with authorization
+# versions, so snapshots older than VERSIONS_RETENTION_IN_SECONDS are not used.
+SNAPSHOT_PATH = None
+# Seconds between checks for a newer snapshot.
+SNAPSHOT_CHECK_IN_SECONDS = 5
+# Changes made this long before a snapshot was published are still read from
+# database, covering transactions in flight and clock skew between hosts.
+SNAPSHOT_MARGIN_IN_SECONDS = 60
+
+### Revocation settings ###
+# Revoked tokens are kept in memory by each worker. New revocations are read every
+# refresh interval, and the whole set is reloaded every reload interval. Expired
+# entries are deleted by prune_revoked_tokens command.
+REVOCATION_REFRESH_IN_SECONDS = 1
+REVOCATION_RELOAD_IN_SECONDS = 300
+# Maximum number of tokens, of token ids and of users revoked in a single request.
+REVOKE_MAX_TOKENS = 1000
+
+### Password settings ###
+# Passwords are verified in a pool of threads, with bounded number of waiting logins.
+PASSWORD_WORKERS = 4
+PASSWORD_QUEUE_SIZE = 64
+PASSWORD_RETRY_AFTER_IN_SECONDS = 1
+# Cost factor of password hashes, picked for this hardware by calibrate_bcrypt
+# command. Passwords hashed with another cost are rehashed on next login. None keeps
+# hashes as they are.
+BCRYPT_ROUNDS = 12
+
+### Login throttle settings ###
+# Failed logins are counted per username and per client IP over a sliding window,
+# and further attempts are rejected before any database or password work. Zero
+# disables a limit.
+LOGIN_THROTTLE_WINDOW_IN_SECONDS = 300
+LOGIN_THROTTLE_USERNAME_LIMIT = 10
+LOGIN_THROTTLE_IP_LIMIT = 100
+# Number of counters kept by each worker, least recently used ones being dropped.
+LOGIN_THROTTLE_SIZE = 100000
+# Keep counters in shared cache instead, so limits apply across workers.
+LOGIN_THROTTLE_SHARED = False
+# Number of trusted reverse proxies in front of workers, each appending address of
+# its peer to X-Forwarded-For header. Client IP is read from that header, so all
+# clients aren't throttled as the IP of the last proxy. Zero uses connection address.
+LOGIN_THROTTLE_TRUSTED_PROXIES = 0
+
+### Cache settings ###
+# Shared cache, used to keep read your writes windows and shared login throttles
+# consistent across workers.
+CACHE_BACKEND = "django.core.cache.backends.locmem.LocMemCache"
+CACHE_LOCATION = "ralph"
+CACHE_OPTIONS = {"MAX_ENTRIES": 100000}
+PRINCIPAL_CACHE_SIZE = 10000
+PRINCIPAL_CACHE_TTL_IN_SECONDS = 60
+TOKEN_CACHE_SIZE = 10000
+REJECTED_TOKEN_CACHE_SIZE = 1000
+REJECTED_TOKEN_CACHE_TTL_IN_SECONDS = 60
+# Compiled wildcard permission matchers, shared by users with same permissions.
+PERMISSION_TRIE_CACHE_SIZE = 1000
@@ -0,0 +1,59 @@
+"""
+Tests of role hierarchy closure.
+"""
+
+from django.test import TestCase
+
+from ralph.clients.authorization.models import Role, RoleClosure
+
+
+class RoleClosureTest(TestCase):
+
+    """
+    Closure of role hierarchy kept by signals.
+    """
+
+    def setUp(self) -> None:
+
+        """
+        Create chain of roles, admin inheriting editor inheriting viewer.
+
+        Returns:
+            None
+        """
+
+        self.viewer = Role.objects.create(name="viewer")
+        self.editor = Role.objects.create(name="editor")
+        self.admin = Role.objects.create(name="admin")
+        self.editor.inherits.add(self.viewer)
+        self.admin.inherits.add(self.editor)
+
+    def test_delete_chain(self) -> None:
+
+        """
+        Roles of a chain deleted by a single query leave no closure entries.
+
+        Returns:
+            None
+        """
+
+        Role.objects.all().delete()
+
+        self.assertFalse(Role.objects.exists())
+        self.assertFalse(RoleClosure.objects.exists())
+
+    def test_delete_middle_role(self) -> None:
+
+        """
+        Roles implying a deleted role no longer imply roles reached through it.
+
+        Returns:
+            None
+        """
+
+        self.editor.delete()
+
+        self.assertEqual(
+            set(RoleClosure.objects.values_list("role_id", "implied_id")),
+            {(self.admin.pk, self.admin.pk), (self.viewer.pk, self.viewer.pk)},
+        )